@@ -0,0 +1,408 @@
+"""Benchmarks SynapseTestHelper against a FakeSynapseServer.
+
+Run from the root of the repository:
+
+    python -m benchmarks.benchmark --latency 0.005 --output results.json
+    python -m benchmarks.benchmark --baseline results.json
+"""
+from __future__ import annotations
+import typing as t
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import synapseclient
+from synapseclient import Folder
+from src.synapse_test_helper import SynapseTestHelper, FakeSynapseServer
+
+FOLDER_TYPE = 'org.sagebionetworks.repo.model.Folder'
+PROJECT_TYPE = 'org.sagebionetworks.repo.model.Project'
+
+# Target bytes retained per trash entry by bench_trash_memory.
+TRASH_BYTES_PER_ENTRY_TARGET = 256
+
+
+def percentile(
+        samples: list[float],
+        percent: float
+) -> float:
+    """Gets the nearest-rank percentile of the samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(
+        name: str,
+        samples: list[float],
+        elapsed: float,
+        peak_memory: int | None,
+        **params
+) -> dict:
+    """Builds the result for a benchmark from the per-operation latencies in seconds."""
+    return {
+        'name': name,
+        'params': params,
+        'ops': len(samples),
+        'seconds': elapsed,
+        'ops_per_sec': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'peak_memory_bytes': peak_memory
+    }
+
+
+class Timer:
+    """Times each operation and tracks the peak memory allocated while timing."""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.samples = []
+        self.elapsed = 0.0
+        self.peak_memory = None
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.elapsed = time.perf_counter() - self._start
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def time(
+            self,
+            func: t.Callable,
+            *args,
+            **kwargs
+    ) -> t.Any:
+        """Calls func and records how long it took."""
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.append(time.perf_counter() - start)
+        return result
+
+    def wrap(
+            self,
+            func: t.Callable
+    ) -> t.Callable:
+        """Wraps func so each call is timed. Safe to call from multiple threads."""
+
+        def _timed(*args, **kwargs):
+            return self.time(func, *args, **kwargs)
+
+        return _timed
+
+
+class Benchmarks:
+    """The benchmarks. Each bench_ method yields one result per set of parameters."""
+
+    NAMES = ['create_project', 'create_folder', 'create_file', 'create_team', 'create_wiki',
+             'create_temp_file', 'create_temp_dir', 'dispose_of', 'dispose', 'trash_memory']
+
+    def __init__(
+            self,
+            server: FakeSynapseServer,
+            iterations: int = 20,
+            file_sizes: list[int] = None,
+            trash_sizes: list[int] = None,
+            dispose_sizes: list[int] = None,
+            max_workers: int = 1,
+            trace_memory: bool = True
+    ):
+        self.server = server
+        self.client = server.client(silent=True)
+        self.iterations = iterations
+        self.file_sizes = file_sizes or [1024, 1024 * 1024, 10 * 1024 * 1024]
+        self.trash_sizes = trash_sizes or [10, 100, 1000, 10000, 100000]
+        self.dispose_sizes = dispose_sizes or [10, 100, 1000, 10000, 100000]
+        self.max_workers = max_workers
+        self.trace_memory = trace_memory
+
+    def run(
+            self,
+            names: list[str] = None,
+            progress: t.Callable[[dict], None] = None
+    ) -> list[dict]:
+        results = []
+        for name in names or self.NAMES:
+            for result in getattr(self, 'bench_{0}'.format(name))():
+                results.append(result)
+                if progress:
+                    progress(result)
+        return results
+
+    def _helper(self) -> SynapseTestHelper:
+        return SynapseTestHelper(self.client, max_workers=self.max_workers)
+
+    def _timer(self) -> Timer:
+        return Timer(trace_memory=self.trace_memory)
+
+    def _repeat(
+            self,
+            name: str,
+            func: t.Callable[[SynapseTestHelper, t.Any], t.Any],
+            setup: t.Callable[[SynapseTestHelper], t.Any] = None,
+            **params
+    ) -> dict:
+        """Times func iterations times then disposes of everything it created."""
+        with self._helper() as sth:
+            context = setup(sth) if setup else None
+            with self._timer() as timer:
+                for _ in range(self.iterations):
+                    timer.time(func, sth, context)
+        self.server.reset()
+        return summarize(name, timer.samples, timer.elapsed, timer.peak_memory, **params)
+
+    def bench_create_project(self) -> t.Iterator[dict]:
+        yield self._repeat('create_project', lambda sth, _: sth.create_project())
+
+    def bench_create_folder(self) -> t.Iterator[dict]:
+        yield self._repeat('create_folder',
+                           lambda sth, project: sth.create_folder(parent=project),
+                           setup=lambda sth: sth.create_project())
+
+    def bench_create_file(self) -> t.Iterator[dict]:
+        for size in self.file_sizes:
+            with self._helper() as sth:
+                project = sth.create_project()
+                paths = sth.create_temp_files(self.iterations, size=size)
+
+                with self._timer() as timer:
+                    for path in paths:
+                        timer.time(sth.create_file, path=path, parent=project)
+            self.server.reset()
+            yield summarize('create_file', timer.samples, timer.elapsed, timer.peak_memory, size=size)
+
+    def bench_create_team(self) -> t.Iterator[dict]:
+        yield self._repeat('create_team', lambda sth, _: sth.create_team())
+
+    def bench_create_wiki(self) -> t.Iterator[dict]:
+        def _setup(sth):
+            project = sth.create_project()
+            return project, sth.create_wiki(owner=project)
+
+        yield self._repeat('create_wiki',
+                           lambda sth, context: sth.create_wiki(owner=context[0], parentWikiId=context[1].id),
+                           setup=_setup)
+
+    def bench_create_temp_file(self) -> t.Iterator[dict]:
+        yield self._repeat('create_temp_file', lambda sth, _: sth.create_temp_file())
+
+    def bench_create_temp_dir(self) -> t.Iterator[dict]:
+        yield self._repeat('create_temp_dir', lambda sth, _: sth.create_temp_dir())
+
+    def _make_folders(
+            self,
+            count: int
+    ) -> list[synapseclient.Folder]:
+        """Adds Folders directly to the server so large trash sizes do not take long to set up."""
+        project = self.server.add_entities({'concreteType': PROJECT_TYPE, 'name': 'Benchmark_Project'})[0]
+        entities = self.server.add_entities(
+            *({'concreteType': FOLDER_TYPE, 'name': 'Folder_{0}'.format(i), 'parentId': project['id']}
+              for i in range(count))
+        )
+        return [Folder(properties=entity) for entity in entities]
+
+    def bench_dispose_of(self) -> t.Iterator[dict]:
+        for size in self.trash_sizes:
+            folders = self._make_folders(size)
+            with self._helper() as sth:
+                with self._timer() as timer:
+                    for folder in folders:
+                        timer.time(sth.dispose_of, folder)
+                sth.trash.clear()
+            self.server.reset()
+            yield summarize('dispose_of', timer.samples, timer.elapsed, timer.peak_memory, trash_size=size)
+
+    def bench_dispose(self) -> t.Iterator[dict]:
+        for size in self.dispose_sizes:
+            folders = self._make_folders(size)
+            with self._helper() as sth:
+                sth.dispose_of(*folders)
+                with self._timer() as timer:
+                    # Time each delete and the whole dispose.
+                    sth._dispose_obj = timer.wrap(sth._dispose_obj)
+                    sth.dispose()
+            self.server.reset()
+            yield summarize('dispose', timer.samples, timer.elapsed, timer.peak_memory, trash_size=size)
+
+    def bench_trash_memory(self) -> t.Iterator[dict]:
+        """Measures the memory the trash retains per entry after the disposed objects are freed.
+        Reported as retained_bytes and bytes_per_entry, along with the peak memory. Always traces memory.
+        """
+        for size in self.trash_sizes:
+            entities = [dict(folder) for folder in self._make_folders(size)]
+            with self._helper() as sth:
+                gc.collect()
+                tracemalloc.start()
+                # Create the Folders while tracing so Folders the trash keeps alive are counted.
+                folders = [Folder(properties=entity) for entity in entities]
+                start = time.perf_counter()
+                sth.dispose_of(*folders)
+                elapsed = time.perf_counter() - start
+                del folders
+                gc.collect()
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                sth.trash.clear()
+            self.server.reset()
+            result = summarize('trash_memory', [elapsed / size] * size, elapsed, peak, trash_size=size)
+            result['retained_bytes'] = retained
+            result['bytes_per_entry'] = retained / size
+            result['target_bytes_per_entry'] = TRASH_BYTES_PER_ENTRY_TARGET
+            yield result
+
+
+def result_key(result: dict) -> str:
+    """Gets the key that identifies a result across runs."""
+    params = ','.join('{0}={1}'.format(k, v) for k, v in sorted(result['params'].items()))
+    return '{0}[{1}]'.format(result['name'], params) if params else result['name']
+
+
+def compare(
+        results: list[dict],
+        baseline: list[dict],
+        threshold: float = 0.2
+) -> list[str]:
+    """Compares results against a baseline.
+
+    Args:
+        results: The current results.
+        baseline: The baseline results.
+        threshold: Fraction a metric can get worse by before it is a regression.
+
+    Returns:
+        A description of each regression.
+    """
+    baseline_by_key = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        base = baseline_by_key.get(key)
+        if base is None:
+            continue
+        if base['ops_per_sec'] and result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            regressions.append('{0}: ops/sec {1:.1f} < baseline {2:.1f}'.format(
+                key, result['ops_per_sec'], base['ops_per_sec']))
+        if base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append('{0}: p95 {1:.2f}ms > baseline {2:.2f}ms'.format(
+                key, result['p95_ms'], base['p95_ms']))
+        if base['peak_memory_bytes'] and result['peak_memory_bytes'] and \
+                result['peak_memory_bytes'] > base['peak_memory_bytes'] * (1 + threshold):
+            regressions.append('{0}: peak memory {1} > baseline {2}'.format(
+                key, result['peak_memory_bytes'], base['peak_memory_bytes']))
+        if base.get('bytes_per_entry') and result.get('bytes_per_entry') and \
+                result['bytes_per_entry'] > base['bytes_per_entry'] * (1 + threshold):
+            regressions.append('{0}: {1:.0f} bytes/entry > baseline {2:.0f}'.format(
+                key, result['bytes_per_entry'], base['bytes_per_entry']))
+    return regressions
+
+
+def missed_targets(results: list[dict]) -> list[str]:
+    """Checks the results that have a target.
+
+    Returns:
+        A description of each result that missed its target.
+    """
+    missed = []
+    for result in results:
+        if 'target_bytes_per_entry' in result and result['bytes_per_entry'] > result['target_bytes_per_entry']:
+            missed.append('{0}: {1:.0f} bytes/entry > target {2}'.format(
+                result_key(result), result['bytes_per_entry'], result['target_bytes_per_entry']))
+    return missed
+
+
+def format_result(result: dict) -> str:
+    memory = result['peak_memory_bytes']
+    return '{0:<40} {1:>8} {2:>12.1f} {3:>10.2f} {4:>10.2f} {5:>10.2f} {6:>12}'.format(
+        result_key(result), result['ops'], result['ops_per_sec'],
+        result['p50_ms'], result['p95_ms'], result['p99_ms'],
+        '-' if memory is None else '{0:.1f}KB'.format(memory / 1024)
+    ) + ('' if 'bytes_per_entry' not in result else ' ({0:.0f}B/entry, target {1}B)'.format(
+        result['bytes_per_entry'], result['target_bytes_per_entry']))
+
+
+def parse_sizes(value: str) -> list[int]:
+    return [int(size) for size in value.split(',') if size]
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks SynapseTestHelper against a FakeSynapseServer.')
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='Benchmarks to run. One or more of: {0}. Default: all.'.format(
+                            ', '.join(Benchmarks.NAMES)))
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds to delay each request.')
+    parser.add_argument('--iterations', type=int, default=20, help='Number of times to run each create benchmark.')
+    parser.add_argument('--file-sizes', type=parse_sizes, default=[1024, 1024 * 1024, 10 * 1024 * 1024],
+                        help='Comma separated file sizes in bytes for create_file.')
+    parser.add_argument('--trash-sizes', type=parse_sizes, default=[10, 100, 1000, 10000, 100000],
+                        help='Comma separated trash sizes for dispose_of.')
+    parser.add_argument('--dispose-sizes', type=parse_sizes, default=[10, 100, 1000, 10000, 100000],
+                        help='Comma separated trash sizes for dispose. Each object is a request, '
+                             '100000 takes several minutes so pass smaller sizes for a quick run.')
+    parser.add_argument('--max-workers', type=int, default=1, help='SynapseTestHelper max_workers.')
+    parser.add_argument('--no-memory', action='store_true', help='Do not trace peak memory.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='Compare the results to the JSON results in this file.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fraction a metric can get worse by before it is a regression.')
+    options = parser.parse_args(args)
+    unknown = [name for name in options.names if name not in Benchmarks.NAMES]
+    if unknown:
+        parser.error('Unknown benchmarks: {0}'.format(', '.join(unknown)))
+
+    print('{0:<40} {1:>8} {2:>12} {3:>10} {4:>10} {5:>10} {6:>12}'.format(
+        'benchmark', 'ops', 'ops/sec', 'p50 ms', 'p95 ms', 'p99 ms', 'peak mem'))
+
+    with FakeSynapseServer(latency=options.latency) as server:
+        benchmarks = Benchmarks(server,
+                                iterations=options.iterations,
+                                file_sizes=options.file_sizes,
+                                trash_sizes=options.trash_sizes,
+                                dispose_sizes=options.dispose_sizes,
+                                max_workers=options.max_workers,
+                                trace_memory=not options.no_memory)
+        results = benchmarks.run(options.names, progress=lambda result: print(format_result(result), flush=True))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'created': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'synapseclient': synapseclient.__version__,
+                'options': {k: v for k, v in vars(options).items() if k not in ['output', 'baseline']},
+                'results': results
+            }, f, indent=2)
+
+    missed = missed_targets(results)
+    if missed:
+        print('Missed targets:')
+        for target in missed:
+            print('  {0}'.format(target))
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], threshold=options.threshold)
+        if regressions:
+            print('Regressions:')
+            for regression in regressions:
+                print('  {0}'.format(regression))
+            return 1
+        print('No regressions.')
+    return 1 if missed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
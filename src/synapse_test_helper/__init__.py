@@ -1,3 +1,15 @@
 from .synapse_test_helper import SynapseTestHelper
+from .async_synapse_test_helper import AsyncSynapseTestHelper
+from .pool import WarmPool
+from .waiter import Waiter
+from .fake_synapse import FakeSynapseServer
+from .instrumentation import Instrumentation, Event
+from .deferred import DeferredDisposal
+from .sweeper import Sweeper
+from .dispose_report import DisposeReport, DisposeResult
+from .rate_limiter import RateLimiter
+from .tree import EntityTree
+from .upload_cache import UploadCache
+from .trash import TrashRecord
 
 name = 'synapse-test-helper'
@@ -0,0 +1,200 @@
+from __future__ import annotations
+import typing as t
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import synapseclient
+from .synapse_test_helper import SynapseTestHelper
+from .trash import Trash
+from .instrumentation import Instrumentation
+from .dispose_report import DisposeReport
+
+
+class AsyncSynapseTestHelper:
+    """Asyncio test helper for working with Synapse.
+
+    Wraps a SynapseTestHelper and runs each blocking call in a bounded thread pool so the event loop is never blocked.
+    Coroutines can be run concurrently with asyncio.gather.
+    """
+
+    def __init__(
+            self,
+            synapse_client: synapseclient.Synapse | list[synapseclient.Synapse] = None,
+            max_workers: int = 8,
+            instrumentation: Instrumentation = None
+    ):
+        """
+        Args:
+            synapse_client: A logged in Synapse client or a list of logged in clients. (optional)
+            max_workers: Maximum number of concurrent Synapse calls.
+            instrumentation: Records the time of every create, wait, and delete. (optional)
+        """
+        self._helper = SynapseTestHelper(synapse_client, max_workers=max_workers, instrumentation=instrumentation)
+        self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        try:
+            await self.dispose()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Shuts down the thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @property
+    def helper(self) -> SynapseTestHelper:
+        """Gets the wrapped SynapseTestHelper."""
+        return self._helper
+
+    @property
+    def max_workers(self) -> int:
+        """Gets the maximum number of concurrent Synapse calls."""
+        return self._helper.max_workers
+
+    def configure(
+            self,
+            synapse_client: synapseclient.Synapse | list[synapseclient.Synapse]
+    ) -> bool:
+        """See SynapseTestHelper.configure."""
+        return self._helper.configure(synapse_client)
+
+    def deconfigure(self) -> bool:
+        """See SynapseTestHelper.deconfigure."""
+        return self._helper.deconfigure()
+
+    @property
+    def configured(self) -> bool:
+        """Gets if configured."""
+        return self._helper.configured
+
+    @property
+    def client(self) -> synapseclient.Synapse:
+        """Gets the synapseclient."""
+        return self._helper.client
+
+    @property
+    def trash(self) -> Trash:
+        """Gets the trash of the wrapped SynapseTestHelper."""
+        return self._helper.trash
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """Gets the instrumentation of the wrapped SynapseTestHelper."""
+        return self._helper.instrumentation
+
+    @property
+    def test_id(self) -> str:
+        """See SynapseTestHelper.test_id."""
+        return self._helper.test_id
+
+    def uniq_name(
+            self,
+            prefix: str = None,
+            postfix: str = None
+    ) -> str:
+        """See SynapseTestHelper.uniq_name."""
+        return self._helper.uniq_name(prefix=prefix, postfix=postfix)
+
+    async def _run(
+            self,
+            func: t.Callable,
+            *args,
+            **kwargs
+    ) -> t.Any:
+        """Runs a blocking function in the thread pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def dispose_of(
+            self,
+            *disposable_objects: list[t.Any]
+    ) -> None:
+        """See SynapseTestHelper.dispose_of."""
+        self._helper.dispose_of(*disposable_objects)
+
+    async def dispose(
+            self,
+            *disposable_objects: list[t.Any] | [] | None
+    ) -> DisposeReport:
+        """See SynapseTestHelper.dispose. Deletes up to max_workers objects concurrently."""
+        return await self._run(self._helper.dispose, *disposable_objects, max_workers=self.max_workers)
+
+    async def create_project(
+            self,
+            name: str = None,
+            prefix: str = None,
+            **kwargs
+    ) -> synapseclient.Project:
+        """See SynapseTestHelper.create_project."""
+        return await self._run(self._helper.create_project, name=name, prefix=prefix, **kwargs)
+
+    async def create_folder(
+            self,
+            name: str = None,
+            prefix: str = None,
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            **kwargs
+    ) -> synapseclient.Folder:
+        """See SynapseTestHelper.create_folder."""
+        return await self._run(self._helper.create_folder, name=name, prefix=prefix, parent=parent, **kwargs)
+
+    async def create_file(
+            self,
+            name: str = None,
+            path: str = None,
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            **kwargs
+    ) -> synapseclient.File:
+        """See SynapseTestHelper.create_file."""
+        return await self._run(self._helper.create_file, name=name, path=path, parent=parent, **kwargs)
+
+    async def create_team(
+            self,
+            name: str = None,
+            prefix: str = None,
+            **kwargs
+    ) -> synapseclient.Team:
+        """See SynapseTestHelper.create_team."""
+        return await self._run(self._helper.create_team, name=name, prefix=prefix, **kwargs)
+
+    async def create_wiki(
+            self,
+            title: str = None,
+            prefix: str = None,
+            **kwargs
+    ) -> synapseclient.Wiki:
+        """See SynapseTestHelper.create_wiki."""
+        return await self._run(self._helper.create_wiki, title=title, prefix=prefix, **kwargs)
+
+    async def create_temp_dir(
+            self,
+            name: str = None,
+            suffix: str = None,
+            prefix: str = None,
+            dir: str = None
+    ) -> str:
+        """See SynapseTestHelper.create_temp_dir."""
+        return await self._run(self._helper.create_temp_dir, name=name, suffix=suffix, prefix=prefix, dir=dir)
+
+    async def create_temp_file(
+            self,
+            name: str = None,
+            suffix: str = None,
+            prefix: str = None,
+            dir: str = None,
+            content: str = None,
+            size: int = None,
+            fill: str = 'random'
+    ) -> str:
+        """See SynapseTestHelper.create_temp_file."""
+        return await self._run(self._helper.create_temp_file,
+                               name=name, suffix=suffix, prefix=prefix, dir=dir, content=content, size=size,
+                               fill=fill)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import typing as t
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+
+
+class DeferredDisposal:
+    """Runs disposal batches on a background thread so teardown overlaps with the next test.
+
+    Batches run one at a time in the order they were submitted so the ordering within each batch is kept.
+    Share one DeferredDisposal between SynapseTestHelpers and call flush at the end of the session.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self.failed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def submit(
+            self,
+            func: t.Callable[..., list[t.Any]],
+            *args,
+            **kwargs
+    ) -> Future:
+        """Queues a batch.
+
+        Args:
+            func: Function that deletes the batch and returns the objects that could not be deleted.
+            *args: func args.
+            **kwargs: func kwargs.
+
+        Returns:
+            Future
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='DeferredDisposal')
+            future = self._executor.submit(func, *args, **kwargs)
+            self._pending.append(future)
+        return future
+
+    @property
+    def pending(self) -> int:
+        """Gets the number of batches that have not finished."""
+        with self._lock:
+            return len([future for future in self._pending if not future.done()])
+
+    def flush(
+            self,
+            timeout: float = None
+    ) -> bool:
+        """Waits for the queued batches to finish.
+
+        Objects that could not be deleted are logged and stored in failed.
+
+        Args:
+            timeout: Maximum seconds to wait. (optional)
+
+        Returns:
+            True if every queued object was deleted, else False.
+        """
+        with self._lock:
+            futures = list(self._pending)
+
+        done, not_done = wait(futures, timeout=timeout)
+
+        failed = []
+        for future in futures:
+            if future not in done:
+                continue
+            try:
+                failed.extend(future.result())
+            except Exception as ex:
+                logging.warning('Deferred disposal failed: {0}'.format(str(ex)))
+                failed.append(ex)
+
+        with self._lock:
+            self._pending = [future for future in self._pending if future not in done]
+            self.failed = failed
+
+        if failed:
+            logging.warning('Could not delete {0} deferred object(s).'.format(len(failed)))
+        if not_done:
+            logging.warning('Timed out waiting for {0} deferred disposal batch(es).'.format(len(not_done)))
+        return not failed and not not_done
+
+    def close(self) -> bool:
+        """Waits for the queued batches to finish and stops the background thread.
+
+        Returns:
+            True if every queued object was deleted, else False.
+        """
+        result = self.flush()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        return result
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import typing as t
+
+
+class DisposeResult:
+    """The outcome of disposing of a single object."""
+
+    DELETED = 'deleted'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+    def __init__(
+            self,
+            obj: t.Any,
+            outcome: str = DELETED,
+            attempts: int = 0,
+            latency: float = 0.0,
+            error: Exception = None
+    ):
+        """
+        Args:
+            obj: The disposed object.
+            outcome: One of: deleted, skipped (deleted by an ancestor), failed.
+            attempts: Number of times the delete was attempted.
+            latency: Total seconds spent on the attempts.
+            error: The error from the last failed attempt. (optional)
+        """
+        self.obj = obj
+        self.outcome = outcome
+        self.attempts = attempts
+        self.latency = latency
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """Gets if the object is gone."""
+        return self.outcome != self.FAILED
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return 'DisposeResult(obj={0!r}, outcome={1!r}, attempts={2}, latency={3:.3f}, error={4!r})'.format(
+            self.obj, self.outcome, self.attempts, self.latency, self.error)
+
+
+class DisposeReport:
+    """The outcome of a dispose. True if every object was deleted or skipped."""
+
+    def __init__(
+            self,
+            results: list[DisposeResult] = None,
+            passes: int = 0
+    ):
+        """
+        Args:
+            results: The result of each object. (optional)
+            passes: Number of delete passes, including retry passes.
+        """
+        self.results = list(results or [])
+        self.passes = passes
+
+    def __bool__(self):
+        return all(result.ok for result in self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self) -> t.Iterator[DisposeResult]:
+        return iter(self.results)
+
+    def _objects(
+            self,
+            outcome: str
+    ) -> list[t.Any]:
+        return [result.obj for result in self.results if result.outcome == outcome]
+
+    @property
+    def deleted(self) -> list[t.Any]:
+        """Gets the objects that were deleted."""
+        return self._objects(DisposeResult.DELETED)
+
+    @property
+    def skipped(self) -> list[t.Any]:
+        """Gets the objects that were not deleted because they are deleted by an ancestor."""
+        return self._objects(DisposeResult.SKIPPED)
+
+    @property
+    def pruned_count(self) -> int:
+        """Gets the number of objects that were skipped because an ancestor being disposed deletes them."""
+        return len(self.skipped)
+
+    @property
+    def failed(self) -> list[t.Any]:
+        """Gets the objects that could not be deleted."""
+        return self._objects(DisposeResult.FAILED)
+
+    @property
+    def retried(self) -> list[t.Any]:
+        """Gets the objects that took more than one attempt."""
+        return [result.obj for result in self.results if result.attempts > 1]
+
+    def __repr__(self):
+        return 'DisposeReport(deleted={0}, skipped={1}, failed={2}, retried={3}, passes={4})'.format(
+            len(self.deleted), len(self.skipped), len(self.failed), len(self.retried), self.passes)
@@ -0,0 +1,933 @@
+from __future__ import annotations
+import typing as t
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import synapseclient
+
+ROOT_ENTITY_ID = 'syn4489'
+
+ENTITY_TYPES = {
+    'org.sagebionetworks.repo.model.Project': 'project',
+    'org.sagebionetworks.repo.model.Folder': 'folder',
+    'org.sagebionetworks.repo.model.FileEntity': 'file',
+}
+
+S3_FILE_HANDLE = 'org.sagebionetworks.repo.model.file.S3FileHandle'
+EXTERNAL_FILE_HANDLE = 'org.sagebionetworks.repo.model.file.ExternalFileHandle'
+
+
+class FakeSynapseError(Exception):
+    """Error that is returned to the client as a Synapse error response."""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class FakeSynapseServer:
+    """In-process stand-in for the parts of the Synapse REST API used by SynapseTestHelper.
+
+    All state is kept in memory. Each request can be delayed with latency and failed with injected errors.
+
+    Example:
+
+        with FakeSynapseServer(latency=0.01) as server:
+            with SynapseTestHelper(server.client()) as sth:
+                project = sth.create_project()
+    """
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            latency: float | t.Callable[[str, str], float] = 0.0,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            auth_token: str = 'fake-synapse-auth-token',
+            seed: int = None
+    ):
+        """
+        Args:
+            host: Host to listen on.
+            port: Port to listen on. 0 picks a free port.
+            latency: Seconds to delay each request, or a function called with the method and path that returns it.
+            error_rate: Fraction of requests (0 - 1) that randomly fail with error_status.
+            error_status: The HTTP status for random errors.
+            auth_token: The token clients must log in with.
+            seed: Seed for the random errors. (optional)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Number of results per page for the listings that use a nextPageToken.
+        self.page_size = 50
+        self.auth_token = auth_token
+        self.user = {'ownerId': '3350001', 'userName': 'fake-user', 'displayName': 'Fake User'}
+        self.request_counts = {}
+        self._random = random.Random(seed)
+        self._injected_errors = []
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+        self._ids = itertools.count(1000)
+        self._routes = self._build_routes()
+        self.reset()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def reset(self) -> None:
+        """Clears all state."""
+        with self._lock:
+            self.entities = {}
+            self.trash_can = {}
+            # Child IDs of each entity by name, so lookups do not scan every entity.
+            self._children = {}
+            self.annotations = {}
+            self.acls = {}
+            self.teams = {}
+            self.team_members = {}
+            self.wikis = {}
+            self.file_handles = {}
+            self.uploads = {}
+            self.request_counts.clear()
+            self._injected_errors.clear()
+
+    def start(self) -> FakeSynapseServer:
+        """Starts serving requests on a background thread."""
+        if self._httpd is None:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+            self._httpd.daemon_threads = True
+            self.port = self._httpd.server_address[1]
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name='FakeSynapseServer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops serving requests."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Gets the base URL of the server."""
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    @property
+    def endpoints(self) -> dict[str, str]:
+        """Gets the synapseclient.Synapse endpoint kwargs for the server."""
+        return {
+            'repoEndpoint': self.url + '/repo/v1',
+            'authEndpoint': self.url + '/auth/v1',
+            'fileHandleEndpoint': self.url + '/file/v1',
+            'portalEndpoint': self.url + '/'
+        }
+
+    def client(
+            self,
+            login: bool = True,
+            **kwargs
+    ) -> synapseclient.Synapse:
+        """Creates a synapseclient.Synapse that uses the server.
+
+        Args:
+            login: Log the client in with the server's auth token.
+            **kwargs: Additional synapseclient.Synapse kwargs.
+
+        Returns:
+            synapseclient.Synapse
+        """
+        kwargs.setdefault('skip_checks', True)
+        kwargs.setdefault('configPath', '')
+        synapse_client = synapseclient.Synapse(**self.endpoints, **kwargs)
+        if login:
+            synapse_client.login(authToken=self.auth_token, silent=True, rememberMe=False, forced=True)
+        return synapse_client
+
+    def inject_error(
+            self,
+            status: int = 503,
+            method: str = None,
+            path: str = None,
+            count: int = 1,
+            reason: str = 'Injected error'
+    ) -> None:
+        """Fails the next matching requests.
+
+        Args:
+            status: The HTTP status to return.
+            method: Only fail requests with this HTTP method. (optional)
+            path: Only fail requests whose path matches this regular expression. (optional)
+            count: Number of requests to fail.
+            reason: The error reason.
+        """
+        with self._lock:
+            self._injected_errors.append({'status': status, 'method': method, 'path': path,
+                                          'count': count, 'reason': reason})
+
+    def add_entities(
+            self,
+            *entities: dict
+    ) -> list[dict]:
+        """Adds entities to the in-memory state without making requests. Used to set up large fixtures quickly.
+
+        Args:
+            *entities: Entity JSON with at least concreteType, name, and parentId for Folders and Files.
+
+        Returns:
+            The created entity JSON.
+        """
+        with self._lock:
+            return [self._create_entity(None, {}, dict(entity)) for entity in entities]
+
+    def _take_error(
+            self,
+            method: str,
+            path: str
+    ) -> FakeSynapseError | None:
+        with self._lock:
+            for error in self._injected_errors:
+                if (error['method'] is None or error['method'] == method) and \
+                        (error['path'] is None or re.search(error['path'], path)):
+                    error['count'] -= 1
+                    if error['count'] <= 0:
+                        self._injected_errors.remove(error)
+                    return FakeSynapseError(error['status'], error['reason'])
+            if self.error_rate and self._random.random() < self.error_rate:
+                return FakeSynapseError(self.error_status, 'Random injected error')
+        return None
+
+    # Request handling
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = server._dispatch(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        return Handler
+
+    def _dispatch(
+            self,
+            method: str,
+            raw_path: str,
+            headers: t.Mapping[str, str],
+            body: bytes
+    ) -> tuple[int, dict, bytes]:
+        url = urlsplit(raw_path)
+        path = url.path
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        latency = self.latency(method, path) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        try:
+            error = self._take_error(method, path)
+            if error:
+                raise error
+
+            for route_method, pattern, is_raw, handler in self._routes:
+                if route_method != method:
+                    continue
+                match = pattern.fullmatch(path)
+                if match is None:
+                    continue
+                with self._lock:
+                    self.request_counts[handler.__name__] = self.request_counts.get(handler.__name__, 0) + 1
+                # Raw routes stand in for pre-signed S3 URLs which are not authenticated and do not use JSON.
+                if is_raw:
+                    with self._lock:
+                        return 200, {'Content-Type': 'application/octet-stream'}, handler(match, query, body) or b''
+                if headers.get('Authorization') != 'Bearer {0}'.format(self.auth_token):
+                    raise FakeSynapseError(401, 'Invalid access token.')
+                try:
+                    data = json.loads(body) if body else {}
+                except ValueError:
+                    raise FakeSynapseError(400, 'Request body is not valid JSON.')
+                with self._lock:
+                    result = handler(match, query, data)
+                if result is None:
+                    return 200, {}, b''
+                return 200, {'Content-Type': 'application/json'}, json.dumps(result).encode()
+
+            raise FakeSynapseError(404, 'The resource you are attempting to access cannot be found: {0} {1}'
+                                   .format(method, path))
+        except FakeSynapseError as ex:
+            return ex.status, {'Content-Type': 'application/json'}, json.dumps({'reason': ex.reason}).encode()
+        except Exception as ex:
+            return 500, {'Content-Type': 'application/json'}, json.dumps({'reason': str(ex)}).encode()
+
+    def _build_routes(self) -> list[tuple[str, t.Pattern, bool, t.Callable]]:
+        routes = [
+            ('GET', '/repo/v1/userProfile/?', self._get_user_profile),
+            ('GET', '/repo/v1/userProfile/(?P<id>[^/]+)', self._get_user_profile),
+            ('POST', '/repo/v1/entity', self._create_entity),
+            ('POST', '/repo/v1/entity/child', self._get_entity_id_by_name),
+            ('POST', '/repo/v1/entity/children', self._get_children),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)', self._get_entity),
+            ('PUT', '/repo/v1/entity/(?P<id>syn\\d+)', self._update_entity),
+            ('DELETE', '/repo/v1/entity/(?P<id>syn\\d+)', self._delete_entity),
+            ('POST', '/repo/v1/entity/(?P<id>syn\\d+)(/version/\\d+)?/bundle2', self._get_entity_bundle),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/annotations2', self._get_annotations),
+            ('PUT', '/repo/v1/entity/(?P<id>syn\\d+)/annotations2', self._put_annotations),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/benefactor', self._get_benefactor),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/acl', self._get_entity_acl),
+            ('PUT', '/repo/v1/entity/(?P<id>syn\\d+)/acl', self._put_entity_acl),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/permissions', self._get_permissions),
+            ('POST', '/repo/v1/entity/(?P<id>syn\\d+)/wiki', self._create_wiki),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/wiki', self._get_root_wiki),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/wikikey', self._get_wiki_key),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/wiki/(?P<wiki_id>\\d+)', self._get_wiki),
+            ('PUT', '/repo/v1/entity/(?P<id>syn\\d+)/wiki/(?P<wiki_id>\\d+)', self._update_wiki),
+            ('DELETE', '/repo/v1/entity/(?P<id>syn\\d+)/wiki/(?P<wiki_id>\\d+)', self._delete_wiki),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/wiki2', self._get_root_wiki2),
+            ('GET', '/repo/v1/entity/(?P<id>syn\\d+)/wiki2/(?P<wiki_id>\\d+)', self._get_wiki2),
+            ('POST', '/repo/v1/team', self._create_team),
+            ('POST', '/repo/v1/projects', self._list_projects),
+            ('GET', '/repo/v1/user/(?P<id>\\d+)/team', self._get_user_teams),
+            ('GET', '/repo/v1/teams', self._find_teams),
+            ('GET', '/repo/v1/team/(?P<id>\\d+)', self._get_team),
+            ('DELETE', '/repo/v1/team/(?P<id>\\d+)', self._delete_team),
+            ('GET', '/repo/v1/team/(?P<id>\\d+)/acl', self._get_team_acl),
+            ('PUT', '/repo/v1/team/acl', self._put_team_acl),
+            ('GET', '/repo/v1/teamMembers/(?P<id>\\d+)', self._get_team_members),
+            ('DELETE', '/repo/v1/team/(?P<id>\\d+)/member/(?P<member_id>\\d+)', self._delete_team_member),
+            ('GET', '/file/v1/entity/(?P<id>syn\\d+)/uploadDestination', self._get_upload_destination),
+            ('POST', '/file/v1/file/multipart', self._start_upload),
+            ('POST', '/file/v1/file/multipart/(?P<id>\\d+)/presigned/url/batch', self._get_upload_part_urls),
+            ('PUT', '/file/v1/file/multipart/(?P<id>\\d+)/add/(?P<part>\\d+)', self._add_upload_part),
+            ('PUT', '/file/v1/file/multipart/(?P<id>\\d+)/complete', self._complete_upload),
+            ('GET', '/file/v1/fileHandle/(?P<id>\\d+)', self._get_file_handle),
+            ('DELETE', '/file/v1/fileHandle/(?P<id>\\d+)', self._delete_file_handle),
+            ('POST', '/file/v1/filehandles/copy', self._copy_file_handles),
+            ('POST', '/file/v1/fileHandle/batch', self._get_file_handle_batch),
+            ('POST', '/file/v1/externalFileHandle', self._create_external_file_handle),
+        ]
+        raw_routes = [
+            ('PUT', '/s3/upload/(?P<id>\\d+)/(?P<part>\\d+)', self._put_upload_part),
+            ('GET', '/s3/file/(?P<id>\\d+)', self._download_file_handle),
+        ]
+        return [(method, re.compile(pattern), False, handler) for method, pattern, handler in routes] + \
+               [(method, re.compile(pattern), True, handler) for method, pattern, handler in raw_routes]
+
+    # Helpers
+
+    def _next_id(self) -> str:
+        return str(next(self._ids))
+
+    def _now(self) -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def _not_found(self, what: str = None) -> FakeSynapseError:
+        return FakeSynapseError(404, 'The resource you are attempting to access cannot be found'
+                                + (': {0}'.format(what) if what else ''))
+
+    def _entity(
+            self,
+            entity_id: str
+    ) -> dict:
+        if entity_id in self.trash_can:
+            raise FakeSynapseError(404, 'Entity {0} is in trash can.'.format(entity_id))
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            raise FakeSynapseError(404, 'Entity {0} does not exist'.format(entity_id))
+        return entity
+
+    def _descendants(
+            self,
+            entity_id: str,
+            entities: dict = None
+    ) -> list[str]:
+        """Gets the IDs of all the descendants of an entity, deepest first.
+
+        Live entities are found with the child index, otherwise the supplied entities are searched.
+        """
+        if entities is None:
+            children = list(self._children.get(entity_id, {}).values())
+        else:
+            children = [child_id for child_id, child in entities.items() if child.get('parentId') == entity_id]
+        result = []
+        for child_id in children:
+            result.extend(self._descendants(child_id, entities))
+            result.append(child_id)
+        return result
+
+    def _index_entity(
+            self,
+            entity: dict
+    ) -> None:
+        self._children.setdefault(entity['parentId'], {})[entity['name']] = entity['id']
+
+    def _unindex_entity(
+            self,
+            entity: dict
+    ) -> None:
+        siblings = self._children.get(entity['parentId'], {})
+        if siblings.get(entity['name']) == entity['id']:
+            del siblings[entity['name']]
+            if not siblings:
+                del self._children[entity['parentId']]
+
+    def _default_acl(
+            self,
+            resource_id: str
+    ) -> dict:
+        return {'id': resource_id, 'etag': str(uuid.uuid4()), 'creationDate': self._now(),
+                'resourceAccess': [{'principalId': int(self.user['ownerId']),
+                                    'accessType': ['READ', 'DOWNLOAD', 'UPDATE', 'CREATE', 'DELETE',
+                                                   'CHANGE_PERMISSIONS', 'CHANGE_SETTINGS', 'MODERATE']}]}
+
+    # Users
+
+    def _get_user_profile(self, match, query, data):
+        return dict(self.user)
+
+    # Entities
+
+    def _create_entity(self, match, query, data):
+        concrete_type = data.get('concreteType')
+        if concrete_type not in ENTITY_TYPES:
+            raise FakeSynapseError(400, 'Unsupported entity type: {0}'.format(concrete_type))
+        if not data.get('name'):
+            raise FakeSynapseError(400, 'Entity name cannot be null')
+
+        is_project = ENTITY_TYPES[concrete_type] == 'project'
+        parent_id = ROOT_ENTITY_ID if is_project else data.get('parentId')
+        if not is_project:
+            if not parent_id:
+                raise FakeSynapseError(400, 'Entity parentId cannot be null')
+            parent = self._entity(parent_id)
+            if ENTITY_TYPES[parent['concreteType']] == 'file':
+                raise FakeSynapseError(400, 'Files cannot have children')
+
+        if data['name'] in self._children.get(parent_id, {}):
+            raise FakeSynapseError(409, 'An entity with the name: {0} already exists with a parentId: {1}'
+                                       .format(data['name'], parent_id))
+
+        if ENTITY_TYPES[concrete_type] == 'file':
+            if data.get('dataFileHandleId') not in self.file_handles:
+                raise FakeSynapseError(400, 'FileEntity.dataFileHandleId cannot be null')
+
+        now = self._now()
+        entity = dict(data)
+        entity.update({
+            'id': 'syn{0}'.format(self._next_id()),
+            'etag': str(uuid.uuid4()),
+            'parentId': parent_id,
+            'createdOn': now,
+            'modifiedOn': now,
+            'createdBy': self.user['ownerId'],
+            'modifiedBy': self.user['ownerId']
+        })
+        if ENTITY_TYPES[concrete_type] == 'file':
+            entity.update({'versionNumber': 1, 'versionLabel': '1', 'isLatestVersion': True})
+        self.entities[entity['id']] = entity
+        self._index_entity(entity)
+        self.annotations[entity['id']] = {}
+        if is_project:
+            self.acls[entity['id']] = self._default_acl(entity['id'])
+        return entity
+
+    def _list_projects(self, match, query, data):
+        # Every project is created by the user so they are all in the ALL and CREATED lists.
+        projects = []
+        if data.get('filter', 'ALL') in ['ALL', 'CREATED']:
+            projects = list(map(self.entities.get, self._children.get(ROOT_ENTITY_ID, {}).values()))
+        offset = int(data.get('nextPageToken') or 0)
+        page = projects[offset:offset + self.page_size]
+        result = {'results': [{'id': project['id'], 'name': project['name'], 'modifiedOn': project['modifiedOn'],
+                               'modifiedBy': project['modifiedBy'], 'lastActivity': project['modifiedOn']}
+                              for project in page]}
+        if offset + self.page_size < len(projects):
+            result['nextPageToken'] = str(offset + self.page_size)
+        return result
+
+    def _get_entity_id_by_name(self, match, query, data):
+        parent_id = data.get('parentId') or ROOT_ENTITY_ID
+        entity_id = self._children.get(parent_id, {}).get(data.get('entityName'))
+        if entity_id is None:
+            raise self._not_found()
+        return {'id': entity_id}
+
+    def _get_children(self, match, query, data):
+        include_types = data.get('includeTypes') or ['folder', 'file']
+        page = [{'id': entity['id'], 'name': entity['name'], 'type': entity['concreteType']}
+                for entity in map(self.entities.get, self._children.get(data.get('parentId'), {}).values())
+                if ENTITY_TYPES[entity['concreteType']] in include_types]
+        return {'page': page}
+
+    def _get_entity(self, match, query, data):
+        return self._entity(match['id'])
+
+    def _update_entity(self, match, query, data):
+        entity = self._entity(match['id'])
+        if data.get('etag') != entity['etag']:
+            raise FakeSynapseError(412, 'Object: {0} was updated since you last fetched it'.format(entity['id']))
+        if ENTITY_TYPES[entity['concreteType']] == 'file' and \
+                data.get('dataFileHandleId') != entity.get('dataFileHandleId'):
+            data['versionNumber'] = entity['versionNumber'] + 1
+            data['versionLabel'] = str(data['versionNumber'])
+        self._unindex_entity(entity)
+        entity.update(data)
+        self._index_entity(entity)
+        entity['etag'] = str(uuid.uuid4())
+        entity['modifiedOn'] = self._now()
+        return entity
+
+    def _delete_entity(self, match, query, data):
+        entity_id = match['id']
+        skip_trash_can = query.get('skipTrashCan') == 'true'
+        if skip_trash_can and entity_id in self.trash_can:
+            for descendant_id in self._descendants(entity_id, self.trash_can) + [entity_id]:
+                self.trash_can.pop(descendant_id, None)
+            return None
+
+        self._entity(entity_id)
+        deleted_ids = self._descendants(entity_id) + [entity_id]
+        for descendant_id in deleted_ids:
+            entity = self.entities.pop(descendant_id)
+            self._unindex_entity(entity)
+            self.annotations.pop(descendant_id, None)
+            self.acls.pop(descendant_id, None)
+            if not skip_trash_can:
+                self.trash_can[descendant_id] = entity
+        if self.wikis:
+            deleted_ids = set(deleted_ids)
+            for wiki_id in [wiki_id for wiki_id, wiki in self.wikis.items() if wiki['ownerId'] in deleted_ids]:
+                self.wikis.pop(wiki_id)
+        return None
+
+    def _get_entity_bundle(self, match, query, data):
+        entity = self._entity(match['id'])
+        bundle = {}
+        if data.get('includeEntity'):
+            bundle['entity'] = entity
+        if data.get('includeAnnotations'):
+            bundle['annotations'] = self._get_annotations(match, query, data)
+        if data.get('includeFileHandles'):
+            file_handle = self.file_handles.get(entity.get('dataFileHandleId'))
+            bundle['fileHandles'] = [self._file_handle_json(file_handle)] if file_handle else []
+        if data.get('includeRestrictionInformation'):
+            bundle['restrictionInformation'] = {'objectId': entity['id'], 'restrictionLevel': 'OPEN',
+                                                'hasUnmetAccessRequirement': False}
+        if data.get('includePermissions'):
+            bundle['permissions'] = {'canView': True, 'canEdit': True, 'canDelete': True,
+                                     'canChangePermissions': True, 'canDownload': True, 'canUpload': True}
+        if data.get('includeBenefactorACL'):
+            bundle['benefactorAcl'] = self.acls[self._get_benefactor(match, query, data)['id']]
+        return bundle
+
+    def _get_annotations(self, match, query, data):
+        entity = self._entity(match['id'])
+        return {'id': entity['id'], 'etag': entity['etag'], 'annotations': self.annotations[entity['id']]}
+
+    def _put_annotations(self, match, query, data):
+        entity = self._entity(match['id'])
+        if data.get('etag') != entity['etag']:
+            raise FakeSynapseError(412, 'Object: {0} was updated since you last fetched it'.format(entity['id']))
+        self.annotations[entity['id']] = data.get('annotations') or {}
+        entity['etag'] = str(uuid.uuid4())
+        return self._get_annotations(match, query, data)
+
+    def _get_benefactor(self, match, query, data):
+        entity_id = match['id']
+        while entity_id not in self.acls:
+            entity_id = self._entity(entity_id)['parentId']
+        return {'id': entity_id, 'name': self.entities[entity_id]['name']}
+
+    def _get_entity_acl(self, match, query, data):
+        self._entity(match['id'])
+        acl = self.acls.get(match['id'])
+        if acl is None:
+            raise FakeSynapseError(403, 'Cannot access the ACL of a non-benefactor')
+        return acl
+
+    def _put_entity_acl(self, match, query, data):
+        acl = self._get_entity_acl(match, query, data)
+        acl.update({'resourceAccess': data.get('resourceAccess', []), 'etag': str(uuid.uuid4())})
+        return acl
+
+    def _get_permissions(self, match, query, data):
+        acl = self.acls[self._get_benefactor(match, query, data)['id']]
+        return {'canView': True, 'canEdit': True, 'canDelete': True, 'canDownload': True, 'canUpload': True,
+                'canChangePermissions': True, 'isCertifiedUser': True, 'canPublicRead': False,
+                'ownerPrincipalId': int(self.user['ownerId']),
+                'resourceAccess': acl['resourceAccess']}
+
+    # Wikis
+
+    def _create_wiki(self, match, query, data):
+        owner = self._entity(match['id'])
+        parent_wiki_id = data.get('parentWikiId')
+        if parent_wiki_id is None:
+            if any(wiki['ownerId'] == owner['id'] and wiki.get('parentWikiId') is None
+                   for wiki in self.wikis.values()):
+                raise FakeSynapseError(409, 'A root wiki already exists for: {0}'.format(owner['id']))
+        elif parent_wiki_id not in self.wikis:
+            raise self._not_found('wiki {0}'.format(parent_wiki_id))
+
+        now = self._now()
+        wiki = dict(data)
+        wiki.update({'id': self._next_id(), 'etag': str(uuid.uuid4()), 'createdOn': now, 'modifiedOn': now,
+                     'createdBy': self.user['ownerId'], 'modifiedBy': self.user['ownerId'],
+                     'ownerId': owner['id']})
+        self._store_markdown(wiki)
+        self.wikis[wiki['id']] = wiki
+        return self._wiki_json(wiki)
+
+    def _store_markdown(
+            self,
+            wiki: dict
+    ) -> None:
+        """Stores the markdown in a gzipped file handle like the wiki2 API."""
+        content = gzip.compress((wiki.get('markdown') or '').encode('utf-8'))
+        file_handle = self._new_file_handle('markdown.txt.gz', content_type='application/x-gzip',
+                                            content_md5=hashlib.md5(content).hexdigest(), content_size=len(content))
+        file_handle['content'] = content
+        wiki['markdownFileHandleId'] = file_handle['id']
+
+    def _wiki2_json(
+            self,
+            wiki: dict
+    ) -> dict:
+        return {k: v for k, v in wiki.items() if k not in ('ownerId', 'markdown')}
+
+    def _wiki_json(
+            self,
+            wiki: dict
+    ) -> dict:
+        return {k: v for k, v in wiki.items() if k != 'ownerId'}
+
+    def _wiki(
+            self,
+            owner_id: str,
+            wiki_id: str
+    ) -> dict:
+        self._entity(owner_id)
+        wiki = self.wikis.get(wiki_id)
+        if wiki is None or wiki['ownerId'] != owner_id:
+            raise self._not_found('wiki {0}'.format(wiki_id))
+        return wiki
+
+    def _get_root_wiki(self, match, query, data):
+        return self._wiki_json(self._wiki(match['id'], self._get_wiki_key(match, query, data)['wikiPageId']))
+
+    def _get_wiki_key(self, match, query, data):
+        self._entity(match['id'])
+        for wiki in self.wikis.values():
+            if wiki['ownerId'] == match['id'] and wiki.get('parentWikiId') is None:
+                return {'ownerObjectId': match['id'], 'ownerObjectType': 'ENTITY', 'wikiPageId': wiki['id']}
+        raise self._not_found('root wiki for {0}'.format(match['id']))
+
+    def _get_wiki(self, match, query, data):
+        return self._wiki_json(self._wiki(match['id'], match['wiki_id']))
+
+    def _update_wiki(self, match, query, data):
+        wiki = self._wiki(match['id'], match['wiki_id'])
+        if data.get('etag') != wiki['etag']:
+            raise FakeSynapseError(412, 'Wiki: {0} was updated since you last fetched it'.format(wiki['id']))
+        wiki.update({k: v for k, v in data.items() if k not in ('id', 'ownerId')})
+        wiki.update({'etag': str(uuid.uuid4()), 'modifiedOn': self._now()})
+        self._store_markdown(wiki)
+        return self._wiki_json(wiki)
+
+    def _get_root_wiki2(self, match, query, data):
+        return self._wiki2_json(self._wiki(match['id'], self._get_wiki_key(match, query, data)['wikiPageId']))
+
+    def _get_wiki2(self, match, query, data):
+        return self._wiki2_json(self._wiki(match['id'], match['wiki_id']))
+
+    def _delete_wiki(self, match, query, data):
+        wiki = self._wiki(match['id'], match['wiki_id'])
+        to_delete = [wiki['id']]
+        while to_delete:
+            wiki_id = to_delete.pop()
+            self.wikis.pop(wiki_id, None)
+            to_delete.extend(child_id for child_id, child in self.wikis.items()
+                             if child.get('parentWikiId') == wiki_id)
+        return None
+
+    # Teams
+
+    def _create_team(self, match, query, data):
+        if not data.get('name'):
+            raise FakeSynapseError(400, 'Team name cannot be null')
+        if any(team['name'] == data['name'] for team in self.teams.values()):
+            raise FakeSynapseError(409, 'Team name already exists: {0}'.format(data['name']))
+        now = self._now()
+        team = dict(data)
+        team.update({'id': self._next_id(), 'etag': str(uuid.uuid4()), 'createdOn': now, 'modifiedOn': now,
+                     'createdBy': self.user['ownerId'], 'modifiedBy': self.user['ownerId']})
+        self.teams[team['id']] = team
+        self.acls['team:' + team['id']] = self._default_acl(team['id'])
+        self.team_members[team['id']] = [self.user['ownerId']]
+        return team
+
+    def _find_teams(self, match, query, data):
+        fragment = (query.get('fragment') or '').lower()
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 10))
+        teams = [team for team in self.teams.values() if team['name'].lower().startswith(fragment)]
+        return {'results': teams[offset:offset + limit], 'totalNumberOfResults': len(teams)}
+
+    def _get_user_teams(self, match, query, data):
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 10))
+        teams = [team for team_id, team in self.teams.items() if match['id'] in self.team_members.get(team_id, [])]
+        return {'results': teams[offset:offset + limit], 'totalNumberOfResults': len(teams)}
+
+    def _team(
+            self,
+            team_id: str
+    ) -> dict:
+        team = self.teams.get(team_id)
+        if team is None:
+            raise self._not_found('team {0}'.format(team_id))
+        return team
+
+    def _get_team(self, match, query, data):
+        return self._team(match['id'])
+
+    def _delete_team(self, match, query, data):
+        self._team(match['id'])
+        self.teams.pop(match['id'])
+        self.team_members.pop(match['id'], None)
+        self.acls.pop('team:' + match['id'], None)
+        return None
+
+    def _get_team_acl(self, match, query, data):
+        self._team(match['id'])
+        return self.acls['team:' + match['id']]
+
+    def _put_team_acl(self, match, query, data):
+        acl = self._get_team_acl({'id': data.get('id')}, query, data)
+        acl.update({'resourceAccess': data.get('resourceAccess', []), 'etag': str(uuid.uuid4())})
+        return acl
+
+    def _get_team_members(self, match, query, data):
+        self._team(match['id'])
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 10))
+        members = [{'teamId': match['id'], 'isAdmin': member_id == self.user['ownerId'],
+                    'member': {'ownerId': member_id, 'userName': 'user{0}'.format(member_id), 'isIndividual': True}}
+                   for member_id in self.team_members[match['id']]]
+        return {'results': members[offset:offset + limit], 'totalNumberOfResults': len(members)}
+
+    def _delete_team_member(self, match, query, data):
+        self._team(match['id'])
+        members = self.team_members[match['id']]
+        if match['member_id'] in members:
+            members.remove(match['member_id'])
+        return None
+
+    # Files
+
+    def _get_upload_destination(self, match, query, data):
+        self._entity(match['id'])
+        return {'concreteType': 'org.sagebionetworks.repo.model.file.S3UploadDestination',
+                'storageLocationId': 1, 'uploadType': 'S3'}
+
+    def _start_upload(self, match, query, data):
+        part_size = data.get('partSizeBytes') or 5 * 1024 * 1024
+        part_count = max(1, -(-int(data.get('fileSizeBytes') or 0) // part_size))
+        upload = {'uploadId': self._next_id(), 'request': data, 'parts': {}, 'part_count': part_count,
+                  'state': 'UPLOADING', 'startedBy': self.user['ownerId'], 'startedOn': self._now()}
+        self.uploads[upload['uploadId']] = upload
+        return self._upload_status(upload)
+
+    def _upload_status(
+            self,
+            upload: dict
+    ) -> dict:
+        status = {'uploadId': upload['uploadId'], 'state': upload['state'], 'startedBy': upload['startedBy'],
+                  'startedOn': upload['startedOn'], 'updatedOn': self._now(),
+                  'partsState': ''.join('1' if number in upload['parts'] else '0'
+                                        for number in range(1, upload['part_count'] + 1))}
+        if 'resultFileHandleId' in upload:
+            status['resultFileHandleId'] = upload['resultFileHandleId']
+        return status
+
+    def _upload(
+            self,
+            upload_id: str
+    ) -> dict:
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise self._not_found('upload {0}'.format(upload_id))
+        return upload
+
+    def _get_upload_part_urls(self, match, query, data):
+        upload = self._upload(match['id'])
+        return {'partPresignedUrls': [{'partNumber': number,
+                                       'uploadPresignedUrl': '{0}/s3/upload/{1}/{2}'.format(self.url, upload['uploadId'],
+                                                                                      number),
+                                       'signedHeaders': {}}
+                                      for number in data.get('partNumbers', [])]}
+
+    def _put_upload_part(self, match, query, body):
+        upload = self._upload(match['id'])
+        upload.setdefault('data', {})[int(match['part'])] = body
+        return None
+
+    def _download_file_handle(self, match, query, body):
+        file_handle = self.file_handles.get(match['id'])
+        if file_handle is None:
+            raise self._not_found('file handle {0}'.format(match['id']))
+        return file_handle.get('content', b'')
+
+    def _get_file_handle_batch(self, match, query, data):
+        results = []
+        for requested in data.get('requestedFiles', []):
+            file_handle = self.file_handles.get(requested['fileHandleId'])
+            if file_handle is None:
+                results.append({'fileHandleId': requested['fileHandleId'], 'failureCode': 'NOT_FOUND'})
+                continue
+            result = {'fileHandleId': file_handle['id']}
+            if data.get('includeFileHandles'):
+                result['fileHandle'] = self._file_handle_json(file_handle)
+            if data.get('includePreSignedURLs'):
+                result['preSignedURL'] = '{0}/s3/file/{1}'.format(self.url, file_handle['id'])
+            results.append(result)
+        return {'requestedFiles': results}
+
+    def _add_upload_part(self, match, query, data):
+        upload = self._upload(match['id'])
+        part_number = int(match['part'])
+        part_data = upload.get('data', {}).get(part_number, b'')
+        if hashlib.md5(part_data).hexdigest() != query.get('partMD5Hex'):
+            return {'addPartState': 'ADD_FAILED', 'errorMessage': 'MD5 does not match', 'partNumber': part_number,
+                    'uploadId': upload['uploadId']}
+        upload['parts'][part_number] = query.get('partMD5Hex')
+        return {'addPartState': 'ADD_SUCCESS', 'partNumber': part_number, 'uploadId': upload['uploadId']}
+
+    def _complete_upload(self, match, query, data):
+        upload = self._upload(match['id'])
+        if upload['state'] != 'COMPLETED':
+            if len(upload['parts']) != upload['part_count']:
+                raise FakeSynapseError(400, 'Not all parts have been uploaded')
+            content = b''.join(upload['data'][number] for number in sorted(upload['data']))
+            request = upload['request']
+            file_handle = self._new_file_handle(request.get('fileName'),
+                                                content_type=request.get('contentType'),
+                                                content_md5=hashlib.md5(content).hexdigest(),
+                                                content_size=len(content))
+            file_handle['content'] = content
+            upload.pop('data')
+            upload['state'] = 'COMPLETED'
+            upload['resultFileHandleId'] = file_handle['id']
+        return self._upload_status(upload)
+
+    def _new_file_handle(
+            self,
+            file_name: str,
+            content_type: str = None,
+            content_md5: str = None,
+            content_size: int = None,
+            concrete_type: str = S3_FILE_HANDLE,
+            **kwargs
+    ) -> dict:
+        now = self._now()
+        file_handle = {
+            'id': self._next_id(),
+            'etag': str(uuid.uuid4()),
+            'createdBy': self.user['ownerId'],
+            'createdOn': now,
+            'modifiedOn': now,
+            'concreteType': concrete_type,
+            'contentType': content_type or 'application/octet-stream',
+            'contentMd5': content_md5,
+            'fileName': file_name,
+            'storageLocationId': 1,
+            'contentSize': content_size,
+            'status': 'AVAILABLE',
+        }
+        if concrete_type == S3_FILE_HANDLE:
+            file_handle.update({'bucketName': 'fake-synapse', 'key': '{0}/{1}'.format(uuid.uuid4(), file_name)})
+        file_handle.update(kwargs)
+        self.file_handles[file_handle['id']] = file_handle
+        return file_handle
+
+    def _file_handle_json(
+            self,
+            file_handle: dict
+    ) -> dict:
+        return {k: v for k, v in file_handle.items() if k != 'content'}
+
+    def _get_file_handle(self, match, query, data):
+        file_handle = self.file_handles.get(match['id'])
+        if file_handle is None:
+            raise self._not_found('file handle {0}'.format(match['id']))
+        return self._file_handle_json(file_handle)
+
+    def _create_external_file_handle(self, match, query, data):
+        if not data.get('externalURL'):
+            raise FakeSynapseError(400, 'externalURL is required')
+        file_handle = self._new_file_handle(data.get('fileName'),
+                                            content_type=data.get('contentType'),
+                                            content_md5=data.get('contentMd5'),
+                                            content_size=data.get('contentSize'),
+                                            concrete_type=EXTERNAL_FILE_HANDLE,
+                                            externalURL=data['externalURL'])
+        return self._file_handle_json(file_handle)
+
+    def _delete_file_handle(self, match, query, data):
+        self._get_file_handle(match, query, data)
+        self.file_handles.pop(match['id'])
+        return None
+
+    def _copy_file_handles(self, match, query, data):
+        results = []
+        for copy_request in data.get('copyRequests', []):
+            original_id = copy_request['originalFile']['fileHandleId']
+            original = self.file_handles.get(original_id)
+            if original is None:
+                results.append({'originalFileHandleId': original_id, 'failureCode': 'NOT_FOUND'})
+                continue
+            new_file_handle = self._new_file_handle(copy_request.get('newFileName') or original['fileName'],
+                                                    content_type=original['contentType'],
+                                                    content_md5=original['contentMd5'],
+                                                    content_size=original['contentSize'],
+                                                    concrete_type=original['concreteType'])
+            if 'content' in original:
+                new_file_handle['content'] = original['content']
+            results.append({'originalFileHandleId': original_id,
+                            'newFileHandle': self._file_handle_json(new_file_handle)})
+        return {'copyResults': results}
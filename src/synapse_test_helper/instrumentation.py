@@ -0,0 +1,183 @@
+from __future__ import annotations
+import typing as t
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+
+
+class Event:
+    """A single timed operation such as a create, wait, or delete."""
+
+    SUCCESS = 'success'
+    ERROR = 'error'
+    # A delete of an object that was already gone.
+    ALREADY_DELETED = 'already_deleted'
+
+    def __init__(
+            self,
+            operation: str,
+            object_type: str = None,
+            object_id: str = None
+    ):
+        """
+        Args:
+            operation: Name of the operation. E.g., create_project, wait_for_team, delete.
+            object_type: Type of the object. E.g., Project, Team, path. (optional)
+            object_id: Synapse ID or path of the object. (optional)
+        """
+        self.operation = operation
+        self.object_type = object_type
+        self.object_id = object_id
+        self.duration = 0.0
+        self.retries = 0
+        self.outcome = self.SUCCESS
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            'operation': self.operation,
+            'object_type': self.object_type,
+            'object_id': self.object_id,
+            'duration': self.duration,
+            'retries': self.retries,
+            'outcome': self.outcome,
+            'error': str(self.error) if self.error else None
+        }
+
+    def __repr__(self):
+        return 'Event({0})'.format(', '.join('{0}={1!r}'.format(k, v) for k, v in self.to_dict().items()))
+
+
+class Instrumentation:
+    """Times operations, sends each Event to the listeners, and keeps a summary of the times by operation.
+
+    Share one Instrumentation between SynapseTestHelpers to summarize a whole test session.
+    """
+
+    def __init__(
+            self,
+            listeners: list[t.Callable[[Event], None]] = None
+    ):
+        """
+        Args:
+            listeners: Functions called with each Event. (optional)
+        """
+        self._listeners = list(listeners or [])
+        self._durations = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add_listener(
+            self,
+            listener: t.Callable[[Event], None]
+    ) -> None:
+        """Adds a function that is called with each Event."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(
+            self,
+            listener: t.Callable[[Event], None]
+    ) -> None:
+        """Removes a listener."""
+        with self._lock:
+            self._listeners.remove(listener)
+
+    @contextlib.contextmanager
+    def track(
+            self,
+            operation: str,
+            object_type: str = None,
+            object_id: str = None
+    ) -> t.Iterator[Event]:
+        """Times the body of the with statement and records it as an Event.
+        The Event is yielded so the object and retries can be set once they are known.
+        Exceptions are recorded as an error outcome and re-raised.
+        """
+        event = Event(operation, object_type=object_type, object_id=object_id)
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException as ex:
+            event.outcome = Event.ERROR
+            event.error = ex
+            raise
+        finally:
+            event.duration = time.perf_counter() - start
+            self.record(event)
+
+    def record(
+            self,
+            event: Event
+    ) -> None:
+        """Adds an Event to the summary and sends it to the listeners."""
+        with self._lock:
+            self._durations.setdefault(event.operation, []).append(event.duration)
+            counts = self._counts.setdefault(event.operation, {'errors': 0, 'retries': 0})
+            counts['retries'] += event.retries
+            if event.outcome == Event.ERROR:
+                counts['errors'] += 1
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as ex:
+                logging.warning('Instrumentation listener failed: {0}'.format(str(ex)))
+
+    def summary(self) -> dict[str, dict]:
+        """Gets the count, errors, retries, total, mean, p50, p95, p99, and max seconds by operation."""
+        with self._lock:
+            items = [(operation, sorted(durations), dict(self._counts[operation]))
+                     for operation, durations in self._durations.items()]
+
+        result = {}
+        for operation, durations, counts in sorted(items):
+            total = sum(durations)
+            result[operation] = {
+                'count': len(durations),
+                'errors': counts['errors'],
+                'retries': counts['retries'],
+                'total': total,
+                'mean': total / len(durations),
+                'p50': self._percentile(durations, 50),
+                'p95': self._percentile(durations, 95),
+                'p99': self._percentile(durations, 99),
+                'max': durations[-1]
+            }
+        return result
+
+    def _percentile(
+            self,
+            ordered: list[float],
+            percent: float
+    ) -> float:
+        """Gets the nearest-rank percentile of sorted values."""
+        return ordered[max(1, math.ceil(percent / 100.0 * len(ordered))) - 1]
+
+    def dump(
+            self,
+            path: str = None
+    ) -> str:
+        """Gets the summary as JSON.
+
+        Args:
+            path: File to write the JSON to. (optional)
+
+        Returns:
+            The JSON string.
+        """
+        content = json.dumps(self.summary(), indent=2)
+        if path:
+            with open(path, 'w') as f:
+                f.write(content)
+        return content
+
+    def reset(self) -> None:
+        """Clears the summary."""
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
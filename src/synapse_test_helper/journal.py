@@ -0,0 +1,181 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+
+
+class Journal:
+    """Append-only JSON lines file of the objects waiting to be disposed.
+
+    Each line is a header, an add, or a remove record. The file is deleted when every added object is removed,
+    so a journal left on disk means the process that wrote it stopped before disposing everything.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            test_id: str = None
+    ):
+        """
+        Args:
+            path: Path to the journal file. Created on the first add.
+            test_id: The test_id of the SynapseTestHelper that writes the journal. (optional)
+        """
+        self.path = path
+        self.test_id = test_id
+        self.header = None
+        self._outstanding = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(record: dict) -> tuple[str, str]:
+        """Gets the key that identifies the object in a record."""
+        return record['kind'], record['id']
+
+    @property
+    def records(self) -> list[dict]:
+        """Gets the add records of the objects that have not been removed."""
+        with self._lock:
+            return list(self._outstanding.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._outstanding)
+
+    def add(
+            self,
+            *records: dict
+    ) -> None:
+        """Records objects that need to be disposed.
+
+        Args:
+            *records: Dicts with at least kind and id.
+        """
+        if not records:
+            return
+        with self._lock:
+            self._write([dict(record, op='add') for record in records])
+            for record in records:
+                self._outstanding[self.key(record)] = record
+
+    def remove(
+            self,
+            *records: dict
+    ) -> None:
+        """Records that objects were disposed. Deletes the file when no objects are left."""
+        with self._lock:
+            keys = [key for key in map(self.key, records) if key in self._outstanding]
+            if not keys:
+                return
+            for key in keys:
+                self._outstanding.pop(key)
+            if self._outstanding:
+                self._write([{'op': 'remove', 'kind': kind, 'id': id} for kind, id in keys])
+            else:
+                self._close()
+                if os.path.isfile(self.path):
+                    os.remove(self.path)
+
+    def close(self) -> None:
+        """Closes the file. The file is kept if there are objects that have not been removed."""
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(
+            self,
+            records: list[dict]
+    ) -> None:
+        """Appends the records and flushes them so they survive the process being killed."""
+        if self._file is None:
+            dir = os.path.dirname(self.path)
+            if dir:
+                os.makedirs(dir, exist_ok=True)
+            is_new = not os.path.isfile(self.path)
+            self._file = open(self.path, 'a')
+            if is_new:
+                self.header = {'op': 'header',
+                               'test_id': self.test_id,
+                               'pid': os.getpid(),
+                               'host': socket.gethostname(),
+                               'created': datetime.now(timezone.utc).isoformat()}
+                records = [self.header] + records
+        self._file.write(''.join(json.dumps(record) + '\n' for record in records))
+        self._file.flush()
+
+    def is_from_this_host(self) -> bool:
+        """Gets if the journal was written on this host."""
+        return bool(self.header) and self.header.get('host') == socket.gethostname()
+
+    def is_writer_running(self) -> bool:
+        """Gets if the process that wrote the journal is still running on this host.
+        Journals written on other hosts are treated as not running.
+        """
+        if not self.is_from_this_host():
+            return False
+        return _is_process_running(self.header.get('pid'))
+
+
+def load_journal(path: str) -> Journal:
+    """Reads a journal file.
+    A partially written last line, from a process that was killed while writing, is ignored.
+
+    Args:
+        path: Path to the journal file.
+
+    Returns:
+        Journal with the objects that have not been removed.
+    """
+    journal = Journal(path)
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning('Skipping invalid journal line in: {0}'.format(path))
+                continue
+            op = record.pop('op', None)
+            if op == 'header':
+                journal.header = record
+                journal.test_id = record.get('test_id')
+            elif op == 'add':
+                journal._outstanding[Journal.key(record)] = record
+            elif op == 'remove':
+                journal._outstanding.pop(Journal.key(record), None)
+    return journal
+
+
+def _is_process_running(pid: int | None) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
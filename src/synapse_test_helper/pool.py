@@ -0,0 +1,296 @@
+from __future__ import annotations
+import typing as t
+import collections
+import contextlib
+import functools
+import json
+import logging
+import threading
+import synapseclient
+from synapseclient import Project, Team
+from synapseclient.core.exceptions import SynapseHTTPError
+from .synapse_test_helper import SynapseTestHelper
+
+
+class WarmPool:
+    """Pool of pre-created Projects or Teams that are reset and reused between tests.
+
+    Objects are created in the background so acquire does not have to wait for Synapse.
+    Released objects are reset to a clean state and returned to the pool.
+    All the objects created by the pool are disposed when the pool is closed.
+
+    The pool creates its objects with the supplied SynapseTestHelper, use a helper that lives as long as the pool.
+    """
+
+    KINDS = ['project', 'team']
+
+    def __init__(
+            self,
+            synapse_test_helper: SynapseTestHelper,
+            kind: str = 'project',
+            size: int = 5,
+            low_watermark: int = None
+    ):
+        """
+        Args:
+            synapse_test_helper: The helper used to create and dispose of the pooled objects.
+            kind: The kind of object to pool. One of: project, team.
+            size: Number of available objects the pool fills up to.
+            low_watermark: Refill the pool when the number of available objects falls below this. Defaults to size/2.
+        """
+        if kind not in self.KINDS:
+            raise ValueError('kind must be one of: {0}'.format(', '.join(self.KINDS)))
+        if size < 1:
+            raise ValueError('size must be greater than 0.')
+
+        self._helper = synapse_test_helper
+        self.kind = kind
+        self.size = size
+        self.low_watermark = low_watermark if low_watermark is not None else max(1, size // 2)
+        self._available = collections.deque()
+        self._in_use = {}
+        self._created = []
+        self._acls = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def stats(self) -> dict:
+        """Gets the pool statistics."""
+        with self._cond:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'resets': self.resets,
+                'created': len(self._created),
+                'available': len(self._available),
+                'in_use': len(self._in_use)
+            }
+
+    def start(self) -> None:
+        """Starts filling the pool in the background."""
+        with self._cond:
+            if self._closed:
+                raise Exception('Pool is closed.')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._fill, name='WarmPool-{0}'.format(self.kind), daemon=True)
+                self._thread.start()
+
+    def close(self) -> bool:
+        """Stops filling the pool and disposes of every object the pool created.
+
+        Returns:
+            True if all items were deleted, else False.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._cond:
+            objects = list(self._created)
+            self._created.clear()
+            self._available.clear()
+            self._in_use.clear()
+            self._acls.clear()
+
+        return bool(self._helper.dispose(*objects)) if objects else True
+
+    def acquire(self) -> synapseclient.Project | synapseclient.Team:
+        """Gets an object from the pool. The object is created if the pool is empty.
+
+        Returns:
+            Project or Team
+        """
+        with self._cond:
+            if self._closed:
+                raise Exception('Pool is closed.')
+            if self._available:
+                obj = self._available.popleft()
+                self.hits += 1
+            else:
+                obj = None
+                self.misses += 1
+            if len(self._available) < self.low_watermark:
+                self._cond.notify_all()
+
+        if obj is None:
+            obj = self._create(1)[0]
+
+        with self._cond:
+            self._in_use[obj.id] = obj
+        return obj
+
+    def release(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> None:
+        """Resets an object and returns it to the pool.
+        The pool keeps a fresh copy of the object so the next acquire gets its current etag.
+        The object is disposed if the pool is full, closed, or the object cannot be reset.
+        """
+        with self._cond:
+            if self._in_use.pop(obj.id, None) is None:
+                raise ValueError('Object was not acquired from this pool: {0}'.format(obj.id))
+            keep = not self._closed and len(self._available) < self.size
+
+        if keep:
+            try:
+                self.reset(obj)
+                obj = self._get(obj)
+            except Exception as ex:
+                logging.warning('Could not reset: {0}, Error: {1}'.format(obj.id, str(ex)))
+                keep = False
+
+        with self._cond:
+            if keep:
+                self.resets += 1
+                self._created = [obj if created.id == obj.id else created for created in self._created]
+                self._available.append(obj)
+                self._cond.notify_all()
+                return
+            self._created = [created for created in self._created if created.id != obj.id]
+            self._acls.pop(obj.id, None)
+
+        self._helper.dispose(obj)
+
+    @contextlib.contextmanager
+    def lease(self) -> t.Iterator[synapseclient.Project | synapseclient.Team]:
+        """Context manager that acquires an object and releases it on exit."""
+        obj = self.acquire()
+        try:
+            yield obj
+        finally:
+            self.release(obj)
+
+    def reset(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> None:
+        """Resets an object to the state it was created in.
+
+        Projects have their children, root wiki, and annotations removed.
+        Teams have every member other than the creator removed.
+        The ACL of both is restored to the ACL it was created with.
+        """
+        # Pooled objects can belong to any of the helper's clients.
+        call = functools.partial(self._helper._call, synapse_client=self._helper._owner(obj))
+        if isinstance(obj, Project):
+            # getChildren and getTeamMembers page lazily so consume them inside the call.
+            children = call(lambda synapse_client: list(synapse_client.getChildren(obj)))
+            self._helper._map_concurrently(
+                lambda child: call('restDELETE', uri='/entity/{0}?skipTrashCan=true'.format(child['id'])),
+                children
+            )
+
+            try:
+                wiki_key = call('restGET', '/entity/{0}/wikikey'.format(obj.id))
+                call('restDELETE', '/entity/{0}/wiki/{1}'.format(obj.id, wiki_key['wikiPageId']))
+            except SynapseHTTPError as ex:
+                if getattr(ex.response, 'status_code', None) != 404:
+                    raise
+
+            annotations = call('get_annotations', obj)
+            if annotations:
+                annotations.clear()
+                call('set_annotations', annotations)
+        else:
+            for member in call(lambda synapse_client: list(synapse_client.getTeamMembers(obj))):
+                principal_id = member['member']['ownerId']
+                if str(principal_id) != str(obj.get('createdBy')):
+                    call('restDELETE', '/team/{0}/member/{1}'.format(obj.id, principal_id))
+
+        self._reset_acl(obj)
+
+    def _get(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> synapseclient.Project | synapseclient.Team:
+        """Gets the current version of an object from Synapse."""
+        synapse_client = self._helper._owner(obj)
+        if isinstance(obj, Team):
+            return self._helper._call('getTeam', obj.id, synapse_client=synapse_client)
+        return self._helper._call('get', obj.id, synapse_client=synapse_client)
+
+    def _fill(self) -> None:
+        """Keeps the pool filled until it is closed."""
+        while True:
+            with self._cond:
+                while not self._closed and len(self._available) >= self.low_watermark and self._created:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                count = self.size - len(self._available)
+
+            try:
+                objects = self._create(count) if count > 0 else []
+            except Exception as ex:
+                logging.warning('Could not fill pool: {0}'.format(str(ex)))
+                objects = []
+
+            with self._cond:
+                self._available.extend(objects)
+                self._cond.notify_all()
+                if not objects:
+                    # Do not spin if creating is failing, wait for the next acquire.
+                    self._cond.wait()
+
+    def _create(
+            self,
+            count: int
+    ) -> list[synapseclient.Project | synapseclient.Team]:
+        """Creates new objects and stores their ACLs so they can be reset."""
+        if self.kind == 'project':
+            objects = self._helper.create_projects(count, prefix='Pool_')
+        else:
+            objects = self._helper._map_concurrently(lambda _: self._helper.create_team(prefix='Pool_'),
+                                                     list(range(count)))
+
+        acls = {obj.id: self._get_acl(obj)['resourceAccess'] for obj in objects}
+        with self._cond:
+            self._created.extend(objects)
+            self._acls.update(acls)
+        return objects
+
+    def _acl_uri(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> str:
+        return obj.getACLURI() if isinstance(obj, Team) else '/entity/{0}/acl'.format(obj.id)
+
+    def _get_acl(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> dict:
+        return self._helper._call('restGET', self._acl_uri(obj), synapse_client=self._helper._owner(obj))
+
+    def _reset_acl(
+            self,
+            obj: synapseclient.Project | synapseclient.Team
+    ) -> None:
+        """Restores the ACL the object was created with if it has changed."""
+        original = self._acls.get(obj.id)
+        if original is None:
+            return
+
+        def _normalize(resource_access):
+            return sorted((str(ra['principalId']), sorted(ra['accessType'])) for ra in resource_access)
+
+        acl = self._get_acl(obj)
+        if _normalize(acl['resourceAccess']) != _normalize(original):
+            acl['resourceAccess'] = original
+            put_uri = obj.putACLURI() if isinstance(obj, Team) else self._acl_uri(obj)
+            self._helper._call('restPUT', put_uri, json.dumps(acl), synapse_client=self._helper._owner(obj))
@@ -0,0 +1,175 @@
+"""pytest plugin with SynapseTestHelper fixtures.
+
+Registered with the pytest11 entry point so the fixtures are available once the package is installed:
+
+- synapse_client: Session scoped logged in Synapse client. Override it in conftest.py to log in differently.
+- synapse_test_helper_session: Session scoped SynapseTestHelper.
+- synapse_test_helper_module: Module scoped SynapseTestHelper.
+- synapse_test_helper: Function scoped SynapseTestHelper.
+
+Every helper uses the session client and a session DeferredDisposal, so tearing down a module or function
+helper queues its trash for deletion in the background instead of blocking the next test. The session waits for
+the deletes when it finishes.
+
+All the helpers in a test run share one test_id. Under pytest-xdist the controller sends its test_id to the
+workers, each worker disposes of only the objects its own helpers created, and the controller sweeps anything left
+with the test_id once after every worker has finished. A run without pytest-xdist disposes of its own trash and only
+sweeps with --synapse-sweep, since sweeping pages through every Project and Team the account can see.
+"""
+from __future__ import annotations
+import typing as t
+import logging
+import os
+import pytest
+import synapseclient
+from .synapse_test_helper import SynapseTestHelper
+from .deferred import DeferredDisposal
+from .sweeper import Sweeper
+
+PLUGIN_NAME = 'synapse_test_helper_plugin'
+WORKER_INPUT_KEY = 'synapse_test_helper_test_id'
+WORKER_OUTPUT_KEY = 'synapse_test_helper_used'
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('synapse_test_helper', 'SynapseTestHelper')
+    group.addoption('--synapse-auth-token', default=os.environ.get('SYNAPSE_AUTH_TOKEN'),
+                    help='Synapse auth token for the synapse_client fixture. '
+                         'Default: SYNAPSE_AUTH_TOKEN environment variable.')
+    group.addoption('--synapse-max-workers', type=int, default=4,
+                    help='max_workers of the SynapseTestHelper fixtures.')
+    group.addoption('--synapse-sweep', action='store_true',
+                    help='Sweep objects left with the test_id of the run when a run without pytest-xdist finishes.')
+    group.addoption('--synapse-no-sweep', action='store_true',
+                    help='Do not sweep objects left with the test_id of the run when a pytest-xdist run finishes.')
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(SynapseTestHelperPlugin(config), PLUGIN_NAME)
+
+
+class SynapseTestHelperPlugin:
+    """State shared by the fixtures of a test run and the hooks that coordinate pytest-xdist workers."""
+
+    def __init__(self, config):
+        self.config = config
+        workerinput = getattr(config, 'workerinput', None)
+        self.is_worker = workerinput is not None
+        self.is_controller = False
+        self.test_id = workerinput.get(WORKER_INPUT_KEY) if self.is_worker else None
+        if not self.test_id:
+            self.test_id = SynapseTestHelper.new_test_id()
+        self.used = False
+        self.synapse_client = None
+
+    def new_helper(
+            self,
+            synapse_client: synapseclient.Synapse | list[synapseclient.Synapse],
+            deferred_disposal: DeferredDisposal
+    ) -> SynapseTestHelper:
+        """Creates a helper with the test_id of the run."""
+        self.used = True
+        return SynapseTestHelper(synapse_client,
+                                 max_workers=self.config.getoption('synapse_max_workers'),
+                                 deferred_disposal=deferred_disposal,
+                                 test_id=self.test_id)
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        """pytest-xdist controller hook. Sends the test_id of the run to a worker."""
+        self.is_controller = True
+        node.workerinput[WORKER_INPUT_KEY] = self.test_id
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        """pytest-xdist controller hook. Records if a worker used the fixtures or crashed."""
+        if error or getattr(node, 'workeroutput', {}).get(WORKER_OUTPUT_KEY):
+            self.used = True
+
+    def pytest_sessionfinish(self, session):
+        if self.is_worker:
+            self.config.workeroutput[WORKER_OUTPUT_KEY] = self.used
+            return
+        if not self.used:
+            return
+        if self.is_controller:
+            if self.config.getoption('synapse_no_sweep'):
+                return
+        elif not self.config.getoption('synapse_sweep'):
+            return
+        self.sweep()
+
+    def sweep(self) -> list[synapseclient.Project | synapseclient.Team]:
+        """Deletes the Projects and Teams left with the test_id of the run.
+
+        Returns:
+            The Projects and Teams that were found.
+        """
+        synapse_client = self.synapse_client
+        if synapse_client is None:
+            # The controller of an xdist run does not run the fixtures.
+            auth_token = self.config.getoption('synapse_auth_token')
+            if not auth_token:
+                logging.warning('Cannot sweep test_id {0}, no Synapse auth token.'.format(self.test_id))
+                return []
+            synapse_client = login(auth_token)
+        sweeper = Sweeper(SynapseTestHelper(synapse_client, max_workers=self.config.getoption('synapse_max_workers')))
+        matches = sweeper.sweep(test_id=self.test_id)
+        if matches:
+            logging.warning('Swept {0} object(s) left by test_id {1}.'.format(len(matches), self.test_id))
+        return matches
+
+
+def login(auth_token: str) -> synapseclient.Synapse:
+    """Creates a Synapse client logged in with an auth token."""
+    synapse_client = synapseclient.Synapse(skip_checks=True, configPath='', silent=True)
+    synapse_client.login(authToken=auth_token, silent=True, rememberMe=False, forced=True)
+    return synapse_client
+
+
+def _plugin(request) -> SynapseTestHelperPlugin:
+    return request.config.pluginmanager.get_plugin(PLUGIN_NAME)
+
+
+def _child_helper(
+        request,
+        parent: SynapseTestHelper
+) -> t.Iterator[SynapseTestHelper]:
+    """Yields a helper that queues its trash on the DeferredDisposal of the session helper."""
+    helper = _plugin(request).new_helper(parent.clients, parent.deferred_disposal)
+    yield helper
+    helper.dispose()
+
+
+@pytest.fixture(scope='session')
+def synapse_client(request) -> synapseclient.Synapse:
+    """Logged in Synapse client shared by the SynapseTestHelper fixtures. Logs in with --synapse-auth-token."""
+    auth_token = request.config.getoption('synapse_auth_token')
+    if not auth_token:
+        raise Exception('Set the SYNAPSE_AUTH_TOKEN environment variable or --synapse-auth-token.')
+    return login(auth_token)
+
+
+@pytest.fixture(scope='session')
+def synapse_test_helper_session(request, synapse_client) -> t.Iterator[SynapseTestHelper]:
+    """Session scoped SynapseTestHelper. Waits for the trash of every scope to be deleted when the session ends."""
+    plugin = _plugin(request)
+    plugin.synapse_client = synapse_client
+    with DeferredDisposal() as deferred_disposal:
+        helper = plugin.new_helper(synapse_client, deferred_disposal)
+        yield helper
+        helper.dispose()
+        if not deferred_disposal.flush():
+            logging.warning('Could not delete {0} object(s).'.format(len(deferred_disposal.failed)))
+
+
+@pytest.fixture(scope='module')
+def synapse_test_helper_module(request, synapse_test_helper_session) -> t.Iterator[SynapseTestHelper]:
+    """Module scoped SynapseTestHelper. Its trash is deleted in the background when the module finishes."""
+    yield from _child_helper(request, synapse_test_helper_session)
+
+
+@pytest.fixture
+def synapse_test_helper(request, synapse_test_helper_session) -> t.Iterator[SynapseTestHelper]:
+    """Function scoped SynapseTestHelper. Its trash is deleted in the background when the test finishes."""
+    yield from _child_helper(request, synapse_test_helper_session)
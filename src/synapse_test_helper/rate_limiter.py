@@ -0,0 +1,163 @@
+from __future__ import annotations
+import typing as t
+import logging
+import math
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket that limits the rate of Synapse calls and slows down when Synapse throttles them.
+
+    Every call takes a token. Tokens refill at the current rate up to burst. When a 429 response is observed
+    the current rate is multiplied by backoff and calls pause for the Retry-After time.
+    Each successful call multiplies the current rate by recovery until it is back to rate.
+    Share one RateLimiter between SynapseTestHelpers to limit their combined rate.
+    """
+
+    def __init__(
+            self,
+            rate: float = 10.0,
+            burst: int = None,
+            min_rate: float = 0.5,
+            backoff: float = 0.5,
+            recovery: float = 1.05,
+            max_pause: float = 60.0
+    ):
+        """
+        Args:
+            rate: Maximum requests per second.
+            burst: Maximum number of requests that can be made at once. Defaults to rate rounded up. (optional)
+            min_rate: The current rate is never reduced below this.
+            backoff: The current rate is multiplied by this when a request is throttled.
+            recovery: The current rate is multiplied by this after each successful request, up to rate.
+            max_pause: Maximum seconds to pause after a request is throttled.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0.')
+        self.rate = rate
+        self.burst = burst if burst else max(1, math.ceil(rate))
+        self.min_rate = min(min_rate, rate)
+        self.backoff = backoff
+        self.recovery = recovery
+        self.max_pause = max_pause
+        self._current_rate = rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._stats = {'calls': 0, 'throttled': 0, 'waited': 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def current_rate(self) -> float:
+        """Gets the requests per second currently allowed."""
+        with self._lock:
+            return self._current_rate
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """Gets the number of calls, throttled responses, and total seconds spent waiting for a token."""
+        with self._lock:
+            return dict(self._stats)
+
+    def acquire(self) -> float:
+        """Waits for a token.
+
+        Returns:
+            The seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._stats['calls'] += 1
+                    self._stats['waited'] += waited
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self._current_rate)
+            time.sleep(delay)
+            waited += delay
+
+    def _refill(
+            self,
+            now: float
+    ) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._current_rate)
+        self._updated = now
+
+    def call(
+            self,
+            func: t.Callable,
+            *args,
+            **kwargs
+    ) -> t.Any:
+        """Waits for a token then calls func.
+
+        Returns:
+            The result of func.
+        """
+        self.acquire()
+        result = func(*args, **kwargs)
+        self.succeeded()
+        return result
+
+    def succeeded(self) -> None:
+        """Records a successful request. Raises the current rate towards rate."""
+        with self._lock:
+            if self._current_rate < self.rate:
+                self._refill(time.monotonic())
+                self._current_rate = min(self.rate, self._current_rate * self.recovery)
+
+    def throttled(
+            self,
+            retry_after: float = None
+    ) -> None:
+        """Records a throttled request. Lowers the current rate and pauses all calls.
+
+        Args:
+            retry_after: Seconds to pause. Defaults to the time for one token at the lowered rate. (optional)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._current_rate = max(self.min_rate, self._current_rate * self.backoff)
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 1 / self._current_rate
+            self._paused_until = max(self._paused_until, now + min(pause, self.max_pause))
+            self._stats['throttled'] += 1
+            current_rate = self._current_rate
+        logging.info('Throttled by Synapse, lowering the rate to {0:.2f} requests/sec.'.format(current_rate))
+
+    def observe(
+            self,
+            response,
+            *args,
+            **kwargs
+    ) -> None:
+        """requests response hook that calls throttled for 429 responses.
+        Sees the responses of the retries synapseclient makes internally.
+        """
+        if getattr(response, 'status_code', None) == 429:
+            self.throttled(retry_after=_parse_retry_after(response.headers.get('Retry-After')))
+
+    def install(
+            self,
+            synapse_client
+    ) -> None:
+        """Adds the observe hook to a Synapse client's HTTP session."""
+        session = getattr(synapse_client, '_requests_session', None)
+        if session is None:
+            return
+        hooks = session.hooks.setdefault('response', [])
+        if self.observe not in hooks:
+            hooks.append(self.observe)
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header in seconds. HTTP dates are ignored."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
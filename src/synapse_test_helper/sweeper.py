@@ -0,0 +1,196 @@
+from __future__ import annotations
+import typing as t
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+import synapseclient
+from synapseclient import Project, Team
+from .synapse_test_helper import SynapseTestHelper
+
+
+class Sweeper:
+    """Finds and deletes Projects and Teams leaked by SynapseTestHelper.
+
+    Objects are matched by the test_id that uniq_name puts in every generated name.
+    Only Projects created by the logged in user and Teams created by the user are matched.
+    """
+
+    KINDS = ['project', 'team']
+
+    def __init__(
+            self,
+            synapse_test_helper: SynapseTestHelper,
+            page_size: int = 50
+    ):
+        """
+        Args:
+            synapse_test_helper: The helper whose client and naming pattern are used.
+            page_size: Number of Teams to get per request.
+        """
+        self._helper = synapse_test_helper
+        self.page_size = page_size
+        self.failed = []
+
+    @property
+    def client(self) -> synapseclient.Synapse:
+        return self._helper.client
+
+    def find(
+            self,
+            test_id: str = None,
+            older_than: float | timedelta = None,
+            kinds: list[str] = None
+    ) -> list[synapseclient.Project | synapseclient.Team]:
+        """Lists the Projects and Teams page by page and gets the ones with names generated by uniq_name.
+
+        Args:
+            test_id: Only match objects created with this test_id. (optional)
+            older_than: Only match objects last modified longer than this many seconds ago. (optional)
+            kinds: The kinds of objects to find. Defaults to all KINDS. (optional)
+
+        Returns:
+            The matching Projects and Teams.
+        """
+        kinds = kinds if kinds else self.KINDS
+        unknown = [kind for kind in kinds if kind not in self.KINDS]
+        if unknown:
+            raise ValueError('kinds must be one of: {0}'.format(', '.join(self.KINDS)))
+
+        if isinstance(older_than, (int, float)):
+            older_than = timedelta(seconds=older_than)
+        cutoff = datetime.now(timezone.utc) - older_than if older_than is not None else None
+
+        matches = []
+        sources = []
+        if 'project' in kinds:
+            sources.append(self._iter_projects())
+        if 'team' in kinds:
+            sources.append(self._iter_teams())
+
+        for source in sources:
+            for obj in source:
+                name_test_id = self._helper.parse_test_id(obj.get('name'))
+                if name_test_id is None or (test_id is not None and name_test_id != test_id):
+                    continue
+                if cutoff is not None and self._parse_date(obj.get('modifiedOn')) > cutoff:
+                    continue
+                matches.append(obj)
+        return matches
+
+    def sweep(
+            self,
+            test_id: str = None,
+            older_than: float | timedelta = None,
+            kinds: list[str] = None,
+            dry_run: bool = False,
+            max_workers: int = None
+    ) -> list[synapseclient.Project | synapseclient.Team]:
+        """Finds and deletes the Projects and Teams with names generated by uniq_name.
+        Every page is listed before anything is deleted so deleting does not change the pages.
+        Objects that could not be deleted are logged and stored in failed.
+
+        Args:
+            test_id: Only delete objects created with this test_id. (optional)
+            older_than: Only delete objects last modified longer than this many seconds ago. (optional)
+            kinds: The kinds of objects to delete. Defaults to all KINDS. (optional)
+            dry_run: Find the objects but do not delete them.
+            max_workers: Maximum number of concurrent deletes. Defaults to the helper's max_workers. (optional)
+
+        Returns:
+            The matching Projects and Teams.
+        """
+        matches = self.find(test_id=test_id, older_than=older_than, kinds=kinds)
+        self.failed = []
+        if dry_run or not matches:
+            return matches
+
+        report = self._helper._dispose_phases([matches], max_workers=max_workers)
+        self.failed = report.failed
+        logging.info('Deleted {0} of {1} leaked object(s).'.format(len(matches) - len(self.failed), len(matches)))
+        return matches
+
+    def _iter_projects(self) -> t.Iterator[synapseclient.Project]:
+        """Iterates the Projects created by the user."""
+        request = {'filter': 'CREATED'}
+        while True:
+            page = self._helper._call('restPOST', '/projects', body=json.dumps(request))
+            for header in page.get('results', []):
+                yield Project(properties=header)
+            if not page.get('nextPageToken'):
+                return
+            request['nextPageToken'] = page['nextPageToken']
+
+    def _iter_teams(self) -> t.Iterator[synapseclient.Team]:
+        """Iterates the Teams created by the user."""
+        user_id = str(self._helper._call('getUserProfile')['ownerId'])
+        offset = 0
+        while True:
+            page = self._helper._call('restGET',
+                                      '/user/{0}/team?offset={1}&limit={2}'.format(user_id, offset, self.page_size))
+            results = page.get('results', [])
+            for team in results:
+                if str(team.get('createdBy')) == user_id:
+                    yield Team(**team)
+            offset += len(results)
+            if not results or offset >= page.get('totalNumberOfResults', 0):
+                return
+
+    def _parse_date(
+            self,
+            value: str | None
+    ) -> datetime:
+        """Parses a Synapse date. Missing dates are treated as now so they are never too old."""
+        if not value:
+            return datetime.now(timezone.utc)
+        value = value.replace('Z', '+0000')
+        date_format = '%Y-%m-%dT%H:%M:%S.%f%z' if '.' in value else '%Y-%m-%dT%H:%M:%S%z'
+        return datetime.strptime(value, date_format)
+
+
+def parse_duration(value: str) -> timedelta:
+    """Parses a duration such as 90, 90s, 30m, 12h, or 7d."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', value or '')
+    if match is None:
+        raise argparse.ArgumentTypeError('Invalid duration: {0}'.format(value))
+    unit = {'': 'seconds', 's': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}[match[2]]
+    return timedelta(**{unit: float(match[1])})
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Finds and deletes Projects and Teams leaked by SynapseTestHelper.')
+    parser.add_argument('--test-id', help='Only delete objects created with this test_id.')
+    parser.add_argument('--older-than', type=parse_duration,
+                        help='Only delete objects last modified longer ago than this. E.g., 90s, 30m, 12h, 7d.')
+    parser.add_argument('--kind', action='append', choices=Sweeper.KINDS, dest='kinds',
+                        help='Kind of object to delete. Can be repeated. Default: all.')
+    parser.add_argument('--dry-run', action='store_true', help='List the objects but do not delete them.')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of concurrent deletes.')
+    parser.add_argument('--auth-token', default=os.environ.get('SYNAPSE_AUTH_TOKEN'),
+                        help='Synapse auth token. Default: SYNAPSE_AUTH_TOKEN environment variable.')
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    synapse_client = synapseclient.Synapse(skip_checks=True, configPath='', silent=True)
+    synapse_client.login(authToken=options.auth_token, silent=True, rememberMe=False, forced=True)
+    sweeper = Sweeper(SynapseTestHelper(synapse_client, max_workers=options.max_workers))
+    matches = sweeper.sweep(test_id=options.test_id,
+                            older_than=options.older_than,
+                            kinds=options.kinds,
+                            dry_run=options.dry_run)
+
+    for obj in matches:
+        print('{0}{1}: {2} ({3})'.format('Would delete ' if options.dry_run else '',
+                                        type(obj).__name__, obj.get('name'), obj.get('id')))
+    if sweeper.failed:
+        print('Could not delete {0} object(s).'.format(len(sweeper.failed)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,21 +2,106 @@ from __future__ import annotations
 import typing as t
 import logging
 import os
+import re
+import json
 import uuid
-import time
+import glob
 import tempfile
+import time
+import functools
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import PurePath
+import requests
 import synapseclient
 from synapseclient import Project, Folder, File, Team, Wiki
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapseclient.core.utils import md5_for_file
+from .trash import Trash, TrashRecord, trash_key, is_path
+from .waiter import Waiter
+from .instrumentation import Instrumentation, Event
+from .deferred import DeferredDisposal
+from .journal import Journal, load_journal
+from .dispose_report import DisposeReport, DisposeResult
+from .rate_limiter import RateLimiter
+from .tree import EntityTree
+from .upload_cache import UploadCache
 
 
 class SynapseTestHelper:
     """Test helper for working with Synapse."""
 
-    def __init__(self, synapse_client: synapseclient.Synapse = None):
-        self._test_id = self._uniq_str()
-        self.trash = []
+    CLIENT_SELECTIONS = ['round_robin', 'least_loaded']
+
+    def __init__(
+            self,
+            synapse_client: synapseclient.Synapse | list[synapseclient.Synapse] = None,
+            max_workers: int = 1,
+            waiter: Waiter = None,
+            instrumentation: Instrumentation = None,
+            deferred_disposal: DeferredDisposal = None,
+            journal_dir: str = None,
+            dispose_retries: int = 3,
+            rate_limiter: RateLimiter = None,
+            client_selection: str = 'round_robin',
+            upload_cache: UploadCache = None,
+            share_default_parent: bool = False,
+            test_id: str = None
+    ):
+        """
+        Args:
+            synapse_client: A logged in Synapse client or a list of logged in clients to spread the calls over.
+                            (optional)
+            max_workers: Maximum number of concurrent Synapse calls made by dispose and the bulk create methods.
+                         1 runs sequentially.
+            waiter: The Waiter used to wait for changes to propagate in Synapse. (optional)
+            instrumentation: Records the time of every create, wait, and delete. (optional)
+            deferred_disposal: Run dispose in the background with this DeferredDisposal. (optional)
+            journal_dir: Directory to write a journal of the trash to so it can be recovered if the process is killed.
+                         See recover. (optional)
+            dispose_retries: Number of extra passes dispose makes to retry deletes that failed with a transient error
+                             (429, 5xx, or connection error). Waits between passes with the waiter's backoff.
+            rate_limiter: Limits the rate of Synapse calls. Share one between helpers to limit their combined rate.
+                          (optional)
+            client_selection: How Projects and Teams are spread over multiple clients: round_robin or least_loaded.
+                              Children are created and everything is deleted with the client that created the
+                              Project or Team.
+            upload_cache: Reuse the file handle of identical content instead of uploading it again. Share one between
+                          helpers to share the uploads. (optional)
+            share_default_parent: Create Folders and Files that do not have a parent in a single default_parent
+                                  Project instead of a new Project for each one.
+            test_id: Use this test_id instead of generating one, e.g., to share one between the helpers of a test run
+                     so they can be swept together. Must be a test_id generated by new_test_id. (optional)
+        """
+        if client_selection not in self.CLIENT_SELECTIONS:
+            raise ValueError('client_selection must be one of: {0}'.format(', '.join(self.CLIENT_SELECTIONS)))
+        if test_id is not None and not self.TEST_ID_PATTERN.fullmatch(test_id):
+            raise ValueError('Invalid test_id: {0}'.format(test_id))
+        self._test_id = test_id if test_id else self.new_test_id()
+        self.trash = Trash(key=self._trash_key)
         self._synapse_client = None
+        self._synapse_clients = []
+        self.client_selection = client_selection
+        self._client_index = 0
+        self._client_load = {}
+        self._owners = {}
+        self._clients_lock = threading.Lock()
+        self.max_workers = max_workers
+        self.waiter = waiter if waiter else Waiter()
+        self.instrumentation = instrumentation if instrumentation else Instrumentation()
+        self.deferred_disposal = deferred_disposal
+        self.dispose_retries = dispose_retries
+        self.rate_limiter = rate_limiter
+        self.upload_cache = upload_cache
+        self._cached_uploads = {}
+        self.share_default_parent = share_default_parent
+        self._default_parent = None
+        self._default_parent_created = False
+        self._default_parent_lock = threading.Lock()
+        # The test_id can be shared so make the journal name unique.
+        self.journal = Journal(os.path.join(journal_dir, '{0}_{1}.jsonl'.format(self._test_id, uuid.uuid4().hex)),
+                               test_id=self._test_id) if journal_dir else None
         if synapse_client:
             self.configure(synapse_client)
 
@@ -28,23 +113,34 @@ class SynapseTestHelper:
 
     def configure(
             self,
-            synapse_client: synapseclient.Synapse
+            synapse_client: synapseclient.Synapse | list[synapseclient.Synapse]
     ) -> bool:
         self.deconfigure()
 
-        if not isinstance(synapse_client, synapseclient.Synapse):
-            raise Exception('synapse_client must be an instance if synapseclient.Synapse.')
+        synapse_clients = list(synapse_client) if isinstance(synapse_client, (list, tuple)) else [synapse_client]
+        if not synapse_clients:
+            raise Exception('synapse_client must have at least one client.')
+
+        for client in synapse_clients:
+            if not isinstance(client, synapseclient.Synapse):
+                raise Exception('synapse_client must be an instance if synapseclient.Synapse.')
 
-        if synapse_client.credentials is None:
-            raise Exception('synapse_client must be logged in.')
+            if client.credentials is None:
+                raise Exception('synapse_client must be logged in.')
 
-        self._synapse_client = synapse_client
+        self._synapse_client = synapse_clients[0]
+        self._synapse_clients = synapse_clients
+        if self.rate_limiter is not None:
+            for client in synapse_clients:
+                self.rate_limiter.install(client)
 
         return self.configured
 
     def deconfigure(self) -> bool:
         """Removes configuration."""
         self._synapse_client = None
+        self._synapse_clients = []
+        self._owners.clear()
         return not self.configured
 
     @property
@@ -54,9 +150,85 @@ class SynapseTestHelper:
 
     @property
     def client(self) -> synapseclient:
-        """Gets the synapseclient."""
+        """Gets the synapseclient. The first client when configured with multiple clients."""
         return self._synapse_client
 
+    @property
+    def clients(self) -> list[synapseclient.Synapse]:
+        """Gets all the synapseclients."""
+        return list(self._synapse_clients)
+
+    def _call(
+            self,
+            method: str | t.Callable[..., t.Any],
+            *args,
+            synapse_client: synapseclient.Synapse = None,
+            client_reserved: bool = False,
+            **kwargs
+    ) -> t.Any:
+        """Calls a method on a client. Every Synapse call goes through here so it is rate limited.
+
+        Args:
+            method: Name of the client method, or a function that takes the client as its first argument.
+                    Use a function to consume methods that return lazy generators inside the call.
+            synapse_client: The client to call. Defaults to client. (optional)
+            client_reserved: The load of synapse_client was already added by _next_client.
+        """
+        synapse_client = synapse_client if synapse_client is not None else self.client
+        if not client_reserved:
+            self._add_load(synapse_client)
+        try:
+            func = functools.partial(method, synapse_client) if callable(method) else getattr(synapse_client, method)
+            if self.rate_limiter is None:
+                return func(*args, **kwargs)
+            return self.rate_limiter.call(func, *args, **kwargs)
+        finally:
+            with self._clients_lock:
+                self._client_load[id(synapse_client)] -= 1
+
+    def _add_load(
+            self,
+            synapse_client: synapseclient.Synapse
+    ) -> None:
+        with self._clients_lock:
+            self._client_load[id(synapse_client)] = self._client_load.get(id(synapse_client), 0) + 1
+
+    def _next_client(self) -> synapseclient.Synapse:
+        """Selects the client to create the next Project or Team with.
+        Adds a call to the load of the client so concurrent selections see it. Pass client_reserved to _call.
+        """
+        with self._clients_lock:
+            if len(self._synapse_clients) < 2:
+                client = self.client
+            elif self.client_selection == 'least_loaded':
+                client = min(self._synapse_clients, key=lambda client: self._client_load.get(id(client), 0))
+            else:
+                client = self._synapse_clients[self._client_index % len(self._synapse_clients)]
+                self._client_index += 1
+            self._client_load[id(client)] = self._client_load.get(id(client), 0) + 1
+            return client
+
+    def _set_owner(
+            self,
+            obj: t.Any,
+            synapse_client: synapseclient.Synapse
+    ) -> None:
+        """Records the client that created an object. Only needed when there are multiple clients."""
+        if len(self._synapse_clients) > 1:
+            self._owners[self._trash_key(obj)] = synapse_client
+
+    def _owner(
+            self,
+            obj: t.Any
+    ) -> synapseclient.Synapse:
+        """Gets the client that created an object, a Synapse ID, or the parent of a new object.
+        Defaults to client for objects that were not created by this helper.
+        """
+        if not self._owners or obj is None:
+            return self.client
+        key = ('entity', obj) if isinstance(obj, str) else self._trash_key(obj)
+        return self._owners.get(key, self.client)
+
     def _uniq_str(self) -> str:
         """Generates a unique Synapse friendly string."""
         return str(uuid.uuid4()).replace('-', '_')
@@ -89,6 +261,32 @@ class SynapseTestHelper:
             postfix = self._uniq_str()
         return "{0}{1}_{2}{3}".format(prefix, self.test_id, uuid.uuid4().hex, postfix)
 
+    # Matches a test_id.
+    TEST_ID_PATTERN = re.compile('[0-9a-f]{8}(?:_[0-9a-f]{4}){3}_[0-9a-f]{12}')
+
+    @staticmethod
+    def new_test_id() -> str:
+        """Generates a test_id without creating a helper, e.g., to share one between the helpers of a test run."""
+        return str(uuid.uuid4()).replace('-', '_')
+
+    # Matches the test_id and random hex in names generated by uniq_name.
+    UNIQ_NAME_PATTERN = re.compile('(?P<test_id>{0})_[0-9a-f]{{32}}'.format(TEST_ID_PATTERN.pattern))
+
+    def parse_test_id(
+            self,
+            name: str
+    ) -> str | None:
+        """Gets the test_id from a name generated by uniq_name.
+
+        Args:
+            name: The name to parse.
+
+        Returns:
+            The test_id or None if the name was not generated by uniq_name.
+        """
+        match = self.UNIQ_NAME_PATTERN.search(name or '')
+        return match['test_id'] if match else None
+
     @property
     def fake_synapse_id(self) -> str:
         """Gets a Synapse entity ID that does not exist in Synapse.
@@ -119,7 +317,8 @@ class SynapseTestHelper:
             obj
     ) -> bool:
         """Gets if an object is disposable by SynapseTestHelper."""
-        return obj is None or (type(obj) in self.DISPOSABLE_TYPES or self._is_path(obj) or self._is_filehandle(obj))
+        return obj is None or isinstance(obj, TrashRecord) or \
+            (type(obj) in self.DISPOSABLE_TYPES or self._is_path(obj) or self._is_filehandle(obj))
 
     def _verify_is_disposable(
             self,
@@ -133,78 +332,559 @@ class SynapseTestHelper:
             self,
             *disposable_objects: list[t.Any]
     ) -> None:
-        """Adds a disposable object to the list of objects to be deleted."""
+        """Adds a disposable object to the list of objects to be deleted.
+        The trash holds a compact TrashRecord of each object so the object itself is not kept alive.
+        Safe to call from multiple threads.
+        """
         for obj in disposable_objects:
             self._verify_is_disposable(obj)
-            if obj not in self.trash:
-                self.trash.append(obj)
+        records = [self._to_record(obj) for obj in disposable_objects]
+        self.trash.extend(records)
+        if self.journal is not None:
+            self.journal.add(*filter(None, map(self._journal_record, records)))
+
+    def _to_record(
+            self,
+            obj
+    ) -> TrashRecord | None:
+        """Gets the TrashRecord of a disposable object."""
+        return TrashRecord.from_object(obj) if obj is not None else None
+
+    def _journal_record(
+            self,
+            obj
+    ) -> dict | None:
+        """Gets the journal record for an object or None if the object cannot be recovered."""
+        return self._to_record(obj).to_dict() if obj is not None else None
+
+    def _object_from_journal_record(
+            self,
+            record: dict
+    ) -> TrashRecord:
+        """Creates a TrashRecord from a journal record."""
+        return TrashRecord.from_dict(record)
+
+    def _get_parent_id(
+            self,
+            obj
+    ) -> str | None:
+        """Gets the ID of the entity that deletes the object when it is deleted.
+
+        This is the parentId for Folders and Files and the ownerId for Wikis.
+        """
+        if isinstance(obj, TrashRecord):
+            return obj.parent_id
+        elif isinstance(obj, (Folder, File)):
+            parent_id = obj.get('parentId')
+        elif isinstance(obj, Wiki):
+            parent_id = obj.get('ownerId')
+        else:
+            return None
+        return parent_id if obj.get('id') else None
+
+    def _trash_key(
+            self,
+            obj
+    ) -> t.Hashable:
+        """Gets the identity of a disposable object. See trash_key."""
+        return trash_key(obj)
 
     def dispose(
             self,
-            *disposable_objects: list[t.Any] | [] | None
-    ) -> bool:
+            *disposable_objects: list[t.Any] | [] | None,
+            max_workers: int = None,
+            max_retries: int = None
+    ) -> DisposeReport:
         """Deletes any disposable objects that were created during testing.
         This method needs to be manually called after each or all tests are done, or use the context manager.
 
+        Objects are deleted in phases: Projects, then all other Synapse objects, then local paths (deepest first).
+        Each phase must finish before the next one starts. Within a phase the deletes run concurrently.
+
+        Deletes that fail with a transient error are retried in later passes, see dispose_retries.
+
+        Safe to call from multiple threads. The objects are taken out of the trash before they are deleted so
+        concurrent calls do not delete the same object from the trash twice.
+
+        When deferred_disposal is set the objects are removed from the trash and deleted in the background.
+        Call flush to wait for the deletes to finish.
+
         Args:
             *disposable_objects: Objects to delete. Can be in the trash or not.
+            max_workers: Maximum number of concurrent deletes. Defaults to self.max_workers. (optional)
+            max_retries: Overrides dispose_retries. (optional)
+
+        Returns:
+            DisposeReport with the outcome of each object. True if all items were deleted, else False.
+            Empty when the deletes are deferred.
+        """
+        # Take the objects out of the trash before deleting them so a concurrent dispose does not delete them too.
+        if disposable_objects:
+            for obj in disposable_objects:
+                self._verify_is_disposable(obj)
+            objects_to_dispose = disposable_objects
+            self._discard(*objects_to_dispose)
+        else:
+            objects_to_dispose = self.trash.pop_all()
+            self._discard()
+        return self._dispose_taken(objects_to_dispose, max_workers=max_workers, max_retries=max_retries)
+
+    def checkpoint(self) -> int:
+        """Gets a marker to dispose of only the objects added to the trash after it with rollback."""
+        return self.trash.checkpoint()
+
+    def rollback(
+            self,
+            marker: int,
+            max_workers: int = None,
+            max_retries: int = None
+    ) -> DisposeReport:
+        """Deletes the objects added to the trash after a checkpoint.
+        Takes O(k) time for k objects, the objects added before the checkpoint are not looked at.
+
+        Args:
+            marker: A marker from checkpoint.
+            max_workers: Maximum number of concurrent deletes. Defaults to self.max_workers. (optional)
+            max_retries: Overrides dispose_retries. (optional)
 
         Returns:
-            True if all items were deleted, else False.
+            DisposeReport with the outcome of each object. Empty when the deletes are deferred.
+        """
+        objects_to_dispose = self.trash.pop_since(marker)
+        self._discard()
+        return self._dispose_taken(objects_to_dispose, max_workers=max_workers, max_retries=max_retries)
+
+    @contextlib.contextmanager
+    def scope(
+            self,
+            default_parent: synapseclient.Project | synapseclient.Folder = None,
+            max_workers: int = None
+    ) -> t.Iterator[int]:
+        """Context manager that rolls back the objects added to the trash inside it.
+
+        Example:
+            with sth.scope():
+                folder = sth.create_folder(parent=shared_project)
+            # folder is deleted, shared_project is not.
+
+        Args:
+            default_parent: Create Folders and Files without a parent in this container inside the scope. (optional)
+            max_workers: Maximum number of concurrent deletes. Defaults to self.max_workers. (optional)
+
+        Yields:
+            The checkpoint marker.
+        """
+        marker = self.checkpoint()
+        if default_parent is not None:
+            with self._default_parent_lock:
+                previous = self._default_parent, self._default_parent_created
+            self.default_parent = default_parent
+        try:
+            yield marker
+        finally:
+            if default_parent is not None:
+                with self._default_parent_lock:
+                    self._default_parent, self._default_parent_created = previous
+            self.rollback(marker, max_workers=max_workers)
+
+    def _dispose_taken(
+            self,
+            objects_to_dispose: t.Iterable[t.Any],
+            max_workers: int = None,
+            max_retries: int = None
+    ) -> DisposeReport:
+        """Deletes objects that were taken out of the trash."""
+        phases, pruned = self._plan_dispose(objects_to_dispose)
+        max_workers = max_workers if max_workers else self.max_workers
+
+        if self.deferred_disposal:
+            def _dispose_in_background():
+                return self._dispose_batch(phases, pruned, max_workers=max_workers, max_retries=max_retries).failed
+
+            # The background thread only deletes, the trash was changed on this thread.
+            self.deferred_disposal.submit(_dispose_in_background)
+            return DisposeReport()
+
+        return self._dispose_batch(phases, pruned, max_workers=max_workers, max_retries=max_retries)
+
+    def _discard(
+            self,
+            *objs: t.Any
+    ) -> None:
+        """Removes objects from the trash."""
+        for obj in objs:
+            self.trash.discard(obj)
+        if self._default_parent_created and self._default_parent not in self.trash:
+            self.default_parent = None
+
+    def flush(
+            self,
+            timeout: float = None
+    ) -> bool:
+        """Waits for the deferred deletes to finish. Does nothing when deferred_disposal is not set.
+
+        Args:
+            timeout: Maximum seconds to wait. (optional)
+
+        Returns:
+            True if every deferred object was deleted, else False.
+        """
+        return self.deferred_disposal.flush(timeout=timeout) if self.deferred_disposal else True
+
+    def _plan_dispose(
+            self,
+            objects_to_dispose: t.Iterable[t.Any]
+    ) -> tuple[list[list[t.Any]], list[t.Any]]:
+        """Splits the objects into the phases they are deleted in.
+
+        Returns:
+            Tuple of the phases and the objects that are deleted by an ancestor, as TrashRecords.
         """
         projects = []
         paths = []
         others = []
 
-        objects_to_dispose = disposable_objects if disposable_objects else self.trash
-
         for obj in objects_to_dispose:
             self._verify_is_disposable(obj)
-            if isinstance(obj, Project):
-                projects.append(obj)
-            elif self._is_path(obj):
-                paths.append(obj)
+            record = self._to_record(obj)
+            if record is None:
+                others.append(record)
+            elif record.kind == 'entity' and record.type == 'Project':
+                projects.append(record)
+            elif record.kind == 'path':
+                paths.append(record)
             else:
-                others.append(obj)
+                others.append(record)
 
-        # Sort the temp files and folders so each file is removed first then the empty directory.
-        # If the directory is not empty then this process should not be the one to delete it. This is for safety!
-        paths.sort(reverse=True)
+        # Deleting an entity deletes everything under it so skip any object that has an ancestor being deleted.
+        others, pruned = self._prune_descendants(projects + others, others)
+        if pruned:
+            logging.info('Skipped deleting {0} object(s) that are deleted by an ancestor.'.format(len(pruned)))
 
         # Projects need to be deleted first.
-        for obj in projects + others + paths:
-            try:
-                if obj is None:
-                    pass
-                elif type(obj) in self.SKIP_SYNAPSE_TRASH_TYPES:
-                    self.client.restDELETE(uri='/entity/{0}?skipTrashCan=true'.format(obj.get('id')))
-                elif type(obj) in self.DISPOSABLE_SYNAPSE_TYPES:
-                    self.client.delete(obj)
-                elif self._is_path(obj):
-                    if os.path.isdir(obj):
-                        os.rmdir(obj)
-                    elif os.path.isfile(obj):
-                        os.remove(obj)
-                elif self._is_filehandle(obj):
-                    self.client.restDELETE(uri='/fileHandle/{0}'.format(obj.get('id')),
-                                           endpoint=self.client.fileHandleEndpoint)
-            except Exception as ex:
-                logging.warning('Could not delete: {0}, Error: {1}'.format(obj, str(ex)))
+        phases = [projects, others]
+
+        # Group the temp files and folders by depth so each file is removed first then the empty directory.
+        # If the directory is not empty then this process should not be the one to delete it. This is for safety!
+        path_levels = {}
+        for path in paths:
+            path_levels.setdefault(len(PurePath(path.path).parts), []).append(path)
+        for depth in sorted(path_levels, reverse=True):
+            phases.append(sorted(path_levels[depth], key=lambda record: record.path, reverse=True))
 
-            if obj in self.trash:
-                self.trash.remove(obj)
+        return phases, pruned
+
+    def _dispose_batch(
+            self,
+            phases: list[list[t.Any]],
+            pruned: list[t.Any],
+            max_workers: int = None,
+            max_retries: int = None
+    ) -> DisposeReport:
+        """Deletes the phases and removes the deleted objects from the journal."""
+        report = self._dispose_phases(phases, max_workers=max_workers, max_retries=max_retries)
+        report.results.extend(DisposeResult(obj, outcome=DisposeResult.SKIPPED) for obj in pruned)
+        if self.journal is not None:
+            self.journal.remove(*filter(None, (self._journal_record(result.obj) for result in report if result.ok)))
+        if self._cached_uploads:
+            cache_keys = [self._cached_uploads.pop(self._trash_key(result.obj), None) for result in report if result.ok]
+            report.results.extend(self._release_uploads(*filter(None, cache_keys)).results)
+        if self._owners:
+            for result in report:
+                if result.ok:
+                    self._owners.pop(self._trash_key(result.obj), None)
+        return report
+
+    def recover(
+            self,
+            journal_dir: str = None,
+            max_workers: int = None,
+            other_hosts: bool = False
+    ) -> DisposeReport:
+        """Disposes of the objects in journals left by processes that stopped before disposing everything.
+        Journals of processes that are still running on this host are skipped.
+        Journals written on other hosts are skipped unless other_hosts is set, since it cannot be checked if their
+        process is still running, e.g., when journal_dir is on a shared drive.
 
-        return len(objects_to_dispose) == 0
+        Args:
+            journal_dir: Directory with the journals. Defaults to the journal_dir of this helper. (optional)
+            max_workers: Maximum number of concurrent deletes. Defaults to self.max_workers. (optional)
+            other_hosts: Also recover the journals written on other hosts. (optional)
+
+        Returns:
+            DisposeReport of the recovered objects. True if all the recovered objects were deleted, else False.
+        """
+        if journal_dir is None:
+            if self.journal is None:
+                raise ValueError('journal_dir must be set.')
+            journal_dir = os.path.dirname(self.journal.path)
+
+        own_path = os.path.abspath(self.journal.path) if self.journal is not None else None
+        journals = []
+        for path in sorted(glob.glob(os.path.join(journal_dir, '*.jsonl'))):
+            if os.path.abspath(path) == own_path:
+                continue
+            journal = load_journal(path)
+            if not other_hosts and not journal.is_from_this_host():
+                logging.info('Skipping journal of another host: {0}'.format(path))
+                continue
+            if journal.is_writer_running():
+                logging.info('Skipping journal of running process: {0}'.format(path))
+                continue
+            journals.append((journal, [self._object_from_journal_record(record) for record in journal.records]))
+
+        objects = [obj for _, journal_objects in journals for obj in journal_objects]
+        phases, pruned = self._plan_dispose(objects)
+        report = self._dispose_phases(phases, max_workers=max_workers if max_workers else self.max_workers)
+        report.results.extend(DisposeResult(obj, outcome=DisposeResult.SKIPPED) for obj in pruned)
+        failed_ids = set(map(id, report.failed))
+
+        for journal, journal_objects in journals:
+            journal.remove(*(self._journal_record(obj) for obj in journal_objects if id(obj) not in failed_ids))
+            if not journal_objects and os.path.isfile(journal.path):
+                os.remove(journal.path)
+            journal.close()
+
+        if objects:
+            logging.info('Recovered {0} object(s) from {1} journal(s).'.format(len(objects) - len(failed_ids),
+                                                                             len(journals)))
+        return report
+
+    def _dispose_phases(
+            self,
+            phases: list[list[t.Any]],
+            max_workers: int = None,
+            max_retries: int = None
+    ) -> DisposeReport:
+        """Deletes each phase in order.
+        Objects that failed with a transient error are retried, in phase order, in up to max_retries more passes.
+        """
+        max_retries = self.dispose_retries if max_retries is None else max_retries
+        results = {}
+        delays = self.waiter.delays()
+        report = DisposeReport()
+
+        while phases:
+            report.passes += 1
+            retry_phases = []
+            for phase in phases:
+                attempts = self._map_concurrently(functools.partial(self._dispose_obj, attempt=report.passes - 1),
+                                                  phase, max_workers=max_workers)
+                retry = []
+                for attempt in attempts:
+                    result = results.get(id(attempt.obj))
+                    if result is None:
+                        result = results[id(attempt.obj)] = attempt
+                        report.results.append(result)
+                    else:
+                        result.attempts += attempt.attempts
+                        result.latency += attempt.latency
+                        result.outcome = attempt.outcome
+                        result.error = attempt.error
+
+                    if result.ok:
+                        continue
+                    elif report.passes <= max_retries and self._is_transient(result.error):
+                        logging.info('Retrying delete: {0}, Error: {1}'.format(result.obj, str(result.error)))
+                        retry.append(result.obj)
+                    else:
+                        logging.warning('Could not delete: {0}, Error: {1}'.format(result.obj, str(result.error)))
+                if retry:
+                    retry_phases.append(retry)
+
+            phases = retry_phases
+            if phases:
+                time.sleep(next(delays))
+
+        return report
+
+    def _is_transient(
+            self,
+            error: Exception
+    ) -> bool:
+        """Gets if a delete error is worth retrying: throttling, a server error, or a connection error."""
+        if isinstance(error, SynapseHTTPError):
+            status_code = getattr(error.response, 'status_code', None)
+            return status_code is not None and (status_code == 429 or status_code >= 500)
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def _get_entity_id(
+            self,
+            obj
+    ) -> str | None:
+        """Gets the Synapse ID of an entity (Project, Folder, File) or None if the object is not an entity."""
+        if isinstance(obj, TrashRecord):
+            return obj.id if obj.kind == 'entity' else None
+        return obj.get('id') if type(obj) in self.SKIP_SYNAPSE_TRASH_TYPES else None
+
+    def _prune_descendants(
+            self,
+            ancestors: list[t.Any],
+            objects: list[t.Any]
+    ) -> tuple[list[t.Any], list[t.Any]]:
+        """Splits objects into the objects that need to be deleted and the objects that will be deleted
+        when one of the ancestors is deleted.
+
+        Args:
+            ancestors: The objects being deleted that can delete their descendants.
+            objects: The objects to check.
+
+        Returns:
+            Tuple of the objects to delete and the objects that were pruned.
+        """
+        deleting = set(filter(None, (self._get_entity_id(obj) for obj in ancestors)))
+        if not deleting:
+            return objects, []
+
+        batch_parents = {self._get_entity_id(obj): self._get_parent_id(obj)
+                         for obj in objects if self._get_entity_id(obj) and self._get_parent_id(obj)}
+        has_deleting_ancestor = {}
+
+        def _check(entity_id):
+            visited = []
+            result = False
+            while entity_id and entity_id not in visited:
+                if entity_id in has_deleting_ancestor:
+                    result = has_deleting_ancestor[entity_id]
+                    break
+                visited.append(entity_id)
+                if entity_id in deleting:
+                    result = True
+                    break
+                entity_id = batch_parents.get(entity_id) or self._get_parent_id(self.trash.get(('entity', entity_id)))
+            for visited_id in visited:
+                has_deleting_ancestor[visited_id] = result
+            return result
+
+        kept = []
+        pruned = []
+        for obj in objects:
+            if _check(self._get_parent_id(obj)):
+                pruned.append(obj)
+            else:
+                kept.append(obj)
+        return kept, pruned
+
+    def _dispose_obj(
+            self,
+            obj,
+            attempt: int = 0
+    ) -> DisposeResult:
+        """Makes a single attempt to delete a disposable object.
+
+        Args:
+            obj: The object to delete.
+            attempt: Number of previous attempts, recorded as the retries in instrumentation.
+
+        Returns:
+            DisposeResult. True if the object was deleted, else False.
+        """
+        result = DisposeResult(obj, attempts=1)
+        if obj is None:
+            return result
+        record = self._to_record(obj)
+        start = time.perf_counter()
+        try:
+            with self._track('delete', record) as event:
+                event.retries = attempt
+                try:
+                    self._delete_record(record)
+                except SynapseHTTPError as ex:
+                    if getattr(ex.response, 'status_code', None) != 404:
+                        raise
+                    # The report counts it as deleted so it is not recorded as an error.
+                    event.outcome = Event.ALREADY_DELETED
+                    logging.info('Already deleted: {0}'.format(obj))
+        except Exception as ex:
+            result.outcome = DisposeResult.FAILED
+            result.error = ex
+        result.latency = time.perf_counter() - start
+        return result
+
+    def _delete_record(
+            self,
+            record: TrashRecord
+    ) -> None:
+        """Deletes the object of a TrashRecord."""
+        if record.kind == 'entity':
+            self._call('restDELETE', uri='/entity/{0}?skipTrashCan=true'.format(record.id),
+                       synapse_client=self._owner(record))
+        elif record.kind == 'team':
+            self._call('restDELETE', uri='/team/{0}'.format(record.id), synapse_client=self._owner(record))
+        elif record.kind == 'wiki':
+            self._call('restDELETE', uri='/entity/{0}/wiki/{1}'.format(record.parent_id, record.id),
+                       synapse_client=self._owner(record))
+        elif record.kind == 'path':
+            if os.path.isdir(record.path):
+                os.rmdir(record.path)
+            elif os.path.isfile(record.path):
+                os.remove(record.path)
+        elif record.kind == 'filehandle':
+            self._call('restDELETE', uri='/fileHandle/{0}'.format(record.id),
+                       endpoint=self.client.fileHandleEndpoint, synapse_client=self._owner(record))
+        else:
+            raise ValueError('Cannot delete {0} without an id.'.format(record.type))
+
+    def _track(
+            self,
+            operation: str,
+            obj: t.Any = None,
+            object_type: str = None
+    ) -> t.ContextManager[Event]:
+        """Times an operation on an object with the instrumentation."""
+        obj_type, obj_id = self._describe(obj)
+        return self.instrumentation.track(operation, object_type=object_type or obj_type, object_id=obj_id)
+
+    def _describe(
+            self,
+            obj: t.Any
+    ) -> tuple[str | None, str | None]:
+        """Gets the type and ID of an object for instrumentation."""
+        if obj is None:
+            return None, None
+        elif isinstance(obj, TrashRecord):
+            if obj.kind == 'path':
+                return 'path', obj.path
+            elif obj.kind == 'filehandle':
+                return 'filehandle', obj.id
+            return obj.type, obj.id if obj.kind != 'object' else None
+        elif self._is_path(obj):
+            return 'path', str(obj)
+        elif isinstance(obj, str):
+            return None, obj
+        elif self._is_filehandle(obj):
+            return 'filehandle', obj.get('id')
+        return type(obj).__name__, obj.get('id') if hasattr(obj, 'get') else None
+
+    def _map_concurrently(
+            self,
+            func: t.Callable,
+            items: list[t.Any],
+            max_workers: int = None
+    ) -> list[t.Any]:
+        """Calls func for each item using a bounded thread pool.
+
+        Args:
+            func: Function to call with each item.
+            items: Items to pass to func.
+            max_workers: Maximum number of threads. Runs sequentially when 1 or less. (optional)
+
+        Returns:
+            The results of each call in the same order as items.
+        """
+        max_workers = max_workers if max_workers else self.max_workers
+        if not max_workers or max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            return list(executor.map(func, items))
 
     def _is_path(
             self,
             obj
     ) -> bool:
         """Gets if the object is a Path like object."""
-        try:
-            return obj is not None and PurePath(obj).is_absolute()
-        except:
-            return False
+        return is_path(obj)
 
     __FILE_HANDLE__ATTRS__ = ['id',
                               'etag',
@@ -245,11 +925,45 @@ class SynapseTestHelper:
         Returns:
             Project
         """
-        kwargs['name'] = name if name else self.uniq_name(prefix=prefix)
-        project = self.client.store(Project(**kwargs))
+        project = self._create_project(name=name, prefix=prefix, **kwargs)
         self.dispose_of(project)
         return project
 
+    def _create_project(
+            self,
+            name: str = None,
+            prefix: str = None,
+            **kwargs
+    ) -> synapseclient.Project:
+        """Creates a new Project without adding it to the trash queue."""
+        kwargs['name'] = name if name else self.uniq_name(prefix=prefix)
+        # Build the Project before reserving a client so bad kwargs cannot leave the load reserved.
+        project = Project(**kwargs)
+        with self._track('create_project', object_type='Project') as event:
+            synapse_client = self._next_client()
+            project = self._call('store', project, synapse_client=synapse_client, client_reserved=True)
+            event.object_id = project.id
+        self._set_owner(project, synapse_client)
+        return project
+
+    def create_projects(
+            self,
+            items: int | list[dict],
+            max_workers: int = None,
+            **kwargs
+    ) -> list[synapseclient.Project]:
+        """Creates new Projects concurrently and adds them to the trash queue.
+
+        Args:
+            items: The number of projects to create or a list of create_project kwargs for each project.
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: create_project kwargs for every project. Overridden by the kwargs in items.
+
+        Returns:
+            List of Projects in the same order as items.
+        """
+        return self._create_many(self._create_project, items, max_workers=max_workers, **kwargs)
+
     def create_folder(
             self,
             name: str = None,
@@ -268,19 +982,58 @@ class SynapseTestHelper:
         Returns:
             Folder
         """
+        folder = self._create_folder(name=name, prefix=prefix, parent=parent, **kwargs)
+        self.dispose_of(folder)
+        return folder
+
+    def _create_folder(
+            self,
+            name: str = None,
+            prefix: str = None,
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            **kwargs
+    ) -> synapseclient.Folder:
+        """Creates a new Folder without adding it to the trash queue."""
         if 'parent' not in kwargs:
             if parent:
                 kwargs['parent'] = parent
+            elif self._uses_default_parent:
+                kwargs['parent'] = self.default_parent
             else:
                 logging.warning('Synapse folder parent not specified. Parent will be created.')
                 kwargs['parent'] = self.create_project(prefix='Parent_For_Folder_')
 
         kwargs['name'] = name if name else self.uniq_name(prefix=prefix)
 
-        folder = self.client.store(Folder(**kwargs))
-        self.dispose_of(folder)
+        with self._track('create_folder', object_type='Folder') as event:
+            synapse_client = self._owner(kwargs['parent'])
+            folder = self._call('store', Folder(**kwargs), synapse_client=synapse_client)
+            event.object_id = folder.id
+        self._set_owner(folder, synapse_client)
         return folder
 
+    def create_folders(
+            self,
+            items: int | list[dict],
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            max_workers: int = None,
+            **kwargs
+    ) -> list[synapseclient.Folder]:
+        """Creates new Folders concurrently and adds them to the trash queue.
+
+        Args:
+            items: The number of folders to create or a list of create_folder kwargs for each folder.
+            parent: The Synapse parent container (Project or Folder) for every folder.
+                    A single parent will be created if not set and an item does not have a parent. (optional)
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: create_folder kwargs for every folder. Overridden by the kwargs in items.
+
+        Returns:
+            List of Folders in the same order as items.
+        """
+        kwargs['parent'] = self._get_bulk_parent(items, parent, kwargs, prefix='Parent_For_Folders_')
+        return self._create_many(self._create_folder, items, max_workers=max_workers, **kwargs)
+
     def create_file(
             self,
             name: str = None,
@@ -299,9 +1052,23 @@ class SynapseTestHelper:
         Returns:
             File
         """
+        file = self._create_file(name=name, path=path, parent=parent, **kwargs)
+        self.dispose_of(file)
+        return file
+
+    def _create_file(
+            self,
+            name: str = None,
+            path: str = None,
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            **kwargs
+    ) -> synapseclient.File:
+        """Creates a new File without adding it to the trash queue."""
         if 'parent' not in kwargs:
             if parent:
                 kwargs['parent'] = parent
+            elif self._uses_default_parent:
+                kwargs['parent'] = self.default_parent
             else:
                 logging.warning('Synapse file parent not specified. Parent will be created.')
                 kwargs['parent'] = self.create_project(prefix='Parent_For_File_')
@@ -316,10 +1083,241 @@ class SynapseTestHelper:
                 logging.warning('Synapse file path not specified. Temporary file will be created.')
                 kwargs['path'] = self.create_temp_file(name=name)
 
-        file = self.client.store(File(**kwargs))
-        self.dispose_of(file)
+        synapse_client = self._owner(kwargs['parent'])
+        cache_key = None
+        file_handle = None
+        if self.upload_cache is not None and kwargs.get('synapseStore', True) and 'dataFileHandleId' not in kwargs:
+            cache_key = (md5_for_file(kwargs['path']).hexdigest(), id(synapse_client))
+            file_handle = self.upload_cache.acquire(cache_key)
+            if file_handle is not None:
+                kwargs.setdefault('name', os.path.basename(kwargs['path']))
+                kwargs['dataFileHandleId'] = file_handle['id']
+                kwargs.pop('path')
+
+        try:
+            with self._track('create_file', object_type='File') as event:
+                file = self._call('store', File(**kwargs), synapse_client=synapse_client)
+                event.object_id = file.id
+        except Exception:
+            if cache_key is not None:
+                if file_handle is None:
+                    self.upload_cache.abandon(cache_key)
+                else:
+                    self._release_uploads(cache_key)
+            raise
+
+        if cache_key is not None:
+            if file_handle is None:
+                file_handle = dict(file._file_handle)
+                self.upload_cache.add(cache_key, file_handle)
+                self._set_owner(file_handle, synapse_client)
+            self._cached_uploads[self._trash_key(file)] = cache_key
+        self._set_owner(file, synapse_client)
         return file
 
+    def _release_uploads(
+            self,
+            *cache_keys: t.Hashable
+    ) -> DisposeReport:
+        """Releases references to cached file handles and deletes the file handles that are no longer used."""
+        file_handles = list(filter(None, map(self.upload_cache.release, cache_keys)))
+        return self._dispose_phases([file_handles]) if file_handles else DisposeReport()
+
+    def create_files(
+            self,
+            items: int | list[dict],
+            parent: synapseclient.Project | synapseclient.Folder = None,
+            max_workers: int = None,
+            **kwargs
+    ) -> list[synapseclient.File]:
+        """Creates new Files concurrently and adds them to the trash queue.
+        Temporary files are created by each worker so creating the local files overlaps with uploading them.
+
+        Args:
+            items: The number of files to create or a list of create_file kwargs for each file.
+            parent: The Synapse parent container (Project or Folder) for every file.
+                    A single parent will be created if not set and an item does not have a parent. (optional)
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: create_file kwargs for every file. Overridden by the kwargs in items.
+
+        Returns:
+            List of Files in the same order as items.
+        """
+        kwargs['parent'] = self._get_bulk_parent(items, parent, kwargs, prefix='Parent_For_Files_')
+
+        def _create(name=None, path=None, **item_kwargs):
+            if not path and 'path' not in item_kwargs:
+                path = self.create_temp_file(name=name)
+            return self._create_file(name=name, path=path, **item_kwargs)
+
+        return self._create_many(_create, items, max_workers=max_workers, **kwargs)
+
+    def create_filehandle(
+            self,
+            name: str = None,
+            prefix: str = None,
+            external_url: str = None,
+            content_type: str = None,
+            content_size: int = None,
+            content_md5: str = None
+    ) -> dict:
+        """Creates an external URL file handle and adds it to the trash queue.
+        Nothing is uploaded so this is much faster than create_file when a test only needs a file handle.
+
+        Args:
+            name: File name of the file handle. A unique name will be generated if not set. (optional)
+            prefix: Prefix to add to the generated file name if the name arg is None. (optional)
+            external_url: The URL of the file. Defaults to an example.com URL with the file name. (optional)
+            content_type: Defaults to application/octet-stream. (optional)
+            content_size: (optional)
+            content_md5: (optional)
+
+        Returns:
+            File handle dict.
+        """
+        file_handle = self._create_filehandle(name=name, prefix=prefix, external_url=external_url,
+                                              content_type=content_type, content_size=content_size,
+                                              content_md5=content_md5)
+        self.dispose_of(file_handle)
+        return file_handle
+
+    def _create_filehandle(
+            self,
+            name: str = None,
+            prefix: str = None,
+            external_url: str = None,
+            content_type: str = None,
+            content_size: int = None,
+            content_md5: str = None
+    ) -> dict:
+        """Creates an external URL file handle without adding it to the trash queue."""
+        file_name = name if name else self.uniq_name(prefix=prefix)
+        body = {
+            'concreteType': 'org.sagebionetworks.repo.model.file.ExternalFileHandle',
+            'externalURL': external_url if external_url else 'https://example.com/{0}'.format(file_name),
+            'fileName': file_name,
+            'contentType': content_type if content_type else 'application/octet-stream'
+        }
+        if content_size is not None:
+            body['contentSize'] = content_size
+        if content_md5:
+            body['contentMd5'] = content_md5
+
+        with self._track('create_filehandle', object_type='filehandle') as event:
+            body = json.dumps(body)
+            synapse_client = self._next_client()
+            result = self._call(lambda synapse_client: synapse_client.restPOST(
+                                    '/externalFileHandle', body=body, endpoint=synapse_client.fileHandleEndpoint),
+                                synapse_client=synapse_client, client_reserved=True)
+            event.object_id = result['id']
+
+        # External file handles do not have every attribute, fill them so the file handle is disposable.
+        file_handle = {attr: None for attr in self.__FILE_HANDLE__ATTRS__}
+        file_handle.update(result)
+        self._set_owner(file_handle, synapse_client)
+        return file_handle
+
+    def create_filehandles(
+            self,
+            items: int | list[dict],
+            max_workers: int = None,
+            **kwargs
+    ) -> list[dict]:
+        """Creates new external URL file handles concurrently and adds them to the trash queue.
+
+        Args:
+            items: The number of file handles to create or a list of create_filehandle kwargs for each file handle.
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: create_filehandle kwargs for every file handle. Overridden by the kwargs in items.
+
+        Returns:
+            List of file handle dicts in the same order as items.
+        """
+        return self._create_many(self._create_filehandle, items, max_workers=max_workers, **kwargs)
+
+    def _get_bulk_parent(
+            self,
+            items: int | list[dict],
+            parent: synapseclient.Project | synapseclient.Folder,
+            kwargs: dict,
+            prefix: str
+    ) -> synapseclient.Project | synapseclient.Folder | None:
+        """Gets the parent for a bulk create. Creates a single parent Project if any item does not have a parent."""
+        parent = kwargs.pop('parent', parent)
+        if parent is None and (isinstance(items, int) or any('parent' not in item for item in items)):
+            if self._uses_default_parent:
+                return self.default_parent
+            logging.warning('Synapse parent not specified. Parent will be created.')
+            parent = self.create_project(prefix=prefix)
+        return parent
+
+    @property
+    def _uses_default_parent(self) -> bool:
+        """Gets if Folders and Files without a parent are created in default_parent."""
+        return self.share_default_parent or self._default_parent is not None
+
+    @property
+    def default_parent(self) -> synapseclient.Project | synapseclient.Folder:
+        """Gets the Project that Folders and Files without a parent are created in when share_default_parent is set
+        or a default_parent was set. Created on first use and disposed with the rest of the trash.
+        A new one is created after it is disposed.
+        """
+        if self._default_parent is None:
+            with self._default_parent_lock:
+                if self._default_parent is None:
+                    self._default_parent = self.create_project(prefix='Default_Parent_')
+                    self._default_parent_created = True
+        return self._default_parent
+
+    @default_parent.setter
+    def default_parent(self, value: synapseclient.Project | synapseclient.Folder | None) -> None:
+        """Sets the container to create Folders and Files without a parent in, e.g., for a scope.
+        The container is not added to the trash. Set to None to go back to creating one on first use.
+        """
+        with self._default_parent_lock:
+            self._default_parent = value
+            self._default_parent_created = False
+
+    def _create_many(
+            self,
+            create_func: t.Callable,
+            items: int | list[dict],
+            max_workers: int = None,
+            **kwargs
+    ) -> list[t.Any]:
+        """Creates objects concurrently and adds each one to the trash queue as soon as it is created.
+        Each object is journaled before the batch finishes, so a crash mid batch does not leak it.
+        If any create fails, the objects that were created are still in the trash queue.
+
+        Args:
+            create_func: Function that creates a single object without adding it to the trash queue.
+            items: The number of objects to create or a list of kwargs for each object.
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: kwargs for every object. Overridden by the kwargs in items.
+
+        Returns:
+            List of objects in the same order as items.
+        """
+        if isinstance(items, int):
+            items = [{} for _ in range(items)]
+        items = [{**kwargs, **item} for item in items]
+
+        def _create(item_kwargs):
+            try:
+                obj = create_func(**item_kwargs)
+            except Exception as ex:
+                return None, ex
+            self.dispose_of(obj)
+            return obj, None
+
+        results = self._map_concurrently(_create, items, max_workers=max_workers)
+        created = [obj for obj, ex in results if ex is None]
+
+        errors = [ex for _, ex in results if ex is not None]
+        if errors:
+            raise errors[0]
+        return created
+
     def create_team(
             self,
             name: str = None,
@@ -337,7 +1335,13 @@ class SynapseTestHelper:
             Team
         """
         kwargs['name'] = name if name else self.uniq_name(prefix=prefix)
-        team = self.client.store(Team(**kwargs))
+        # Build the Team before reserving a client so bad kwargs cannot leave the load reserved.
+        team = Team(**kwargs)
+        with self._track('create_team', object_type='Team') as event:
+            synapse_client = self._next_client()
+            team = self._call('store', team, synapse_client=synapse_client, client_reserved=True)
+            event.object_id = team.id
+        self._set_owner(team, synapse_client)
         self.dispose_of(team)
         self.wait_for_team_to_be_available(team)
         return team
@@ -349,17 +1353,79 @@ class SynapseTestHelper:
         """Waits for a newly created team to be available in Synapse.
         There can be a delay from when a team is created and when syn.get() will return it.
         """
-        tries = 0
-        while True:
-            tries += 1
+        return self.wait_for(lambda: self._call('getTeam', team.name, synapse_client=self._owner(team)),
+                             name='team',
+                             retry_on=(ValueError,),
+                             message='Timed out waiting for Team to be available in Synapse.',
+                             obj=team)
+
+    def wait_for_entity_to_be_available(
+            self,
+            entity: synapseclient.Entity | str
+    ) -> synapseclient.Entity:
+        """Waits for a newly stored entity to be returned by syn.get()."""
+        return self.wait_for(lambda: self._call('get', entity, downloadFile=False, synapse_client=self._owner(entity)),
+                             name='entity',
+                             retry_on=(SynapseHTTPError,),
+                             message='Timed out waiting for Entity to be available in Synapse.',
+                             obj=entity)
+
+    def wait_for_permissions(
+            self,
+            entity: synapseclient.Entity | str,
+            principal_id: str | int,
+            access_type: list[str]
+    ) -> list[str]:
+        """Waits for a principal to have the access types on an entity after an ACL change.
+
+        Returns:
+            The principal's permissions on the entity.
+        """
+        return self.wait_for(lambda: self._call('getPermissions', entity, principal_id,
+                                                synapse_client=self._owner(entity)),
+                             name='permissions',
+                             until=lambda permissions: set(access_type).issubset(permissions),
+                             message='Timed out waiting for permissions to be available in Synapse.',
+                             obj=entity)
+
+    def wait_for(
+            self,
+            func: t.Callable[[], t.Any],
+            name: str = 'wait',
+            retry_on: tuple[type[Exception], ...] = (Exception,),
+            until: t.Callable[[t.Any], bool] = None,
+            timeout: float = None,
+            message: str = None,
+            obj: t.Any = None
+    ) -> t.Any:
+        """Waits for a change to propagate in Synapse by polling func with exponential backoff.
+        The number of polls is recorded in waiter.stats under the name.
+        The wait is recorded in instrumentation as wait_for_<name>.
+
+        Args:
+            func: The function to poll.
+            name: Name to record the stats under.
+            retry_on: Exceptions that mean func should be polled again.
+            until: Function that is called with the result of func and returns True when the wait is done. (optional)
+            timeout: Overrides the waiter timeout. (optional)
+            message: The TimeoutError message. (optional)
+            obj: The object being waited for. (optional)
+
+        Returns:
+            The result of func.
+        """
+        polls = []
+
+        def _poll():
+            polls.append(None)
+            return func()
+
+        with self._track('wait_for_{0}'.format(name), obj) as event:
             try:
-                return self.client.getTeam(team.name)
-                break
-            except ValueError:
-                if tries >= 10:
-                    raise Exception('Timed out waiting for Team to be available in Synapse.')
-                else:
-                    time.sleep(3)
+                return self.waiter.wait(_poll, name=name, retry_on=retry_on, until=until, timeout=timeout,
+                                        message=message)
+            finally:
+                event.retries = max(0, len(polls) - 1)
 
     def create_wiki(
             self,
@@ -377,15 +1443,197 @@ class SynapseTestHelper:
         Returns:
             Wiki
         """
+        wiki = self._create_wiki(title=title, prefix=prefix, **kwargs)
+        self.dispose_of(wiki)
+        return wiki
+
+    def _create_wiki(
+            self,
+            title: str = None,
+            prefix: str = None,
+            **kwargs
+    ) -> synapseclient.Wiki:
+        """Creates a new Wiki without adding it to the trash queue."""
         kwargs['title'] = title if title else self.uniq_name(prefix=prefix)
 
         if 'markdown' not in kwargs:
             kwargs['markdown'] = 'My Wiki {0}'.format(kwargs['title'])
 
-        wiki = self.client.store(Wiki(**kwargs))
-        self.dispose_of(wiki)
+        with self._track('create_wiki', object_type='Wiki') as event:
+            synapse_client = self._owner(kwargs.get('owner'))
+            wiki = self._call('store', Wiki(**kwargs), synapse_client=synapse_client)
+            event.object_id = wiki.id
+        self._set_owner(wiki, synapse_client)
         return wiki
 
+    TREE_NODE_KEYS = {'type', 'children', 'annotations', 'wiki', 'content', 'size', 'fill', 'path'}
+    TREE_FILE_KEYS = {'content', 'size', 'path'}
+
+    def create_tree(
+            self,
+            spec: dict[str, t.Any],
+            parent: synapseclient.Project | synapseclient.Folder | str = None,
+            max_workers: int = None
+    ) -> EntityTree:
+        """Creates a hierarchy of Projects, Folders, Files, and Wikis and adds them to the trash queue.
+        Each depth level is created concurrently, then the Wikis are created concurrently.
+
+        The spec maps names to nodes. A node is a dict with any of:
+            type: project, folder, or file. Inferred when not set.
+            children: A spec of the entities in a Project or Folder.
+            annotations: Annotations dict.
+            wiki: Markdown or create_wiki kwargs for the entity's Wiki.
+            content: File content.
+            size: File size in bytes.
+            fill: How to fill a File of a given size, one of TEMP_FILE_FILLS. Defaults to random.
+            path: Path of an existing local file to upload.
+        A str node is a File with that content, an int node is a File of that size, and None is an empty Folder.
+        Nodes with content, size, or path are Files and all other nodes are Folders.
+        The top level nodes are Projects when parent is not set, else they are created in parent.
+        Projects are named with uniq_name using their spec name as the prefix.
+
+        Example:
+            tree = sth.create_tree({
+                'study': {
+                    'wiki': '# Study',
+                    'children': {
+                        'data': {'children': {'a.csv': 'x,y\\n1,2\\n', 'b.bin': 1024}},
+                        'empty': None
+                    }
+                }
+            })
+            tree['study/data/a.csv']
+
+        Args:
+            spec: The hierarchy to create.
+            parent: The Project or Folder to create the top level entities in. (optional)
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+
+        Returns:
+            EntityTree indexed by the path of each entity in the spec.
+        """
+        is_root = parent is None
+        nodes = {name: self._parse_tree_node(name, node, is_root=is_root) for name, node in spec.items()}
+
+        tree = EntityTree()
+        level = [(name, node, parent) for name, node in nodes.items()]
+        wikis = []
+        errors = []
+        while level and not errors:
+            results = self._map_concurrently(self._create_tree_node, level, max_workers=max_workers)
+            created = []
+            next_level = []
+            for (path, node, _), (entity, ex) in zip(level, results):
+                if ex is not None:
+                    errors.append(ex)
+                    continue
+                created.append(entity)
+                tree.add(path, entity)
+                if node['wiki'] is not None:
+                    wikis.append((path, node['wiki'], entity))
+                next_level.extend(('{0}/{1}'.format(path, name), child, entity)
+                                  for name, child in node['children'].items())
+            self.dispose_of(*created)
+            level = next_level
+
+        if wikis and not errors:
+            def _create_wiki(item):
+                path, wiki_kwargs, owner = item
+                try:
+                    return self._create_wiki(owner=owner, **wiki_kwargs), None
+                except Exception as ex:
+                    return None, ex
+
+            results = self._map_concurrently(_create_wiki, wikis, max_workers=max_workers)
+            for (path, _, _), (wiki, ex) in zip(wikis, results):
+                if ex is None:
+                    tree.wikis[path] = wiki
+                else:
+                    errors.append(ex)
+            self.dispose_of(*tree.wikis.values())
+
+        if errors:
+            raise errors[0]
+        return tree
+
+    def _parse_tree_node(
+            self,
+            name: str,
+            node: t.Any,
+            is_root: bool = False
+    ) -> dict:
+        """Validates a create_tree node and its children and fills in the defaults."""
+        if '/' in name:
+            raise ValueError('Tree names cannot contain "/": {0}'.format(name))
+        if node is None:
+            node = {}
+        elif isinstance(node, str):
+            node = {'content': node}
+        elif isinstance(node, int) and not isinstance(node, bool):
+            node = {'size': node}
+        elif not isinstance(node, dict):
+            raise ValueError('Invalid tree node: {0}'.format(name))
+
+        unknown = set(node) - self.TREE_NODE_KEYS
+        if unknown:
+            raise ValueError('Invalid tree node keys for {0}: {1}'.format(name, ', '.join(sorted(unknown))))
+
+        node_type = node.get('type')
+        if node_type is None:
+            if is_root:
+                node_type = 'project'
+            else:
+                node_type = 'file' if self.TREE_FILE_KEYS.intersection(node) else 'folder'
+        if node_type not in ['project', 'folder', 'file'] or (node_type == 'project') != is_root:
+            raise ValueError('Invalid tree node type for {0}: {1}'.format(name, node_type))
+
+        children = node.get('children') or {}
+        if node_type == 'file' and children:
+            raise ValueError('Files cannot have children: {0}'.format(name))
+
+        fill = node.get('fill', 'random')
+        if node_type == 'file':
+            self._verify_temp_file_args(node.get('content'), node.get('size'), fill)
+
+        wiki = node.get('wiki')
+        if isinstance(wiki, str):
+            wiki = {'markdown': wiki}
+
+        return {
+            'type': node_type,
+            'children': {child_name: self._parse_tree_node(child_name, child)
+                         for child_name, child in children.items()},
+            'annotations': node.get('annotations'),
+            'wiki': wiki,
+            'content': node.get('content'),
+            'size': node.get('size'),
+            'fill': fill,
+            'path': node.get('path')
+        }
+
+    def _create_tree_node(
+            self,
+            item: tuple[str, dict, t.Any]
+    ) -> tuple[synapseclient.Entity | None, Exception | None]:
+        """Creates a single create_tree node without adding it to the trash queue."""
+        path, node, parent = item
+        name = path.rsplit('/', 1)[-1]
+        kwargs = {'annotations': node['annotations']} if node['annotations'] else {}
+        try:
+            if node['type'] == 'project':
+                return self._create_project(prefix='{0}_'.format(name), **kwargs), None
+            elif node['type'] == 'folder':
+                return self._create_folder(name=name, parent=parent, **kwargs), None
+            else:
+                local_path = node['path']
+                if not local_path and node['size'] is not None:
+                    local_path = self.create_temp_file(name=name, size=node['size'], fill=node['fill'])
+                elif not local_path:
+                    local_path = self.create_temp_file(name=name, content=node['content'])
+                return self._create_file(name=name, path=local_path, parent=parent, **kwargs), None
+        except Exception as ex:
+            return None, ex
+
     def create_temp_dir(
             self,
             name: str = None,
@@ -409,25 +1657,39 @@ class SynapseTestHelper:
                 name += suffix
             if prefix:
                 name = prefix + name
-
             dir = dir if dir else self.create_temp_dir()
-            temp_dir = os.path.join(dir, name)
-            os.makedirs(temp_dir, exist_ok=True)
-        else:
-            if dir:
-                os.makedirs(dir, exist_ok=True)
-            temp_dir = tempfile.mkdtemp(suffix=suffix, prefix=prefix, dir=dir)
+
+        with self._track('create_temp_dir', object_type='path') as event:
+            if name:
+                temp_dir = os.path.join(dir, name)
+                os.makedirs(temp_dir, exist_ok=True)
+            else:
+                if dir:
+                    os.makedirs(dir, exist_ok=True)
+                temp_dir = tempfile.mkdtemp(suffix=suffix, prefix=prefix, dir=dir)
+            event.object_id = temp_dir
 
         self.dispose_of(temp_dir)
         return temp_dir
 
+    # Ways to fill a temp file of a given size:
+    #   random: Incompressible random bytes.
+    #   pattern: A short random block repeated, so the file compresses well.
+    #   sparse: A short random header then a hole, so the file takes almost no disk space where supported.
+    TEMP_FILE_FILLS = ['random', 'pattern', 'sparse']
+
+    # Maximum bytes held in memory while writing a temp file of a given size.
+    TEMP_FILE_CHUNK_SIZE = 8 * 1024 * 1024
+
     def create_temp_file(
             self,
             name: str = None,
             suffix: str = None,
             prefix: str = None,
             dir: str = None,
-            content: str = None
+            content: str = None,
+            size: int = None,
+            fill: str = 'random'
     ) -> str:
         """Creates a temp file that will be disposed.
         If dir is not specified then a temp directory will be created and disposed too.
@@ -437,27 +1699,116 @@ class SynapseTestHelper:
             suffix: (optional)
             prefix: (optional)
             dir: (optional)
-            content: (optional)
+            content: Text to write. Defaults to a unique name. Cannot be used with size. (optional)
+            size: Write this many bytes instead of content. Written in chunks of TEMP_FILE_CHUNK_SIZE. (optional)
+            fill: How to fill a file of a given size, one of TEMP_FILE_FILLS. The content is unique to each file.
 
         Returns:
             Absolute path to the file.
         """
+        self._verify_temp_file_args(content, size, fill)
         dir = dir if dir else self.create_temp_dir()
-        content = content if content else self.uniq_name()
-        os.makedirs(dir, exist_ok=True)
-        if name:
-            if suffix:
-                name += suffix
-            if prefix:
-                name = prefix + name
+        tmp_filename = self._create_temp_file(name=name, suffix=suffix, prefix=prefix, dir=dir, content=content,
+                                              size=size, fill=fill)
+        self.dispose_of(tmp_filename)
+        return tmp_filename
 
-            tmp_filename = os.path.join(dir, name)
-            with open(tmp_filename, 'w') as tmp:
-                tmp.write(content)
-        else:
-            fd, tmp_filename = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=dir)
-            with os.fdopen(fd, 'w') as tmp:
-                tmp.write(content)
+    def create_temp_files(
+            self,
+            items: int | list[dict],
+            dir: str = None,
+            max_workers: int = None,
+            **kwargs
+    ) -> list[str]:
+        """Creates temp files concurrently that will be disposed.
 
-        self.dispose_of(tmp_filename)
+        Example:
+            paths = sth.create_temp_files(4, size=1024 ** 3, fill='pattern')
+
+        Args:
+            items: The number of files to create or a list of create_temp_file kwargs for each file.
+            dir: The directory for every file. A single temp directory will be created and disposed if not set.
+                 (optional)
+            max_workers: Maximum number of concurrent creates. Defaults to self.max_workers. (optional)
+            **kwargs: create_temp_file kwargs for every file. Overridden by the kwargs in items.
+
+        Returns:
+            List of absolute paths in the same order as items.
+        """
+        for item in items if isinstance(items, list) else [{}]:
+            item_kwargs = {**kwargs, **item}
+            self._verify_temp_file_args(item_kwargs.get('content'), item_kwargs.get('size'),
+                                        item_kwargs.get('fill', 'random'))
+        dir = dir if dir else self.create_temp_dir()
+        return self._create_many(self._create_temp_file, items, max_workers=max_workers, dir=dir, **kwargs)
+
+    def _verify_temp_file_args(
+            self,
+            content: str | None,
+            size: int | None,
+            fill: str
+    ) -> None:
+        if size is not None:
+            if content:
+                raise ValueError('content and size cannot both be set.')
+            if size < 0:
+                raise ValueError('size must be 0 or greater.')
+        if fill not in self.TEMP_FILE_FILLS:
+            raise ValueError('fill must be one of: {0}'.format(', '.join(self.TEMP_FILE_FILLS)))
+
+    def _create_temp_file(
+            self,
+            name: str = None,
+            suffix: str = None,
+            prefix: str = None,
+            dir: str = None,
+            content: str = None,
+            size: int = None,
+            fill: str = 'random'
+    ) -> str:
+        """Creates a temp file in dir without adding it to the trash queue."""
+        content = content if content or size is not None else self.uniq_name()
+        mode = 'w' if size is None else 'wb'
+        with self._track('create_temp_file', object_type='path') as event:
+            os.makedirs(dir, exist_ok=True)
+            if name:
+                if suffix:
+                    name += suffix
+                if prefix:
+                    name = prefix + name
+
+                tmp_filename = os.path.join(dir, name)
+                tmp = open(tmp_filename, mode)
+            else:
+                fd, tmp_filename = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=dir)
+                tmp = os.fdopen(fd, mode)
+            with tmp:
+                if size is None:
+                    tmp.write(content)
+                else:
+                    self._write_fill(tmp, size, fill)
+            event.object_id = tmp_filename
         return tmp_filename
+
+    def _write_fill(
+            self,
+            tmp: t.BinaryIO,
+            size: int,
+            fill: str
+    ) -> None:
+        """Writes size bytes in chunks so memory use does not depend on the size."""
+        # Each file starts with its own random bytes so files of the same size have different content.
+        if fill == 'sparse':
+            tmp.write(uuid.uuid4().bytes[:size])
+            tmp.truncate(size)
+            return
+
+        chunk_size = self.TEMP_FILE_CHUNK_SIZE
+        if fill == 'pattern':
+            block = uuid.uuid4().hex.encode() * 128
+            chunk = memoryview(block * max(1, chunk_size // len(block)))
+        remaining = size
+        while remaining > 0:
+            length = min(remaining, chunk_size)
+            tmp.write(os.urandom(length) if fill == 'random' else chunk[:length])
+            remaining -= length
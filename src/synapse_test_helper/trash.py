@@ -0,0 +1,312 @@
+from __future__ import annotations
+import typing as t
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import PurePath
+from synapseclient import Project, Folder, File, Team, Wiki
+
+
+def is_path(obj) -> bool:
+    """Gets if the object is an absolute Path like object."""
+    try:
+        return obj is not None and PurePath(obj).is_absolute()
+    except:
+        return False
+
+
+def trash_key(obj) -> t.Hashable:
+    """Gets the identity of a disposable object or TrashRecord.
+
+    Entities, Teams, Wikis, and filehandles are identified by their Synapse ID and local paths by their
+    normalized absolute path. Objects without an ID are identified by the object itself.
+    """
+    if obj is None:
+        return None
+    elif isinstance(obj, TrashRecord):
+        return obj.kind, obj.id
+    elif is_path(obj):
+        return 'path', os.path.normcase(os.path.abspath(obj))
+
+    obj_id = obj.get('id') if hasattr(obj, 'get') else None
+    if obj_id is None:
+        return 'object', id(obj)
+    elif isinstance(obj, (Project, Folder, File)):
+        return 'entity', obj_id
+    elif isinstance(obj, Team):
+        return 'team', obj_id
+    elif isinstance(obj, Wiki):
+        return 'wiki', obj_id
+    else:
+        return 'filehandle', obj_id
+
+
+class TrashRecord:
+    """Compact record of a disposable object with just what is needed to delete it.
+
+    Holding records instead of the objects lets the objects, with their annotations and cached metadata,
+    be garbage collected. A record is equal to any object or record with the same trash_key.
+    """
+
+    __slots__ = ('kind', 'id', 'type', 'parent_id', 'path', 'obj')
+
+    def __init__(
+            self,
+            kind: str,
+            id: str | int,
+            type: str = None,
+            parent_id: str = None,
+            path: str = None,
+            obj: t.Any = None
+    ):
+        """
+        Args:
+            kind: One of: entity, team, wiki, filehandle, path, object.
+            id: The Synapse ID, or the normalized path for paths.
+            type: The class name of the object, e.g., Project. (optional)
+            parent_id: The parentId of Folders and Files or the ownerId of Wikis. (optional)
+            path: The path for paths. (optional)
+            obj: The object for objects without an ID, which cannot be reduced to a record. (optional)
+        """
+        self.kind = kind
+        self.id = id
+        self.type = type
+        # Siblings share their parent ID so store it once.
+        self.parent_id = sys.intern(parent_id) if isinstance(parent_id, str) else parent_id
+        self.path = path
+        self.obj = obj
+
+    @classmethod
+    def from_object(cls, obj) -> TrashRecord:
+        """Creates a record from a disposable object."""
+        if isinstance(obj, TrashRecord):
+            return obj
+        kind, obj_id = trash_key(obj)
+        if kind == 'path':
+            return cls(kind, obj_id, path=str(obj))
+        elif kind == 'object':
+            return cls(kind, obj_id, type=type(obj).__name__, obj=obj)
+        elif kind == 'filehandle':
+            return cls(kind, obj_id)
+
+        if isinstance(obj, (Folder, File)):
+            parent_id = obj.get('parentId')
+        elif isinstance(obj, Wiki):
+            parent_id = obj.get('ownerId')
+        else:
+            parent_id = None
+        return cls(kind, obj_id, type=type(obj).__name__, parent_id=parent_id)
+
+    @classmethod
+    def from_dict(cls, record: dict) -> TrashRecord:
+        """Creates a record from a dict created by to_dict."""
+        return cls(record['kind'], record['id'], type=record.get('type'), parent_id=record.get('parent_id'),
+                   path=record.get('path'))
+
+    def to_dict(self) -> dict | None:
+        """Gets the record as a JSON serializable dict or None for objects without an ID."""
+        if self.kind == 'object':
+            return None
+        record = {'kind': self.kind, 'id': self.id}
+        for attr in ['type', 'parent_id', 'path']:
+            value = getattr(self, attr)
+            if value is not None:
+                record[attr] = value
+        return record
+
+    @property
+    def key(self) -> tuple[str, str | int]:
+        """Gets the trash_key."""
+        return self.kind, self.id
+
+    def __eq__(self, other):
+        if other is None:
+            return False
+        try:
+            return self.key == trash_key(other)
+        except Exception:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'TrashRecord(kind={0!r}, id={1!r}, type={2!r}, parent_id={3!r})'.format(
+            self.kind, self.id, self.type, self.parent_id)
+
+
+class Trash:
+    """Insertion ordered collection of disposable objects indexed by a stable identity key.
+
+    Membership, add, and remove are O(1). Iterating yields the objects in the order they were added.
+    Safe to use from multiple threads. Keys are computed outside the lock so it is only held for the dict operation.
+
+    Every add is logged so pop_since can remove the objects added after a checkpoint in O(k) for k objects.
+    The log is compacted when removed objects make it more than twice as long as the trash.
+    """
+
+    # Minimum log length before it is compacted.
+    MIN_COMPACT_LOG_LENGTH = 32
+
+    def __init__(self, key: t.Callable[[t.Any], t.Hashable]):
+        """
+        Args:
+            key: Function that returns the identity key for an object.
+        """
+        self._key = key
+        self._items = {}
+        self._lock = threading.RLock()
+        # Keys in the order they were added and the number of each add, for pop_since.
+        self._added = 0
+        self._log = []
+        self._log_numbers = array('q')
+
+    def key(self, obj) -> t.Hashable:
+        """Gets the identity key for an object."""
+        return self._key(obj)
+
+    def add(self, obj) -> bool:
+        """Adds an object if an object with the same identity is not already in the trash.
+
+        Returns:
+            True if the object was added, else False.
+        """
+        key = self._key(obj)
+        with self._lock:
+            if key in self._items:
+                return False
+            self._items[key] = obj
+            self._log_add(key)
+            return True
+
+    def extend(self, objs: t.Iterable[t.Any]) -> int:
+        """Adds objects that are not already in the trash, taking the lock once.
+
+        Returns:
+            The number of objects added.
+        """
+        keyed = [(self._key(obj), obj) for obj in objs]
+        added = 0
+        with self._lock:
+            for key, obj in keyed:
+                if key not in self._items:
+                    self._items[key] = obj
+                    self._log_add(key)
+                    added += 1
+        return added
+
+    def remove(self, obj) -> None:
+        """Removes an object. Raises ValueError if the object is not in the trash."""
+        if not self.discard(obj):
+            raise ValueError('Object not in trash: {0}'.format(obj))
+
+    def discard(self, obj) -> bool:
+        """Removes an object if it is in the trash.
+
+        Returns:
+            True if the object was removed, else False.
+        """
+        key = self._key(obj)
+        with self._lock:
+            if self._items.pop(key, self) is self:
+                return False
+            if len(self._log) > max(2 * len(self._items), self.MIN_COMPACT_LOG_LENGTH):
+                self._compact_log()
+            return True
+
+    def pop_all(self) -> list[t.Any]:
+        """Removes all objects.
+
+        Returns:
+            The removed objects in the order they were added.
+        """
+        with self._lock:
+            objs = list(self._items.values())
+            self._clear()
+        return objs
+
+    def clear(self) -> None:
+        """Removes all objects."""
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._items.clear()
+        self._log = []
+        self._log_numbers = array('q')
+
+    def _log_add(self, key: t.Hashable) -> None:
+        self._log.append(key)
+        self._log_numbers.append(self._added)
+        self._added += 1
+
+    def _compact_log(self) -> None:
+        """Drops the log entries of removed objects.
+        Only the last entry of a key that was removed and added again is kept.
+        """
+        seen = set()
+        keep = []
+        for index in range(len(self._log) - 1, -1, -1):
+            key = self._log[index]
+            if key in self._items and key not in seen:
+                seen.add(key)
+                keep.append(index)
+        keep.reverse()
+        self._log = [self._log[index] for index in keep]
+        self._log_numbers = array('q', (self._log_numbers[index] for index in keep))
+
+    def checkpoint(self) -> int:
+        """Gets a marker for pop_since. The marker is the number of objects added so far."""
+        with self._lock:
+            return self._added
+
+    def pop_since(self, marker: int) -> list[t.Any]:
+        """Removes the objects added after a checkpoint that are still in the trash.
+
+        Args:
+            marker: A marker from checkpoint.
+
+        Returns:
+            The removed objects in the order they were added.
+        """
+        with self._lock:
+            if not 0 <= marker <= self._added:
+                raise ValueError('Invalid checkpoint: {0}'.format(marker))
+            start = bisect_left(self._log_numbers, marker)
+            objs = []
+            for key in self._log[start:]:
+                # Objects that were removed since are skipped.
+                obj = self._items.pop(key, self)
+                if obj is not self:
+                    objs.append(obj)
+            del self._log[start:]
+            del self._log_numbers[start:]
+        return objs
+
+    def get(
+            self,
+            key: t.Hashable,
+            default: t.Any = None
+    ) -> t.Any:
+        """Gets the object with an identity key."""
+        with self._lock:
+            return self._items.get(key, default)
+
+    def __contains__(self, obj) -> bool:
+        key = self._key(obj)
+        with self._lock:
+            return key in self._items
+
+    def __iter__(self) -> t.Iterator[t.Any]:
+        with self._lock:
+            return iter(list(self._items.values()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def __repr__(self) -> str:
+        with self._lock:
+            return '{0}({1})'.format(type(self).__name__, list(self._items.values()))
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import typing as t
+import synapseclient
+
+
+class EntityTree:
+    """The entities created by create_tree indexed by their path in the spec.
+
+    Paths are the spec names joined with '/', e.g., 'My Project/data/raw/a.csv'.
+    Projects are indexed by their spec name, not the unique name they are created with.
+    """
+
+    def __init__(self):
+        self._entities = {}
+        self.wikis = {}
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        """Strips leading and trailing slashes from a path."""
+        return path.strip('/')
+
+    def add(
+            self,
+            path: str,
+            entity: synapseclient.Entity
+    ) -> None:
+        """Indexes an entity by its path."""
+        self._entities[self.normalize_path(path)] = entity
+
+    def __getitem__(self, path: str) -> synapseclient.Entity:
+        return self._entities[self.normalize_path(path)]
+
+    def __contains__(self, path: str) -> bool:
+        return self.normalize_path(path) in self._entities
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self._entities)
+
+    def __len__(self):
+        return len(self._entities)
+
+    def get(
+            self,
+            path: str,
+            default: t.Any = None
+    ) -> synapseclient.Entity | t.Any:
+        """Gets the entity at a path or default if there is no entity at the path."""
+        return self._entities.get(self.normalize_path(path), default)
+
+    @property
+    def paths(self) -> list[str]:
+        """Gets the paths in the order the entities were created, parents before children."""
+        return list(self._entities)
+
+    @property
+    def roots(self) -> list[synapseclient.Entity]:
+        """Gets the entities at the top level of the spec."""
+        return [entity for path, entity in self._entities.items() if '/' not in path]
+
+    def children(
+            self,
+            path: str
+    ) -> list[synapseclient.Entity]:
+        """Gets the entities directly under a path."""
+        prefix = self.normalize_path(path) + '/'
+        return [entity for child_path, entity in self._entities.items()
+                if child_path.startswith(prefix) and '/' not in child_path[len(prefix):]]
+
+    def wiki(
+            self,
+            path: str
+    ) -> synapseclient.Wiki | None:
+        """Gets the Wiki of the entity at a path."""
+        return self.wikis.get(self.normalize_path(path))
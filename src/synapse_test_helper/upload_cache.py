@@ -0,0 +1,99 @@
+from __future__ import annotations
+import typing as t
+import threading
+
+
+class UploadCache:
+    """Content addressed cache of uploaded file handles so identical files are only uploaded once.
+
+    Entries are keyed by the content MD5 and the client that uploaded the file, since a file handle can only be
+    used by the user that created it. Each File that uses a file handle holds a reference to it. The file handle is
+    released for deletion when the last File that uses it is disposed.
+    Share one UploadCache between SynapseTestHelpers to share the uploads.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Gets the number of hits and misses."""
+        with self._cond:
+            return dict(self._stats)
+
+    def acquire(
+            self,
+            key: t.Hashable
+    ) -> dict | None:
+        """Gets a reference to the file handle for a key.
+        Waits while another thread is uploading the same content.
+
+        Returns:
+            The file handle or None if the caller needs to upload the file then call add or abandon.
+        """
+        with self._cond:
+            while key in self._pending:
+                self._cond.wait()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._pending.add(key)
+                self._stats['misses'] += 1
+                return None
+            entry['refs'] += 1
+            self._stats['hits'] += 1
+            return entry['file_handle']
+
+    def add(
+            self,
+            key: t.Hashable,
+            file_handle: dict
+    ) -> None:
+        """Adds the file handle the caller uploaded after acquire returned None. The caller holds the reference."""
+        with self._cond:
+            self._pending.discard(key)
+            self._entries[key] = {'file_handle': file_handle, 'refs': 1}
+            self._cond.notify_all()
+
+    def abandon(
+            self,
+            key: t.Hashable
+    ) -> None:
+        """Records that the upload after acquire returned None failed so another thread can upload the file."""
+        with self._cond:
+            self._pending.discard(key)
+            self._cond.notify_all()
+
+    def release(
+            self,
+            key: t.Hashable
+    ) -> dict | None:
+        """Releases a reference to a file handle.
+
+        Returns:
+            The file handle if it has no references left and can be deleted, else None.
+        """
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry['refs'] -= 1
+            if entry['refs'] > 0:
+                return None
+            self._entries.pop(key)
+            return entry['file_handle']
+
+    def refs(
+            self,
+            key: t.Hashable
+    ) -> int:
+        """Gets the number of references to the file handle for a key."""
+        with self._cond:
+            entry = self._entries.get(key)
+            return entry['refs'] if entry else 0
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import typing as t
+import random
+import threading
+import time
+
+
+class Waiter:
+    """Polls a function with exponential backoff and jitter until it succeeds or the timeout is reached.
+
+    Used to wait for changes to propagate in Synapse, such as a new Team becoming visible.
+    The number of polls each wait took is recorded in stats.
+    """
+
+    def __init__(
+            self,
+            initial_delay: float = 0.2,
+            max_delay: float = 5.0,
+            timeout: float = 30.0,
+            multiplier: float = 2.0,
+            jitter: float = 0.1
+    ):
+        """
+        Args:
+            initial_delay: Seconds to wait after the first failed poll.
+            max_delay: Maximum seconds to wait between polls.
+            timeout: Maximum seconds for the whole wait.
+            multiplier: The delay is multiplied by this after each failed poll.
+            jitter: Fraction of the delay to randomly add or subtract. 0 disables jitter.
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def delays(self) -> t.Iterator[float]:
+        """Generates the delays between polls."""
+        delay = self.initial_delay
+        while True:
+            if self.jitter:
+                yield max(0.0, delay + delay * random.uniform(-self.jitter, self.jitter))
+            else:
+                yield delay
+            delay = min(delay * self.multiplier, self.max_delay)
+
+    def wait(
+            self,
+            func: t.Callable[[], t.Any],
+            name: str = 'wait',
+            retry_on: tuple[type[Exception], ...] = (Exception,),
+            until: t.Callable[[t.Any], bool] = None,
+            timeout: float = None,
+            message: str = None
+    ) -> t.Any:
+        """Calls func until it does not raise one of the retry_on exceptions and until returns True.
+
+        Args:
+            func: The function to poll.
+            name: Name to record the stats under.
+            retry_on: Exceptions that mean func should be polled again. Any other exception is raised.
+            until: Function that is called with the result of func and returns True when the wait is done. (optional)
+            timeout: Overrides the timeout for this wait. (optional)
+            message: The TimeoutError message. (optional)
+
+        Returns:
+            The result of func.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        polls = 0
+        delays = self.delays()
+
+        while True:
+            polls += 1
+            try:
+                result = func()
+                if until is None or until(result):
+                    self._record(name, polls, time.monotonic() - start, True)
+                    return result
+            except retry_on:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._record(name, polls, time.monotonic() - start, False)
+                raise TimeoutError(message or 'Timed out waiting for: {0}'.format(name))
+            time.sleep(min(next(delays), remaining))
+
+    def _record(
+            self,
+            name: str,
+            polls: int,
+            elapsed: float,
+            success: bool
+    ) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {'waits': 0, 'polls': 0, 'max_polls': 0, 'timeouts': 0, 'seconds': 0.0})
+            stats['waits'] += 1
+            stats['polls'] += polls
+            stats['max_polls'] = max(stats['max_polls'], polls)
+            stats['seconds'] += elapsed
+            if not success:
+                stats['timeouts'] += 1
+
+    @property
+    def stats(self) -> dict[str, dict]:
+        """Gets the number of waits, polls, max polls for a single wait, timeouts, and total seconds by name."""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        """Clears the stats."""
+        with self._lock:
+            self._stats.clear()
@@ -3,13 +3,29 @@ import os
 import tempfile
 import shutil
 import uuid
+import subprocess
+import sys
 import synapseclient
-from src.synapse_test_helper import SynapseTestHelper
+from src.synapse_test_helper import SynapseTestHelper, FakeSynapseServer
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def use_fake_synapse():
+    return os.environ.get('TEST_SYNAPSE_FAKE', '').lower() in ['1', 'true', 'yes']
+
+
+@pytest.fixture(scope='session')
+def fake_synapse_server():
+    """Yields a FakeSynapseServer when TEST_SYNAPSE_FAKE is set, else None."""
+    if use_fake_synapse():
+        with FakeSynapseServer() as server:
+            yield server
+    else:
+        yield None
+
+
 @pytest.fixture()
 def syn_test_credentials():
     def _get():
@@ -22,8 +38,10 @@ def syn_test_credentials():
 
 
 @pytest.fixture()
-def mk_syn_client(syn_test_credentials):
+def mk_syn_client(syn_test_credentials, fake_synapse_server):
     def _m():
+        if fake_synapse_server:
+            return fake_synapse_server.client()
         syn_auth_token = syn_test_credentials()
         synapse_client = synapseclient.Synapse(skip_checks=True, configPath='')
         synapse_client.login(authToken=syn_auth_token, silent=True, rememberMe=False, forced=True)
@@ -53,6 +71,14 @@ def temp_file(mk_tempfile):
     yield mk_tempfile()
 
 
+@pytest.fixture()
+def dead_pid():
+    """Gets the ID of a process that has exited."""
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
 @pytest.fixture()
 def mk_tempdir():
     created = []
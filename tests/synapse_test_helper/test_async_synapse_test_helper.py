@@ -0,0 +1,49 @@
+import os
+import asyncio
+import synapseclient
+from src.synapse_test_helper import AsyncSynapseTestHelper
+
+
+def test_context_manager(mk_syn_client, mk_tempfile):
+    async def _test():
+        async with AsyncSynapseTestHelper(mk_syn_client()) as ash:
+            await ash.dispose_of(mk_tempfile())
+            assert len(ash.trash) == 1
+        return ash
+
+    ash = asyncio.run(_test())
+    assert len(ash.trash) == 0
+    assert ash._executor is None
+
+
+def test_create_and_dispose(mk_syn_client):
+    async def _test():
+        async with AsyncSynapseTestHelper(mk_syn_client(), max_workers=4) as ash:
+            assert ash.configured
+            assert ash.helper.max_workers == 4
+
+            projects = await asyncio.gather(*[ash.create_project() for _ in range(3)])
+            for project in projects:
+                assert isinstance(project, synapseclient.Project)
+                assert ash.test_id in project.name
+                assert project in ash.trash
+
+            folder, file, wiki = await asyncio.gather(ash.create_folder(parent=projects[0]),
+                                                      ash.create_file(parent=projects[1]),
+                                                      ash.create_wiki(owner=projects[2]))
+            assert folder.parentId == projects[0].id
+            assert file.parentId == projects[1].id
+            assert os.path.isfile(file.path)
+            assert wiki.ownerId == projects[2].id
+
+            team = await ash.create_team()
+            assert ash.test_id in team.name
+
+            temp_file = await ash.create_temp_file(dir=await ash.create_temp_dir())
+            assert os.path.isfile(temp_file)
+
+            await ash.dispose()
+            assert len(ash.trash) == 0
+            assert os.path.exists(temp_file) is False
+
+    asyncio.run(_test())
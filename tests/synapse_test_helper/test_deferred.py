@@ -0,0 +1,53 @@
+import threading
+from src.synapse_test_helper import DeferredDisposal
+
+
+def test_submit_runs_batches_in_order():
+    order = []
+    release = threading.Event()
+
+    def _batch(name):
+        release.wait(5)
+        order.append(name)
+        return []
+
+    with DeferredDisposal() as deferred_disposal:
+        for name in ['a', 'b', 'c']:
+            deferred_disposal.submit(_batch, name)
+        assert deferred_disposal.pending == 3
+        release.set()
+        assert deferred_disposal.flush() is True
+        assert deferred_disposal.pending == 0
+    assert order == ['a', 'b', 'c']
+
+
+def test_flush_reports_failures():
+    deferred_disposal = DeferredDisposal()
+    deferred_disposal.submit(lambda: ['obj1'])
+    deferred_disposal.submit(lambda: [])
+    assert deferred_disposal.flush() is False
+    assert deferred_disposal.failed == ['obj1']
+
+    error = Exception('batch error')
+
+    def _fail():
+        raise error
+
+    deferred_disposal.submit(_fail)
+    assert deferred_disposal.flush() is False
+    assert deferred_disposal.failed == [error]
+
+    # Failures are only reported once.
+    assert deferred_disposal.flush() is True
+    assert deferred_disposal.failed == []
+    assert deferred_disposal.close() is True
+
+
+def test_flush_timeout():
+    release = threading.Event()
+    deferred_disposal = DeferredDisposal()
+    deferred_disposal.submit(lambda: release.wait(5) and [])
+    assert deferred_disposal.flush(timeout=0.1) is False
+    assert deferred_disposal.pending == 1
+    release.set()
+    assert deferred_disposal.close() is True
@@ -0,0 +1,118 @@
+import time
+import pytest
+from synapseclient import Project, Folder
+from synapseclient.core.exceptions import SynapseHTTPError
+from src.synapse_test_helper import SynapseTestHelper, FakeSynapseServer
+
+
+@pytest.fixture
+def server():
+    with FakeSynapseServer() as server:
+        yield server
+
+
+def test_login(server):
+    client = server.client()
+    assert client.getUserProfile()['ownerId'] == server.user['ownerId']
+
+    server.auth_token = 'other-token'
+    with pytest.raises(SynapseHTTPError) as ex:
+        client.restGET('/userProfile')
+    assert ex.value.response.status_code == 401
+
+
+def test_entities(server):
+    client = server.client()
+    project = client.store(Project(name='fake project'))
+    folder = client.store(Folder(name='fake folder', parent=project))
+    assert client.get(folder.id).parentId == project.id
+
+    # Deleted entities go to the trash can unless skipTrashCan is set.
+    client.delete(folder)
+    assert folder.id in server.trash_can
+    client.restDELETE('/entity/{0}?skipTrashCan=true'.format(project.id))
+    assert project.id not in server.trash_can
+    assert server.entities == {}
+
+    with pytest.raises(SynapseHTTPError) as ex:
+        client.get(project.id)
+    assert ex.value.response.status_code == 404
+
+
+def test_helper(server):
+    with SynapseTestHelper(server.client()) as sth:
+        project = sth.create_project()
+        file = sth.create_file(parent=project)
+        team = sth.create_team()
+        wiki = sth.create_wiki(owner=project, markdown='fake markdown')
+        assert sth.client.getWiki(project).markdown == 'fake markdown'
+        assert sth.client.getTeam(team.name).id == team.id
+        assert file.dataFileHandleId in server.file_handles
+        assert wiki.id in server.wikis
+
+        assert sth.dispose()
+    assert server.entities == {}
+    assert server.teams == {}
+    assert server.wikis == {}
+
+
+def test_inject_error(server):
+    client = server.client()
+    project = client.store(Project(name='fake project'))
+
+    server.inject_error(status=403, method='POST', path='/bundle2$', count=2)
+    for _ in range(2):
+        with pytest.raises(SynapseHTTPError) as ex:
+            client.get(project.id)
+        assert ex.value.response.status_code == 403
+    assert client.get(project.id).id == project.id
+
+    # Requests that do not match are not failed.
+    server.inject_error(status=403, method='DELETE')
+    assert client.get(project.id).id == project.id
+    with pytest.raises(SynapseHTTPError):
+        client.delete(project)
+
+
+def test_error_rate(server):
+    client = server.client()
+    server.error_rate = 1.0
+    server.error_status = 403
+    with pytest.raises(SynapseHTTPError) as ex:
+        client.restGET('/userProfile')
+    assert ex.value.response.status_code == 403
+
+
+def test_latency():
+    with FakeSynapseServer(latency=lambda method, path: 0.2 if method == 'POST' else 0) as server:
+        client = server.client()
+        start = time.monotonic()
+        client.store(Project(name='fake project'))
+        assert time.monotonic() - start >= 0.2
+
+
+def test_reset(server):
+    client = server.client()
+    client.store(Project(name='fake project'))
+    assert server.entities
+    assert server.request_counts
+
+    server.reset()
+    assert server.entities == {}
+    assert server.request_counts == {}
+
+
+def test_add_entities(server):
+    project = server.add_entities({'concreteType': 'org.sagebionetworks.repo.model.Project', 'name': 'project'})[0]
+    folders = server.add_entities(
+        *({'concreteType': 'org.sagebionetworks.repo.model.Folder', 'name': 'folder{0}'.format(i),
+           'parentId': project['id']} for i in range(3))
+    )
+    assert server.request_counts == {}
+
+    client = server.client()
+    assert [child['id'] for child in client.getChildren(project['id'])] == [folder['id'] for folder in folders]
+    assert client.findEntityId('folder1', parent=project['id']) == folders[1]['id']
+
+    client.restDELETE('/entity/{0}?skipTrashCan=true'.format(project['id']))
+    assert server.entities == {}
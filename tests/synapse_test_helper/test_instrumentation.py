@@ -0,0 +1,69 @@
+import json
+import pytest
+from src.synapse_test_helper import Instrumentation, Event
+
+
+def test_track():
+    events = []
+    instrumentation = Instrumentation(listeners=[events.append])
+
+    with instrumentation.track('create_project', object_type='Project') as event:
+        event.object_id = 'syn1'
+    assert events[0].operation == 'create_project'
+    assert events[0].object_type == 'Project'
+    assert events[0].object_id == 'syn1'
+    assert events[0].outcome == Event.SUCCESS
+    assert events[0].error is None
+
+    error = ValueError('failed')
+    with pytest.raises(ValueError):
+        with instrumentation.track('delete', object_id='syn1') as event:
+            event.retries = 2
+            raise error
+    assert events[1].outcome == Event.ERROR
+    assert events[1].error is error
+    assert events[1].to_dict()['error'] == 'failed'
+
+
+def test_listeners():
+    events = []
+    instrumentation = Instrumentation()
+    instrumentation.add_listener(events.append)
+
+    def _fail(event):
+        raise Exception('listener error')
+
+    # Failing listeners do not stop the operation or the other listeners.
+    instrumentation.add_listener(_fail)
+    with instrumentation.track('delete'):
+        pass
+    assert len(events) == 1
+
+    instrumentation.remove_listener(events.append)
+    with instrumentation.track('delete'):
+        pass
+    assert len(events) == 1
+
+
+def test_summary(tmp_path):
+    instrumentation = Instrumentation()
+    for duration in range(1, 101):
+        event = Event('delete')
+        event.duration = duration
+        event.retries = 1
+        event.outcome = Event.ERROR if duration <= 10 else Event.SUCCESS
+        instrumentation.record(event)
+    instrumentation.record(Event('create_project'))
+
+    summary = instrumentation.summary()
+    assert list(summary) == ['create_project', 'delete']
+    assert summary['delete'] == {'count': 100, 'errors': 10, 'retries': 100, 'total': 5050, 'mean': 50.5,
+                                 'p50': 50, 'p95': 95, 'p99': 99, 'max': 100}
+
+    path = str(tmp_path / 'summary.json')
+    assert json.loads(instrumentation.dump(path)) == summary
+    with open(path) as f:
+        assert json.load(f) == summary
+
+    instrumentation.reset()
+    assert instrumentation.summary() == {}
@@ -0,0 +1,70 @@
+import os
+import json
+import socket
+from src.synapse_test_helper.journal import Journal, load_journal
+
+
+def test_add_remove(tmp_path):
+    path = str(tmp_path / 'journals' / 'test.jsonl')
+    journal = Journal(path, test_id='test')
+    assert not os.path.exists(path)
+
+    a = {'kind': 'entity', 'id': 'syn1', 'type': 'Project'}
+    b = {'kind': 'path', 'id': '/tmp/b', 'path': '/tmp/b'}
+    journal.add(a, b)
+    assert os.path.isfile(path)
+    assert journal.records == [a, b]
+    assert journal.header['test_id'] == 'test'
+    assert journal.header['pid'] == os.getpid()
+
+    journal.remove(a)
+    assert journal.records == [b]
+    assert len(journal) == 1
+
+    with open(path) as f:
+        assert [json.loads(line)['op'] for line in f] == ['header', 'add', 'add', 'remove']
+
+    # Removing objects that were not added does nothing.
+    journal.remove({'kind': 'team', 'id': '1'})
+    assert len(journal) == 1
+
+    # The file is deleted when everything is removed.
+    journal.remove(b)
+    assert not os.path.exists(path)
+
+    # And created again on the next add.
+    journal.add(a)
+    assert os.path.isfile(path)
+    journal.close()
+
+
+def test_load_journal(tmp_path, dead_pid):
+    path = str(tmp_path / 'test.jsonl')
+    journal = Journal(path, test_id='test')
+    a = {'kind': 'entity', 'id': 'syn1', 'type': 'Project'}
+    b = {'kind': 'team', 'id': '2', 'type': 'Team'}
+    c = {'kind': 'wiki', 'id': '3', 'type': 'Wiki', 'parent_id': 'syn1'}
+    journal.add(a, b, c)
+    journal.remove(b)
+    journal.close()
+
+    # A line partially written by a killed process is skipped.
+    with open(path, 'a') as f:
+        f.write('{"op": "add", "kind": "ent')
+
+    loaded = load_journal(path)
+    assert loaded.test_id == 'test'
+    assert loaded.records == [a, c]
+    assert loaded.is_writer_running() is True
+    assert loaded.is_from_this_host() is True
+
+    loaded.header['pid'] = dead_pid
+    assert loaded.is_writer_running() is False
+
+    loaded.header['pid'] = os.getpid()
+    loaded.header['host'] = socket.gethostname() + '-other'
+    assert loaded.is_writer_running() is False
+    assert loaded.is_from_this_host() is False
+
+    loaded.remove(a, c)
+    assert not os.path.exists(path)
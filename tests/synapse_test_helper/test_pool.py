@@ -0,0 +1,119 @@
+import time
+import pytest
+import synapseclient
+from src.synapse_test_helper import SynapseTestHelper, WarmPool
+
+
+def wait_for_available(pool, count, timeout=60):
+    end = time.time() + timeout
+    while pool.stats['available'] < count and time.time() < end:
+        time.sleep(0.1)
+    assert pool.stats['available'] >= count
+
+
+def test_init(synapse_test_helper):
+    with pytest.raises(ValueError, match='kind must be one of'):
+        WarmPool(synapse_test_helper, kind='folder')
+    with pytest.raises(ValueError, match='size must be greater than 0'):
+        WarmPool(synapse_test_helper, size=0)
+
+    pool = WarmPool(synapse_test_helper, size=4)
+    assert pool.low_watermark == 2
+    assert WarmPool(synapse_test_helper, size=4, low_watermark=3).low_watermark == 3
+
+
+def test_project_pool(mk_syn_client):
+    with SynapseTestHelper(mk_syn_client(), max_workers=4) as sth:
+        with WarmPool(sth, size=2) as pool:
+            wait_for_available(pool, 2)
+            assert pool.stats['created'] == 2
+
+            # Resets the project when it is released.
+            with pool.lease() as project:
+                assert isinstance(project, synapseclient.Project)
+                assert pool.stats['hits'] == 1
+                sth.client.store(synapseclient.Folder(name=sth.uniq_name(), parent=project))
+                annotations = sth.client.get_annotations(project)
+                annotations['pooled'] = 'yes'
+                sth.client.set_annotations(annotations)
+
+            assert pool.stats['resets'] == 1
+            assert list(sth.client.getChildren(project)) == []
+            assert len(sth.client.get_annotations(project)) == 0
+
+            # Creates a project when the pool is empty.
+            projects = [pool.acquire() for _ in range(3)]
+            assert pool.stats['misses'] >= 1
+            for project in projects:
+                pool.release(project)
+
+            created = pool.stats['created']
+            assert created >= 3
+
+        assert pool.stats['created'] == 0
+        assert pool.stats['available'] == 0
+        assert len(sth.trash) == 0
+
+        with pytest.raises(Exception, match='Pool is closed'):
+            pool.acquire()
+
+
+def test_release_gets_the_current_etag(mk_syn_client):
+    with SynapseTestHelper(mk_syn_client()) as sth:
+        # Do not refill so the released project is the next one acquired.
+        with WarmPool(sth, size=1, low_watermark=0) as pool:
+            wait_for_available(pool, 1)
+            with pool.lease() as project:
+                annotations = sth.client.get_annotations(project)
+                annotations['pooled'] = 'yes'
+                sth.client.set_annotations(annotations)
+
+            # Reset changed the etag so the pool holds a fresh copy that can be stored.
+            with pool.lease() as reacquired:
+                assert reacquired.id == project.id
+                assert reacquired is not project
+                reacquired.description = 'reused'
+                assert sth.client.store(reacquired).description == 'reused'
+
+
+def test_team_pool(mk_syn_client):
+    with SynapseTestHelper(mk_syn_client()) as sth:
+        with WarmPool(sth, kind='team', size=1) as pool:
+            wait_for_available(pool, 1)
+            team = pool.acquire()
+            assert isinstance(team, synapseclient.Team)
+            assert sth.test_id in team.name
+
+            with pytest.raises(ValueError, match='not acquired from this pool'):
+                pool.release(synapseclient.Team(id='0'))
+
+            pool.release(team)
+            assert pool.stats['resets'] == 1
+        assert len(sth.trash) == 0
+
+
+def test_reset_uses_the_owner(mk_syn_client, mocker):
+    clients = [mk_syn_client(), mk_syn_client()]
+    with SynapseTestHelper(clients) as sth:
+        # Do not refill so only reset calls the clients.
+        with WarmPool(sth, size=2, low_watermark=0) as pool:
+            wait_for_available(pool, 2)
+            projects = [pool.acquire() for _ in range(2)]
+            assert {id(sth._owner(project)) for project in projects} == {id(client) for client in clients}
+
+            # Records the load of the client while the pages are read.
+            pages = []
+            for client in clients:
+                def _get_children(parent, *args, _client=client, _get_children=client.getChildren, **kwargs):
+                    for child in _get_children(parent, *args, **kwargs):
+                        pages.append((id(_client), sth._client_load.get(id(_client), 0)))
+                        yield child
+
+                mocker.patch.object(client, 'getChildren', side_effect=_get_children)
+
+            for project in projects:
+                sth.create_folder(parent=project)
+                pool.release(project)
+
+            assert sorted(client_id for client_id, _ in pages) == sorted(id(client) for client in clients)
+            assert all(load > 0 for _, load in pages)
@@ -0,0 +1,197 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from src.synapse_test_helper import SynapseTestHelper
+from src.synapse_test_helper.pytest_plugin import SynapseTestHelperPlugin, WORKER_INPUT_KEY, WORKER_OUTPUT_KEY
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+CONFTEST = '''
+import json
+import os
+import pytest
+from src.synapse_test_helper import FakeSynapseServer
+
+server = FakeSynapseServer()
+result = {}
+
+
+def count():
+    return {'entities': len(server.entities), 'teams': len(server.teams)}
+
+
+@pytest.fixture(scope='session')
+def synapse_client():
+    server.start()
+    yield server.client()
+    # Runs after the helper fixtures are torn down.
+    result['teardown'] = count()
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session):
+    # Runs after the sweep.
+    result['finish'] = count()
+    server.stop()
+    with open(os.environ['RESULT_PATH'], 'w') as f:
+        json.dump(result, f)
+'''
+
+TESTS = '''
+import json
+import os
+from synapseclient import Project
+
+test_ids = set()
+
+
+def record(helper):
+    test_ids.add(helper.test_id)
+    with open(os.environ['TEST_IDS_PATH'], 'w') as f:
+        json.dump(sorted(test_ids), f)
+
+
+def test_session(synapse_test_helper_session):
+    record(synapse_test_helper_session)
+    synapse_test_helper_session.create_project()
+
+
+def test_module(synapse_test_helper_module, synapse_test_helper_session):
+    record(synapse_test_helper_module)
+    project = synapse_test_helper_module.create_project()
+    synapse_test_helper_module.create_folder(parent=project)
+    assert synapse_test_helper_module.client is synapse_test_helper_session.client
+
+
+def test_function(synapse_test_helper, synapse_test_helper_module):
+    record(synapse_test_helper)
+    synapse_test_helper.create_team()
+    synapse_test_helper.create_project()
+    assert synapse_test_helper.deferred_disposal is not None
+    assert synapse_test_helper.deferred_disposal is synapse_test_helper_module.deferred_disposal
+
+
+def test_leak(synapse_test_helper):
+    record(synapse_test_helper)
+    # Not in the trash so only the sweep deletes it.
+    project = synapse_test_helper.client.store(Project(name=synapse_test_helper.uniq_name()))
+    assert project.id
+'''
+
+
+@pytest.fixture
+def run_plugin(tmp_path):
+    def _run(*args):
+        (tmp_path / 'conftest.py').write_text(textwrap.dedent(CONFTEST))
+        (tmp_path / 'test_inner.py').write_text(textwrap.dedent(TESTS))
+        env = dict(os.environ,
+                   RESULT_PATH=str(tmp_path / 'result.json'),
+                   TEST_IDS_PATH=str(tmp_path / 'test_ids.json'))
+        # Block the pytest11 entry point of an installed package so the plugin is only loaded from src.
+        proc = subprocess.run([sys.executable, '-m', 'pytest', '-p', 'no:synapse_test_helper',
+                               '-p', 'src.synapse_test_helper.pytest_plugin',
+                               '-p', 'no:cacheprovider', '-q', str(tmp_path), *args],
+                              cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stdout + proc.stderr
+        with open(tmp_path / 'result.json') as f:
+            result = json.load(f)
+        with open(tmp_path / 'test_ids.json') as f:
+            result['test_ids'] = json.load(f)
+        return result
+
+    yield _run
+
+
+def test_fixtures(run_plugin):
+    result = run_plugin('--synapse-sweep')
+    # Every helper shares the test_id of the run.
+    assert len(result['test_ids']) == 1
+    # Everything in the trash is deleted by the time the session ends and the sweep deletes the leak.
+    assert result['teardown'] == {'entities': 1, 'teams': 0}
+    assert result['finish'] == {'entities': 0, 'teams': 0}
+
+
+def test_no_sweep(run_plugin):
+    # A run without pytest-xdist only sweeps when asked to.
+    result = run_plugin()
+    assert result['finish'] == {'entities': 1, 'teams': 0}
+
+
+class FakeConfig:
+    def __init__(self, workerinput=None, **options):
+        if workerinput is not None:
+            self.workerinput = workerinput
+            self.workeroutput = {}
+        self.options = dict({'synapse_max_workers': 1, 'synapse_sweep': False, 'synapse_no_sweep': False,
+                             'synapse_auth_token': None}, **options)
+
+    def getoption(self, name):
+        return self.options[name]
+
+
+class FakeNode:
+    def __init__(self, workeroutput=None):
+        self.workerinput = {}
+        if workeroutput is not None:
+            self.workeroutput = workeroutput
+
+
+def test_xdist(mocker, fake_synapse_server, mk_syn_client):
+    controller = SynapseTestHelperPlugin(FakeConfig())
+    assert controller.is_worker is False
+
+    # Sends the test_id to the workers.
+    node = FakeNode()
+    controller.pytest_configure_node(node)
+    assert node.workerinput[WORKER_INPUT_KEY] == controller.test_id
+
+    worker = SynapseTestHelperPlugin(FakeConfig(workerinput=node.workerinput))
+    assert worker.is_worker
+    assert worker.test_id == controller.test_id
+    helper = worker.new_helper(mk_syn_client(), None)
+    assert helper.test_id == controller.test_id
+
+    # Workers do not sweep, they report if they used the fixtures.
+    sweep = mocker.patch.object(worker, 'sweep')
+    worker.pytest_sessionfinish(None)
+    sweep.assert_not_called()
+    assert worker.config.workeroutput[WORKER_OUTPUT_KEY] is True
+
+    # The controller sweeps once if any worker used the fixtures or crashed.
+    sweep = mocker.patch.object(controller, 'sweep')
+    controller.pytest_testnodedown(FakeNode({WORKER_OUTPUT_KEY: False}), None)
+    controller.pytest_sessionfinish(None)
+    sweep.assert_not_called()
+    controller.pytest_testnodedown(FakeNode(), 'worker crashed')
+    controller.pytest_sessionfinish(None)
+    sweep.assert_called_once()
+    controller.config.options['synapse_no_sweep'] = True
+    controller.pytest_sessionfinish(None)
+    sweep.assert_called_once()
+
+    # A run without pytest-xdist only sweeps with --synapse-sweep.
+    plugin = SynapseTestHelperPlugin(FakeConfig())
+    plugin.used = True
+    sweep = mocker.patch.object(plugin, 'sweep')
+    plugin.pytest_sessionfinish(None)
+    sweep.assert_not_called()
+    plugin.config.options['synapse_sweep'] = True
+    plugin.pytest_sessionfinish(None)
+    sweep.assert_called_once()
+
+    # Cannot sweep without a client or auth token.
+    assert SynapseTestHelperPlugin(FakeConfig()).sweep() == []
+
+
+def test_helper_test_id(mk_syn_client):
+    test_id = SynapseTestHelper.new_test_id()
+    assert SynapseTestHelper.TEST_ID_PATTERN.fullmatch(test_id)
+    assert test_id != SynapseTestHelper.new_test_id()
+    sth = SynapseTestHelper(mk_syn_client(), test_id=test_id)
+    assert sth.test_id == test_id
+    assert sth.parse_test_id(sth.uniq_name()) == test_id
+    with pytest.raises(ValueError):
+        SynapseTestHelper(test_id='not-a-test-id')
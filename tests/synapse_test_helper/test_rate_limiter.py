@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from src.synapse_test_helper import RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_it_validates_the_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+
+def test_burst_defaults_to_the_rate():
+    assert RateLimiter(rate=10).burst == 10
+    assert RateLimiter(rate=0.5).burst == 1
+    assert RateLimiter(rate=10, burst=3).burst == 3
+
+
+def test_acquire_limits_the_rate():
+    rate_limiter = RateLimiter(rate=50, burst=5)
+
+    # The burst is available immediately.
+    for _ in range(5):
+        assert rate_limiter.acquire() == 0
+    assert rate_limiter.stats['waited'] == 0
+
+    # Then calls are spaced by the rate.
+    start = time.monotonic()
+    for _ in range(10):
+        rate_limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+    assert rate_limiter.stats['calls'] == 15
+    assert rate_limiter.stats['waited'] > 0
+
+
+def test_acquire_is_shared_between_threads():
+    rate_limiter = RateLimiter(rate=100, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [rate_limiter.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert rate_limiter.stats['calls'] == 20
+    assert time.monotonic() - start >= 0.15
+
+
+def test_throttled_backs_off_and_recovers():
+    rate_limiter = RateLimiter(rate=8, min_rate=1, backoff=0.5, recovery=2)
+    rate_limiter.throttled(retry_after=0)
+    assert rate_limiter.current_rate == 4
+    rate_limiter.throttled(retry_after=0)
+    rate_limiter.throttled(retry_after=0)
+    rate_limiter.throttled(retry_after=0)
+    assert rate_limiter.current_rate == 1
+    assert rate_limiter.stats['throttled'] == 4
+
+    assert rate_limiter.call(lambda x: x * 2, 2) == 4
+    assert rate_limiter.current_rate == 2
+    for _ in range(3):
+        rate_limiter.succeeded()
+    assert rate_limiter.current_rate == 8
+
+
+def test_throttled_pauses_calls():
+    rate_limiter = RateLimiter(rate=100)
+    rate_limiter.throttled(retry_after=0.2)
+    assert rate_limiter.acquire() >= 0.15
+
+    rate_limiter = RateLimiter(rate=100, max_pause=0.1)
+    rate_limiter.throttled(retry_after=10)
+    assert rate_limiter.acquire() < 1
+
+
+def test_observe():
+    rate_limiter = RateLimiter(rate=100)
+    rate_limiter.observe(FakeResponse(200))
+    rate_limiter.observe(FakeResponse(503))
+    assert rate_limiter.stats['throttled'] == 0
+
+    rate_limiter.observe(FakeResponse(429, {'Retry-After': '0.1'}))
+    assert rate_limiter.stats['throttled'] == 1
+    assert rate_limiter.current_rate == 50
+    assert rate_limiter.acquire() >= 0.05
+
+    # HTTP dates are ignored.
+    rate_limiter.observe(FakeResponse(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+    assert rate_limiter.stats['throttled'] == 2
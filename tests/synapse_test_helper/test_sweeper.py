@@ -0,0 +1,62 @@
+import argparse
+from datetime import timedelta
+import pytest
+from synapseclient import Project, Team
+from src.synapse_test_helper import Sweeper
+from src.synapse_test_helper.sweeper import parse_duration
+
+
+@pytest.fixture
+def small_pages(fake_synapse_server):
+    # Make the fake server return multiple pages.
+    if fake_synapse_server:
+        fake_synapse_server.page_size = 1
+    yield
+    if fake_synapse_server:
+        fake_synapse_server.page_size = 50
+
+
+def test_find(synapse_test_helper, small_pages):
+    projects = synapse_test_helper.create_projects(2)
+    team = synapse_test_helper.create_team()
+    other_project = synapse_test_helper.create_project(name='Not Generated {0}'.format(synapse_test_helper.test_id))
+
+    sweeper = Sweeper(synapse_test_helper, page_size=1)
+    found = sweeper.find(test_id=synapse_test_helper.test_id)
+    assert sorted(obj.id for obj in found) == sorted([projects[0].id, projects[1].id, team.id])
+    assert other_project.id not in [obj.id for obj in found]
+    assert {type(obj) for obj in found} == {Project, Team}
+
+    assert [obj.id for obj in sweeper.find(test_id=synapse_test_helper.test_id, kinds=['team'])] == [team.id]
+    assert sweeper.find(test_id=synapse_test_helper.test_id, older_than=timedelta(hours=1)) == []
+    assert len(sweeper.find(test_id=synapse_test_helper.test_id, older_than=0)) == 3
+
+    with pytest.raises(ValueError):
+        sweeper.find(kinds=['folder'])
+
+
+def test_sweep(synapse_test_helper):
+    project = synapse_test_helper.create_project()
+    folder = synapse_test_helper.create_folder(parent=project)
+    team = synapse_test_helper.create_team()
+    sweeper = Sweeper(synapse_test_helper)
+
+    # Dry run does not delete.
+    found = sweeper.sweep(test_id=synapse_test_helper.test_id, dry_run=True)
+    assert len(found) == 2
+    assert synapse_test_helper.client.get(folder.id, downloadFile=False).id == folder.id
+
+    found = sweeper.sweep(test_id=synapse_test_helper.test_id, max_workers=2)
+    assert sorted(obj.id for obj in found) == sorted([project.id, team.id])
+    assert sweeper.failed == []
+    assert sweeper.find(test_id=synapse_test_helper.test_id) == []
+
+
+def test_parse_duration():
+    assert parse_duration('90') == timedelta(seconds=90)
+    assert parse_duration('90s') == timedelta(seconds=90)
+    assert parse_duration('30m') == timedelta(minutes=30)
+    assert parse_duration('1.5h') == timedelta(hours=1.5)
+    assert parse_duration('7d') == timedelta(days=7)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration('7 weeks')
@@ -1,9 +1,11 @@
 import os
+import threading
 import pytest
 import json
 import synapseclient
 from synapseclient import Project, Folder, File, Team, Wiki
-from src.synapse_test_helper import SynapseTestHelper
+from src.synapse_test_helper import SynapseTestHelper, Instrumentation, DeferredDisposal, RateLimiter, UploadCache, \
+    DisposeResult, Event
 
 
 @pytest.fixture
@@ -117,6 +119,14 @@ def test_uniq_name(synapse_test_helper):
         last_name = uniq_name
 
 
+def test_parse_test_id(synapse_test_helper):
+    test_id = synapse_test_helper.test_id
+    assert synapse_test_helper.parse_test_id(synapse_test_helper.uniq_name()) == test_id
+    assert synapse_test_helper.parse_test_id(synapse_test_helper.uniq_name(prefix='Pool_', postfix='')) == test_id
+    assert synapse_test_helper.parse_test_id('My Project') is None
+    assert synapse_test_helper.parse_test_id(None) is None
+
+
 def test_fake_synapse_id(synapse_test_helper):
     fake_id = synapse_test_helper.fake_synapse_id
 
@@ -153,6 +163,23 @@ def test_dispose_of(synapse_test_helper, mk_tempfile):
         synapse_test_helper.dispose_of(object())
 
 
+def test_trash_key(mk_tempdir, filehandle_interface):
+    sth = SynapseTestHelper()
+    temp_dir = mk_tempdir()
+
+    assert sth._trash_key(None) is None
+    assert sth._trash_key(temp_dir) == sth._trash_key(os.path.join(temp_dir, 'a', '..'))
+    assert sth._trash_key(Project(id='syn1')) == sth._trash_key(Project(id='syn1', name='other'))
+    assert sth._trash_key(Folder(id='syn1', parentId='syn0')) == sth._trash_key(Project(id='syn1'))
+    assert sth._trash_key(Team(id='1')) != sth._trash_key(dict(filehandle_interface, id='1'))
+    assert sth._trash_key(Project()) != sth._trash_key(Project())
+
+    sth.dispose_of(Project(id='syn1'), Project(id='syn1', name='other'), temp_dir, temp_dir + os.sep)
+    assert len(sth.trash) == 2
+    assert Project(id='syn1') in sth.trash
+    sth.trash.clear()
+
+
 def test_dispose(temp_file, mk_tempdir, synapse_test_helper):
     # Removes an item not in the trash.
     temp_dir = mk_tempdir()
@@ -240,6 +267,165 @@ def test_dispose(temp_file, mk_tempdir, synapse_test_helper):
     # TODO: check that projects, folders, and files are not in the trash.
 
 
+def test_dispose_concurrently(mk_syn_client, mk_tempdir, mk_tempfile):
+    with SynapseTestHelper(mk_syn_client(), max_workers=4) as sth:
+        assert sth.max_workers == 4
+        project = sth.create_project()
+        folders = [sth.create_folder(parent=project) for _ in range(3)]
+        temp_dir = mk_tempdir()
+        temp_files = [mk_tempfile(dir=temp_dir) for _ in range(3)]
+        sth.dispose_of(temp_dir, *temp_files)
+
+        sth.dispose()
+        assert len(sth.trash) == 0
+        for path in [temp_dir] + temp_files:
+            assert os.path.exists(path) is False
+        for folder in folders:
+            with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+                sth.client.get(folder, downloadFile=False)
+
+        # Overrides max_workers for a single call.
+        temp_paths = [mk_tempfile() for _ in range(3)]
+        sth.dispose_of(*temp_paths)
+        sth.dispose(max_workers=1)
+        assert len(sth.trash) == 0
+        for path in temp_paths:
+            assert os.path.exists(path) is False
+
+
+def test_checkpoint_rollback(synapse_test_helper, mk_tempfile, mocker):
+    sth = synapse_test_helper
+    project = sth.create_project()
+    marker = sth.checkpoint()
+    folder = sth.create_folder(parent=project)
+    temp_file = mk_tempfile()
+    sth.dispose_of(temp_file)
+
+    plan = mocker.spy(sth, '_plan_dispose')
+    report = sth.rollback(marker)
+    assert report
+    assert {result.obj.id for result in report} == {folder.id, os.path.normcase(os.path.abspath(temp_file))}
+    # Only the objects added after the checkpoint are looked at.
+    assert len(plan.call_args.args[0]) == 2
+    assert list(sth.trash) == [project]
+    assert not os.path.exists(temp_file)
+    with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+        sth.client.get(folder.id, downloadFile=False)
+    assert sth.client.get(project.id)
+
+    # Nothing to roll back.
+    assert len(sth.rollback(marker).results) == 0
+    with pytest.raises(ValueError):
+        sth.rollback(sth.checkpoint() + 1)
+
+    # Nested scopes.
+    with sth.scope() as outer:
+        folder1 = sth.create_folder(parent=project)
+        with sth.scope() as inner:
+            assert inner > outer
+            folder2 = sth.create_folder(parent=folder1)
+        assert folder2 not in sth.trash
+        assert folder1 in sth.trash
+    assert list(sth.trash) == [project]
+
+    # Scopes can set the default parent and roll back on errors.
+    with pytest.raises(Exception, match='test error'):
+        with sth.scope(default_parent=project):
+            folder = sth.create_folder()
+            assert folder.parentId == project.id
+            assert sth.default_parent is project
+            raise Exception('test error')
+    assert sth._default_parent is None
+    assert list(sth.trash) == [project]
+
+
+def test_thread_safety(mk_syn_client, mocker):
+    sth = SynapseTestHelper(mk_syn_client())
+    deleted = []
+    deleted_lock = threading.Lock()
+
+    def _dispose_obj(obj, attempt=0):
+        with deleted_lock:
+            deleted.append(obj.id)
+        return DisposeResult(obj, attempts=1)
+
+    mocker.patch.object(sth, '_dispose_obj', side_effect=_dispose_obj)
+
+    thread_count = 16
+    per_thread = 200
+    start = threading.Barrier(thread_count + 2)
+    done = threading.Event()
+
+    def _add(thread_index):
+        start.wait()
+        for i in range(per_thread):
+            folder_id = 'syn{0}'.format(thread_index * per_thread + i)
+            sth.dispose_of(Folder(properties={'id': folder_id, 'parentId': 'syn999999'}))
+
+    def _dispose():
+        start.wait()
+        while not done.is_set():
+            sth.dispose()
+
+    adders = [threading.Thread(target=_add, args=(i,)) for i in range(thread_count)]
+    disposers = [threading.Thread(target=_dispose) for _ in range(2)]
+    for thread in adders + disposers:
+        thread.start()
+    for thread in adders:
+        thread.join()
+    done.set()
+    for thread in disposers:
+        thread.join()
+    sth.dispose()
+
+    # Everything added was deleted exactly once.
+    assert len(sth.trash) == 0
+    assert len(deleted) == thread_count * per_thread
+    assert set(deleted) == {'syn{0}'.format(i) for i in range(thread_count * per_thread)}
+
+
+def test_create_from_threads(mk_syn_client):
+    with SynapseTestHelper(mk_syn_client()) as sth:
+        project = sth.create_project()
+        folders = []
+        threads = [threading.Thread(target=lambda: folders.append(sth.create_folder(parent=project)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(folders) == 8
+        assert len(sth.trash) == 9
+        assert all(folder in sth.trash for folder in folders)
+
+
+def test_dispose_skips_descendants(synapse_test_helper, mocker):
+    project = synapse_test_helper.create_project()
+    folder = synapse_test_helper.create_folder(parent=project)
+    sub_folder = synapse_test_helper.create_folder(parent=folder)
+    file = synapse_test_helper.create_file(parent=sub_folder)
+    wiki = synapse_test_helper.create_wiki(owner=folder)
+    other_folder = synapse_test_helper.create_folder(parent=synapse_test_helper.create_project())
+
+    spy = mocker.spy(synapse_test_helper.client, 'restDELETE')
+
+    # Deleting the sub folder deletes the file.
+    assert synapse_test_helper.dispose(sub_folder, file).pruned_count == 1
+    assert spy.call_count == 1
+    assert file not in synapse_test_helper.trash
+
+    # Deleting the projects deletes the folders and the wiki.
+    spy.reset_mock()
+    assert synapse_test_helper.dispose().pruned_count == 3
+    assert spy.call_count == 2
+    assert len(synapse_test_helper.trash) == 0
+    for entity in [project, folder, other_folder]:
+        with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+            synapse_test_helper.client.get(entity, downloadFile=False)
+    with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+        synapse_test_helper.client.getWiki(wiki)
+
+
 def test_dispose_temp_files(synapse_test_helper, mk_tempdir, mk_tempfile):
     # From _create_temp_file
     temp_file1 = synapse_test_helper.create_temp_file()
@@ -418,6 +604,153 @@ def test_create_file(synapse_test_helper, mk_tempfile):
         assert os.path.exists(path) is False
 
 
+def test_create_projects(synapse_test_helper):
+    synapse_test_helper.max_workers = 4
+
+    # Creates a number of projects.
+    projects = synapse_test_helper.create_projects(3)
+    assert len(projects) == 3
+    for project in projects:
+        assert isinstance(project, synapseclient.Project)
+        assert synapse_test_helper.test_id in project.name
+        assert project in synapse_test_helper.trash
+
+    # Uses the item kwargs in order.
+    names = [synapse_test_helper.uniq_name() for _ in range(3)]
+    projects = synapse_test_helper.create_projects([{'name': name} for name in names])
+    assert [project.name for project in projects] == names
+
+    # Uses the common kwargs.
+    projects = synapse_test_helper.create_projects([{}, {'prefix': 'aaa-'}], prefix='zzz-', max_workers=2)
+    assert projects[0].name.startswith('zzz-')
+    assert projects[1].name.startswith('aaa-')
+
+    synapse_test_helper.dispose()
+    assert len(synapse_test_helper.trash) == 0
+
+
+def test_create_folders(synapse_test_helper):
+    synapse_test_helper.max_workers = 4
+
+    # Creates a single parent for all the folders.
+    folders = synapse_test_helper.create_folders(3)
+    assert len(folders) == 3
+    assert len(set(folder.parentId for folder in folders)) == 1
+    syn_parent = synapse_test_helper.client.get(folders[0].parentId)
+    assert isinstance(syn_parent, synapseclient.Project)
+    assert syn_parent in synapse_test_helper.trash
+
+    # Uses the parent and item kwargs in order.
+    other_parent = synapse_test_helper.create_folder(parent=syn_parent)
+    names = [synapse_test_helper.uniq_name() for _ in range(3)]
+    folders = synapse_test_helper.create_folders([{'name': names[0]},
+                                                  {'name': names[1], 'parent': other_parent},
+                                                  {'name': names[2]}],
+                                                 parent=syn_parent)
+    assert [folder.name for folder in folders] == names
+    assert [folder.parentId for folder in folders] == [syn_parent.id, other_parent.id, syn_parent.id]
+    for folder in folders:
+        assert folder in synapse_test_helper.trash
+
+
+def test_create_files(synapse_test_helper, mk_tempfile):
+    synapse_test_helper.max_workers = 4
+
+    # Creates a single parent and temp files for all the files.
+    files = synapse_test_helper.create_files(3)
+    assert len(files) == 3
+    assert len(set(file.parentId for file in files)) == 1
+    for file in files:
+        assert isinstance(file, synapseclient.File)
+        assert os.path.isfile(file.path)
+        assert file in synapse_test_helper.trash
+        assert file.path in synapse_test_helper.trash
+
+    # Uses the parent and item kwargs in order.
+    syn_parent = synapse_test_helper.create_project()
+    temp_file = mk_tempfile()
+    files = synapse_test_helper.create_files([{'path': temp_file}, {'name': 'file2.txt'}], parent=syn_parent)
+    assert files[0].path == temp_file
+    assert files[1].name == 'file2.txt'
+    for file in files:
+        assert file.parentId == syn_parent.id
+
+    # Adds the created files to the trash when a create fails.
+    with pytest.raises(Exception):
+        synapse_test_helper.create_files([{}, {'parent': synapse_test_helper.fake_synapse_id}], parent=syn_parent)
+    assert len([obj for obj in synapse_test_helper.trash if obj.type == 'File']) == 6
+
+
+def test_share_default_parent(mk_syn_client, mocker):
+    with SynapseTestHelper(mk_syn_client(), share_default_parent=True, max_workers=4) as sth:
+        create_project = mocker.spy(sth, 'create_project')
+        folder = sth.create_folder()
+        file = sth.create_file()
+        folders = sth.create_folders(3)
+        files = sth.create_files(2)
+        assert create_project.call_count == 1
+        default_parent = sth.default_parent
+        assert default_parent in sth.trash
+        assert default_parent.name.startswith('Default_Parent_')
+        for obj in [folder, file, *folders, *files]:
+            assert obj.parentId == default_parent.id
+
+        # Created once when used concurrently.
+        sth.dispose()
+        assert sth._default_parent is None
+        sth._map_concurrently(lambda _: sth.create_folder(), list(range(4)))
+        assert create_project.call_count == 2
+        assert sth.default_parent.id != default_parent.id
+
+        # Can be set to a container for a scope.
+        project = sth.create_project()
+        sth.default_parent = project
+        assert sth.create_folder().parentId == project.id
+        sth.dispose(*[obj for obj in sth.trash if obj != project])
+        assert sth.default_parent is project
+        sth.default_parent = None
+
+    # Not shared by default.
+    with SynapseTestHelper(mk_syn_client()) as sth:
+        assert sth.create_folder().parentId != sth.create_folder().parentId
+
+
+def test_create_filehandle(synapse_test_helper):
+    file_handle = synapse_test_helper.create_filehandle(prefix='fh_', content_size=5, content_md5='abc')
+    assert synapse_test_helper._is_filehandle(file_handle)
+    assert file_handle in synapse_test_helper.trash
+    assert file_handle['concreteType'] == 'org.sagebionetworks.repo.model.file.ExternalFileHandle'
+    assert file_handle['fileName'].startswith('fh_')
+    assert file_handle['externalURL'] == 'https://example.com/{0}'.format(file_handle['fileName'])
+    assert file_handle['contentSize'] == 5
+    assert file_handle['contentMd5'] == 'abc'
+
+    file_handle = synapse_test_helper.create_filehandle(name='a.txt', external_url='https://example.org/a.txt',
+                                                        content_type='text/plain')
+    assert file_handle['fileName'] == 'a.txt'
+    assert file_handle['externalURL'] == 'https://example.org/a.txt'
+    assert file_handle['contentType'] == 'text/plain'
+
+    # Can be used to store a File without uploading anything.
+    project = synapse_test_helper.create_project()
+    file = synapse_test_helper.client.store(File(name='a.txt', parent=project, dataFileHandleId=file_handle['id']))
+    assert file.dataFileHandleId == file_handle['id']
+
+    synapse_test_helper.max_workers = 4
+    file_handles = synapse_test_helper.create_filehandles([{'name': 'b.txt'}, {}, {}], content_size=0)
+    assert len(file_handles) == 3
+    assert len(set(file_handle['id'] for file_handle in file_handles)) == 3
+    assert file_handles[0]['fileName'] == 'b.txt'
+    for file_handle in file_handles:
+        assert file_handle in synapse_test_helper.trash
+        assert file_handle['contentSize'] == 0
+
+    assert synapse_test_helper.dispose()
+    with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+        synapse_test_helper.client.restGET('/fileHandle/{0}'.format(file_handles[0]['id']),
+                                           endpoint=synapse_test_helper.client.fileHandleEndpoint)
+
+
 def test_create_team(synapse_test_helper):
     # Uses the name arg
     name = synapse_test_helper.uniq_name()
@@ -437,6 +770,463 @@ def test_create_team(synapse_test_helper):
     assert synapse_test_helper.test_id in team.name
 
 
+def test_wait_for(synapse_test_helper):
+    team = synapse_test_helper.create_team()
+    assert synapse_test_helper.waiter.stats['team']['waits'] == 1
+
+    project = synapse_test_helper.create_project()
+    assert synapse_test_helper.wait_for_entity_to_be_available(project.id).id == project.id
+    assert synapse_test_helper.waiter.stats['entity']['waits'] == 1
+
+    user_id = synapse_test_helper.client.getUserProfile()['ownerId']
+    permissions = synapse_test_helper.wait_for_permissions(project, user_id, ['READ'])
+    assert 'READ' in permissions
+
+    synapse_test_helper.waiter.timeout = 1
+    with pytest.raises(TimeoutError, match='Timed out waiting for Team'):
+        synapse_test_helper.wait_for_team_to_be_available(Team(name=synapse_test_helper.uniq_name()))
+    assert synapse_test_helper.waiter.stats['team']['timeouts'] == 1
+
+    with pytest.raises(TimeoutError):
+        synapse_test_helper.wait_for(lambda: synapse_test_helper.client.getTeam(team.name),
+                                     until=lambda _: False,
+                                     timeout=0.5)
+
+
+def test_upload_cache(mk_syn_client, mocker):
+    upload_cache = UploadCache()
+    with SynapseTestHelper(mk_syn_client(), upload_cache=upload_cache) as sth:
+        project = sth.create_project()
+        path1 = sth.create_temp_file(content='same')
+        path2 = sth.create_temp_file(content='same')
+        path3 = sth.create_temp_file(content='different')
+
+        file1 = sth.create_file(path=path1, parent=project)
+        file2 = sth.create_file(path=path2, parent=project)
+        file3 = sth.create_file(path=path3, parent=project)
+        assert file1.dataFileHandleId == file2.dataFileHandleId
+        assert file1.dataFileHandleId != file3.dataFileHandleId
+        assert file2.name == os.path.basename(path2)
+        assert upload_cache.stats == {'hits': 1, 'misses': 2}
+        with open(sth.client.get(file2, downloadLocation=sth.create_temp_dir()).path) as f:
+            assert f.read() == 'same'
+
+        # The file handle is deleted when the last File is disposed.
+        delete = mocker.spy(sth.client, 'restDELETE')
+        assert sth.dispose(file1)
+        assert not [call for call in delete.call_args_list if '/fileHandle/' in call.kwargs.get('uri', '')]
+        report = sth.dispose(file2)
+        assert report
+        assert [call.kwargs['uri'] for call in delete.call_args_list if '/fileHandle/' in call.kwargs.get('uri', '')] \
+               == ['/fileHandle/{0}'.format(file1.dataFileHandleId)]
+        assert len(report.deleted) == 2
+        assert len(upload_cache) == 1
+
+    # Files pruned with their Project release their references too.
+    assert len(upload_cache) == 0
+
+
+def test_create_tree(synapse_test_helper, mocker):
+    create_folder = mocker.spy(synapse_test_helper, '_create_folder')
+    synapse_test_helper.max_workers = 4
+    tree = synapse_test_helper.create_tree({
+        'study': {
+            'annotations': {'phase': 'one'},
+            'wiki': '# Study',
+            'children': {
+                'data': {
+                    'children': {
+                        'a.csv': 'x,y\n1,2\n',
+                        'b.bin': 16,
+                        'raw': {'children': {'c.txt': {'content': 'c', 'annotations': {'kind': 'raw'}}}}
+                    }
+                },
+                'docs': {'wiki': {'title': 'Docs', 'markdown': '# Docs'}},
+                'empty': None
+            }
+        }
+    })
+
+    assert tree.paths == ['study', 'study/data', 'study/docs', 'study/empty',
+                          'study/data/a.csv', 'study/data/b.bin', 'study/data/raw', 'study/data/raw/c.txt']
+    project = tree['study']
+    assert isinstance(project, Project)
+    assert project.name.startswith('study_')
+    assert synapse_test_helper.parse_test_id(project.name) == synapse_test_helper.test_id
+    assert tree.roots == [project]
+    assert isinstance(tree['/study/data/'], Folder)
+    assert tree['study/data'].parentId == project.id
+    assert tree.children('study/data') == [tree['study/data/a.csv'], tree['study/data/b.bin'], tree['study/data/raw']]
+    assert 'study/nope' not in tree
+    assert tree.get('study/nope') is None
+    assert create_folder.call_count == 4
+
+    csv = synapse_test_helper.client.get(tree['study/data/a.csv'])
+    with open(csv.path) as f:
+        assert f.read() == 'x,y\n1,2\n'
+    assert os.path.getsize(synapse_test_helper.client.get(tree['study/data/b.bin']).path) == 16
+    assert synapse_test_helper.client.get_annotations(project)['phase'] == ['one']
+    assert synapse_test_helper.client.get_annotations(tree['study/data/raw/c.txt'])['kind'] == ['raw']
+    assert tree.wiki('study').markdown == '# Study'
+    assert tree.wiki('study/docs').title == 'Docs'
+    assert tree.wiki('study/data') is None
+
+    # Only the Project is deleted, everything else is deleted with it.
+    for path in tree:
+        assert tree[path] in synapse_test_helper.trash
+    report = synapse_test_helper.dispose(*[tree[path] for path in tree], *tree.wikis.values())
+    assert report
+    assert report.pruned_count == 9
+
+    # In a parent.
+    parent = synapse_test_helper.create_project()
+    tree = synapse_test_helper.create_tree({'folder': None, 'file.txt': 'text'}, parent=parent)
+    assert tree.paths == ['folder', 'file.txt']
+    assert isinstance(tree['file.txt'], File)
+    assert tree['file.txt'].parentId == parent.id
+
+    # Files of a given size are written in chunks with binary content.
+    create_temp_file = mocker.spy(synapse_test_helper, 'create_temp_file')
+    tree = synapse_test_helper.create_tree({'a.bin': 64, 'b.bin': {'size': 64, 'fill': 'pattern'}}, parent=parent)
+    assert create_temp_file.call_args_list == [mocker.call(name='a.bin', size=64, fill='random'),
+                                               mocker.call(name='b.bin', size=64, fill='pattern')]
+    with open(synapse_test_helper.client.get(tree['a.bin']).path, 'rb') as f:
+        assert f.read() != b'0' * 64
+
+    # Invalid specs are rejected before anything is created.
+    for spec in [{'study': {'type': 'folder'}},
+                 {'study': {'children': {'nested': {'type': 'project'}}}},
+                 {'study': {'children': {'file': {'content': 'a', 'children': {'b': None}}}}},
+                 {'study': {'children': {'a/b': None}}},
+                 {'study': {'children': {'a': 1.5}}},
+                 {'study': {'children': {'a': -1}}},
+                 {'study': {'children': {'a': {'size': 1, 'fill': 'zeros'}}}},
+                 {'study': {'children': {'a': {'size': 1, 'content': 'a'}}}},
+                 {'study': {'other': 1}}]:
+        with pytest.raises(ValueError):
+            synapse_test_helper.create_tree(spec)
+
+
+def test_deferred_dispose(mk_syn_client, mocker):
+    with DeferredDisposal() as deferred_disposal:
+        sth = SynapseTestHelper(mk_syn_client(), deferred_disposal=deferred_disposal)
+        project = sth.create_project()
+        folder = sth.create_folder(parent=project)
+        team = sth.create_team()
+        temp_file = sth.create_temp_file()
+        temp_dir = os.path.dirname(temp_file)
+
+        release = threading.Event()
+        deleted = []
+        dispose_obj = sth._dispose_obj
+
+        def _dispose_obj(obj, attempt=0):
+            release.wait(10)
+            deleted.append(obj)
+            return dispose_obj(obj, attempt=attempt)
+
+        mocker.patch.object(sth, '_dispose_obj', side_effect=_dispose_obj)
+
+        # Returns before anything is deleted and the trash can be reused.
+        assert sth.dispose()
+        assert len(sth.trash) == 0
+        assert deleted == []
+        assert os.path.isfile(temp_file)
+
+        release.set()
+        assert sth.flush() is True
+        assert deleted == [project, team, temp_file, temp_dir]
+        assert not os.path.exists(temp_dir)
+        assert folder not in deleted
+
+        # Failures are reported by flush.
+        project = sth.create_project()
+        mocker.patch.object(sth.client, 'restDELETE', side_effect=Exception('delete error'))
+        sth.dispose(project)
+        assert sth.flush() is False
+        assert deferred_disposal.failed == [project]
+
+        mocker.stopall()
+        sth.dispose(project)
+        assert sth.flush() is True
+
+    # Not deferred.
+    assert SynapseTestHelper(mk_syn_client()).flush() is True
+
+
+def test_dispose_report(mk_syn_client, mocker):
+    sth = SynapseTestHelper(mk_syn_client(), dispose_retries=2)
+    sth.waiter.initial_delay = 0.01
+    project = sth.create_project()
+    folder = sth.create_folder(parent=project)
+    team = sth.create_team()
+
+    # Transient errors are retried in the next pass.
+    response = mocker.Mock(status_code=503)
+    mocker.patch.object(sth.client, 'restDELETE', side_effect=[
+        synapseclient.core.exceptions.SynapseHTTPError('unavailable', response=response),
+        None
+    ])
+    report = sth.dispose(project, folder)
+    assert report
+    assert report.passes == 2
+    assert report.deleted == [project]
+    assert report.skipped == [folder]
+    assert report.retried == [project]
+    result = report.results[0]
+    assert result.attempts == 2
+    assert result.latency > 0
+    assert result.error is None
+
+    # Other errors are not retried.
+    mocker.patch.object(sth.client, 'restDELETE', side_effect=Exception('delete error'))
+    report = sth.dispose(team)
+    assert not report
+    assert report.passes == 1
+    assert report.failed == [team]
+    assert str(report.results[0].error) == 'delete error'
+
+    # Transient errors stop being retried when the retries are used up.
+    response = mocker.Mock(status_code=429)
+    delete = mocker.patch.object(sth.client, 'restDELETE', side_effect=synapseclient.core.exceptions.SynapseHTTPError(
+        'throttled', response=response))
+    report = sth.dispose(team, max_retries=1)
+    assert not report
+    assert report.passes == 2
+    assert delete.call_count == 2
+    assert report.failed == [team]
+
+    mocker.stopall()
+    assert sth.dispose(project, team)
+
+    # Objects without an id cannot be deleted.
+    sth.dispose_of(Project(), Team())
+    report = sth.dispose()
+    assert not report
+    assert len(report.failed) == 2
+    assert [str(result.error) for result in report] == ['Cannot delete Project without an id.',
+                                                         'Cannot delete Team without an id.']
+
+
+def test_rate_limiter(mk_syn_client, fake_synapse_server, mocker):
+    rate_limiter = RateLimiter(rate=20, burst=2)
+    sth1 = SynapseTestHelper(mk_syn_client(), rate_limiter=rate_limiter, max_workers=4)
+    sth2 = SynapseTestHelper(mk_syn_client(), rate_limiter=rate_limiter)
+    call = mocker.spy(rate_limiter, 'call')
+
+    # Creates, waits, and deletes from every helper share the limit.
+    with sth1, sth2:
+        project = sth1.create_project()
+        sth1.create_folders(4, parent=project)
+        sth2.create_team()
+        assert sth1.dispose()
+    assert call.call_count >= 9
+    assert rate_limiter.stats['calls'] == call.call_count
+
+    if fake_synapse_server:
+        # Throttled responses, including the ones synapseclient retries, lower the rate.
+        with SynapseTestHelper(mk_syn_client(), rate_limiter=rate_limiter) as sth:
+            fake_synapse_server.inject_error(status=429, method='POST', path='/entity$')
+            sth.create_project()
+        assert rate_limiter.stats['throttled'] == 1
+        assert rate_limiter.current_rate < 20
+
+
+def test_multiple_clients(mk_syn_client, mocker):
+    clients = [mk_syn_client(), mk_syn_client()]
+    with pytest.raises(ValueError):
+        SynapseTestHelper(clients, client_selection='random')
+
+    with SynapseTestHelper(clients) as sth:
+        assert sth.configured
+        assert sth.clients == clients
+        assert sth.client is clients[0]
+
+        # Projects and Teams are spread round-robin, children use the client that created their parent.
+        stores = [mocker.spy(client, 'store') for client in clients]
+        project1 = sth.create_project()
+        project2 = sth.create_project()
+        folder = sth.create_folder(parent=project2)
+        wiki = sth.create_wiki(owner=project2)
+        assert stores[0].call_count == 1
+        assert stores[1].call_count == 3
+        assert sth._owner(project1) is clients[0]
+        assert sth._owner(project2) is clients[1]
+        assert sth._owner(folder) is clients[1]
+        assert sth._owner(wiki) is clients[1]
+        assert sth._owner(project2.id) is clients[1]
+
+        # Objects are deleted with the client that created them.
+        deletes = [mocker.spy(client, 'restDELETE') for client in clients]
+        assert sth.dispose()
+        assert deletes[0].call_count == 1
+        assert deletes[1].call_count == 1
+        assert sth._owners == {}
+
+    # Least loaded.
+    with SynapseTestHelper(clients, client_selection='least_loaded') as sth:
+        sth._client_load[id(clients[0])] = 1
+        assert sth._next_client() is clients[1]
+        sth._client_load[id(clients[1])] = 2
+        assert sth._next_client() is clients[0]
+        sth._client_load.clear()
+
+        # Picking a client reserves a call on it until _call releases it.
+        assert [sth._next_client() for _ in range(4)] == clients * 2
+        assert sth._client_load == {id(clients[0]): 2, id(clients[1]): 2}
+        for client in clients * 2:
+            sth._call('getUserProfile', synapse_client=client, client_reserved=True)
+        assert sth._client_load == {id(clients[0]): 0, id(clients[1]): 0}
+
+        # Bad kwargs fail before a client is reserved.
+        for create, cls in [(sth.create_project, 'Project'), (sth.create_team, 'Team')]:
+            patched = mocker.patch('src.synapse_test_helper.synapse_test_helper.{0}'.format(cls),
+                                   side_effect=TypeError('bad kwargs'))
+            with pytest.raises(TypeError, match='bad kwargs'):
+                create(nope=1)
+            mocker.stop(patched)
+        assert sth._client_load == {id(clients[0]): 0, id(clients[1]): 0}
+
+        # Concurrent creates see the load of the clients picked before them.
+        started = threading.Barrier(4, timeout=10)
+        for client in clients:
+            store = client.store
+
+            def slow_store(obj, *args, _store=store, **kwargs):
+                started.wait()
+                return _store(obj, *args, **kwargs)
+
+            mocker.patch.object(client, 'store', side_effect=slow_store)
+        projects = sth.create_projects(4, max_workers=4)
+        assert sorted(clients.index(sth._owner(project)) for project in projects) == [0, 0, 1, 1]
+        assert set(sth._client_load.values()) == {0}
+
+    with pytest.raises(Exception) as ex:
+        SynapseTestHelper([clients[0], object()])
+    assert 'synapse_client must be an instance if synapseclient.Synapse' in str(ex)
+
+
+def test_journal_recover(mk_syn_client, tmp_path, dead_pid):
+    journal_dir = str(tmp_path / 'journals')
+
+    # Disposed objects are removed from the journal.
+    with SynapseTestHelper(mk_syn_client(), journal_dir=journal_dir) as sth:
+        sth.create_project()
+        assert len(sth.journal) == 1
+    assert os.listdir(journal_dir) == []
+
+    # Leave a journal behind like a killed process.
+    crashed = SynapseTestHelper(mk_syn_client(), journal_dir=journal_dir)
+    project = crashed.create_project()
+    folder = crashed.create_folder(parent=project)
+    other_project = crashed.create_project()
+    team = crashed.create_team()
+    wiki = crashed.create_wiki(owner=other_project)
+    temp_file = crashed.create_temp_file()
+    already_deleted = crashed.create_project()
+    crashed.client.restDELETE('/entity/{0}?skipTrashCan=true'.format(already_deleted.id))
+    crashed.journal.close()
+    assert len(crashed.journal) == 8
+    journal_path = crashed.journal.path
+
+    with SynapseTestHelper(mk_syn_client(), journal_dir=journal_dir, max_workers=4) as sth:
+        # Journals of running processes are skipped.
+        assert sth.recover()
+        assert os.path.isfile(journal_path)
+
+        with open(journal_path) as f:
+            lines = [json.loads(line) for line in f]
+        lines[0]['pid'] = dead_pid
+        lines[0]['host'] = '{0}-other'.format(lines[0]['host'])
+        with open(journal_path, 'w') as f:
+            f.writelines(json.dumps(line) + '\n' for line in lines)
+
+        # Journals of other hosts are only recovered when asked to.
+        assert sth.recover()
+        assert os.path.isfile(journal_path)
+        report = sth.recover(other_hosts=True)
+        assert report
+        assert report.pruned_count == 2
+        assert not os.path.exists(journal_path)
+        assert not os.path.exists(temp_file)
+        for entity in [project, folder, other_project]:
+            with pytest.raises(synapseclient.core.exceptions.SynapseHTTPError):
+                sth.client.get(entity.id)
+        with pytest.raises(ValueError):
+            sth.client.getTeam(team.name)
+
+    with pytest.raises(ValueError, match='journal_dir must be set'):
+        SynapseTestHelper(mk_syn_client()).recover()
+
+
+def test_create_many_journals_each_object(mk_syn_client, tmp_path, mocker):
+    with SynapseTestHelper(mk_syn_client(), journal_dir=str(tmp_path / 'journals'), max_workers=1) as sth:
+        # Each object is journaled as soon as it is created, not when the batch finishes.
+        journaled = []
+        create_project = sth._create_project
+
+        def _create_project(**kwargs):
+            journaled.append(len(sth.journal))
+            if len(journaled) == 3:
+                raise Exception('create failed')
+            return create_project(**kwargs)
+
+        mocker.patch.object(sth, '_create_project', side_effect=_create_project)
+        with pytest.raises(Exception, match='create failed'):
+            sth.create_projects(3)
+        assert journaled == [0, 1, 2]
+        assert len(sth.journal) == 2
+        assert len(sth.trash) == 2
+
+
+def test_instrumentation(mk_syn_client):
+    events = []
+    instrumentation = Instrumentation(listeners=[events.append])
+    with SynapseTestHelper(mk_syn_client(), instrumentation=instrumentation) as sth:
+        project = sth.create_project()
+        assert events[-1].operation == 'create_project'
+        assert events[-1].object_type == 'Project'
+        assert events[-1].object_id == project.id
+        assert events[-1].outcome == 'success'
+        assert events[-1].duration > 0
+
+        team = sth.create_team()
+        assert [e.operation for e in events[-2:]] == ['create_team', 'wait_for_team']
+        assert events[-1].object_id == team.id
+
+        temp_file = sth.create_temp_file()
+        assert events[-1].operation == 'create_temp_file'
+        assert events[-1].object_id == temp_file
+
+        with pytest.raises(Exception):
+            sth.create_folder(parent=sth.fake_synapse_id)
+        assert events[-1].operation == 'create_folder'
+        assert events[-1].outcome == 'error'
+        assert events[-1].error is not None
+
+        # Deleting an object that is already gone is not an error.
+        gone = sth.create_project()
+        sth.client.restDELETE('/entity/{0}?skipTrashCan=true'.format(gone.id))
+
+        events.clear()
+        report = sth.dispose()
+        assert report
+        assert gone in report.deleted
+        deletes = {(e.object_type, e.object_id) for e in events if e.operation == 'delete'}
+        assert ('Project', project.id) in deletes
+        assert ('Team', team.id) in deletes
+        assert ('path', temp_file) in deletes
+        assert [e.outcome for e in events if e.object_id == gone.id] == [Event.ALREADY_DELETED]
+
+    summary = instrumentation.summary()
+    assert summary['create_project']['count'] == 2
+    assert summary['create_folder']['errors'] == 1
+    assert summary['delete']['count'] == len(deletes)
+    assert summary['delete']['errors'] == 0
+    for key in ['total', 'mean', 'p50', 'p95', 'p99', 'max']:
+        assert summary['delete'][key] >= 0
+
+
 def test_create_wiki(synapse_test_helper):
     project = synapse_test_helper.create_project()
 
@@ -459,6 +1249,58 @@ def test_create_wiki(synapse_test_helper):
     assert len(synapse_test_helper.trash) == 0
 
 
+def test_create_temp_file_of_size(synapse_test_helper, mocker):
+    sth = synapse_test_helper
+    mocker.patch.object(sth, 'TEMP_FILE_CHUNK_SIZE', 1000)
+    write = mocker.spy(sth, '_write_fill')
+
+    contents = {}
+    for fill in sth.TEMP_FILE_FILLS:
+        path = sth.create_temp_file(size=2500, fill=fill)
+        assert path in sth.trash
+        assert os.path.getsize(path) == 2500
+        with open(path, 'rb') as f:
+            contents[fill] = f.read()
+        # Unique to each file.
+        with open(sth.create_temp_file(size=2500, fill=fill), 'rb') as f:
+            assert f.read() != contents[fill]
+    assert write.call_count == 6
+    assert contents['pattern'][:1000] == contents['pattern'][1000:2000]
+    assert contents['sparse'][16:] == bytes(2500 - 16)
+
+    assert os.path.getsize(sth.create_temp_file(size=0)) == 0
+    assert os.path.getsize(sth.create_temp_file(size=10, fill='sparse')) == 10
+
+    with pytest.raises(ValueError):
+        sth.create_temp_file(size=10, content='text')
+    with pytest.raises(ValueError):
+        sth.create_temp_file(size=-1)
+    with pytest.raises(ValueError):
+        sth.create_temp_file(size=10, fill='zeros')
+
+    # Creates files concurrently in a single temp dir.
+    sth.max_workers = 4
+    paths = sth.create_temp_files([{'size': 100}, {'size': 200, 'fill': 'pattern'}, {'name': 'file.bin'}],
+                                  fill='sparse')
+    assert [os.path.getsize(path) for path in paths[:2]] == [100, 200]
+    assert os.path.basename(paths[2]) == 'file.bin'
+    assert len({os.path.dirname(path) for path in paths}) == 1
+    assert all(path in sth.trash for path in paths)
+    assert os.path.dirname(paths[0]) in sth.trash
+    with pytest.raises(ValueError):
+        sth.create_temp_files(2, size=10, fill='zeros')
+
+    # Can be uploaded.
+    project = sth.create_project()
+    file = sth.create_file(path=paths[0], parent=project)
+    assert file.path == paths[0]
+
+    sth.dispose()
+    for path in paths:
+        assert not os.path.exists(path)
+    assert not os.path.exists(os.path.dirname(paths[0]))
+
+
 def test_create_temp_dir(synapse_test_helper, mk_tempdir):
     dir = mk_tempdir()
 
@@ -0,0 +1,187 @@
+import os
+import threading
+import pytest
+from synapseclient import Project, Folder, Team, Wiki
+from src.synapse_test_helper.trash import Trash, TrashRecord, trash_key
+
+
+def test_trash():
+    trash = Trash(key=lambda obj: obj['id'])
+    obj1 = {'id': 1}
+    obj2 = {'id': 2}
+
+    # Adds objects in order.
+    assert trash.add(obj1)
+    assert trash.add(obj2)
+    assert list(trash) == [obj1, obj2]
+    assert len(trash) == 2
+
+    # Does not add duplicates by identity.
+    assert trash.add({'id': 1, 'name': 'other'}) is False
+    assert len(trash) == 2
+    assert {'id': 2, 'name': 'other'} in trash
+    assert {'id': 3} not in trash
+
+    # Removes objects by identity.
+    assert trash.discard({'id': 1}) is True
+    assert trash.discard({'id': 1}) is False
+    assert list(trash) == [obj2]
+    with pytest.raises(ValueError):
+        trash.remove(obj1)
+    trash.remove(obj2)
+    assert len(trash) == 0
+
+    # Can be modified while iterating.
+    trash.add(obj1)
+    trash.add(obj2)
+    for obj in trash:
+        trash.discard(obj)
+    assert len(trash) == 0
+
+    trash.add(obj1)
+    trash.clear()
+    assert len(trash) == 0
+
+
+def test_pop_since():
+    trash = Trash(key=lambda obj: obj['id'])
+    obj1, obj2, obj3, obj4 = [{'id': i} for i in range(1, 5)]
+    trash.add(obj1)
+    marker1 = trash.checkpoint()
+    trash.extend([obj2, obj3])
+    marker2 = trash.checkpoint()
+    trash.add(obj4)
+
+    # Objects removed after the checkpoint are skipped.
+    trash.discard(obj3)
+    assert trash.pop_since(marker2) == [obj4]
+    assert trash.pop_since(marker1) == [obj2]
+    assert list(trash) == [obj1]
+    assert trash.pop_since(marker1) == []
+
+    # Objects re-added after the checkpoint are removed.
+    marker3 = trash.checkpoint()
+    trash.discard(obj1)
+    trash.add(obj1)
+    assert trash.pop_since(marker3) == [obj1]
+
+    # Markers stay valid after a clear.
+    trash.add(obj1)
+    marker4 = trash.checkpoint()
+    trash.clear()
+    trash.add(obj2)
+    assert marker4 < trash.checkpoint()
+    assert trash.pop_since(marker4) == [obj2]
+    with pytest.raises(ValueError):
+        trash.pop_since(trash.checkpoint() + 1)
+
+
+def test_log_is_compacted():
+    trash = Trash(key=lambda obj: obj['id'])
+    keep = {'id': 'keep'}
+    trash.add(keep)
+    marker = trash.checkpoint()
+    for i in range(1000):
+        trash.add({'id': i})
+        trash.discard({'id': i})
+    assert len(trash) == 1
+    assert len(trash._log) <= Trash.MIN_COMPACT_LOG_LENGTH
+    assert len(trash._log_numbers) == len(trash._log)
+
+    # Checkpoints still work after compacting.
+    for i in range(100):
+        trash.add({'id': i})
+    for i in range(0, 100, 2):
+        trash.discard({'id': i})
+    marker2 = trash.checkpoint()
+    trash.add({'id': 'last'})
+    assert len(trash._log) <= 2 * len(trash)
+    assert trash.pop_since(marker2) == [{'id': 'last'}]
+    assert trash.pop_since(marker) == [{'id': i} for i in range(1, 100, 2)]
+    assert list(trash) == [keep]
+
+
+def test_trash_record():
+    folder = Folder(properties={'id': 'syn2', 'parentId': 'syn1', 'name': 'folder'}, annotations={'a': 1})
+    record = TrashRecord.from_object(folder)
+    assert record.key == ('entity', 'syn2')
+    assert record.type == 'Folder'
+    assert record.parent_id == 'syn1'
+    assert record == folder
+    assert record == TrashRecord.from_object(folder)
+    assert hash(record) == hash(TrashRecord.from_object(folder))
+    assert record != Folder(properties={'id': 'syn3', 'parentId': 'syn1'})
+    assert record != None
+    assert TrashRecord.from_object(record) is record
+
+    wiki = TrashRecord.from_object(Wiki(owner='syn1', id='10', title='wiki'))
+    assert wiki.key == ('wiki', '10')
+    assert wiki.parent_id == 'syn1'
+    assert TrashRecord.from_object(Project(properties={'id': 'syn1'})).parent_id is None
+    assert TrashRecord.from_object(Team(id='5')).key == ('team', '5')
+    assert TrashRecord.from_object({'id': '7', 'fileName': 'a.txt'}).key == ('filehandle', '7')
+
+    path = os.path.abspath(os.path.join(os.sep, 'tmp', 'file.txt'))
+    path_record = TrashRecord.from_object(path)
+    assert path_record.kind == 'path'
+    assert path_record.path == path
+    assert path_record == path
+
+    # Objects without an ID keep the object.
+    project = Project()
+    obj_record = TrashRecord.from_object(project)
+    assert obj_record.kind == 'object'
+    assert obj_record.obj is project
+    assert obj_record.to_dict() is None
+
+    # Round trips through a dict.
+    for rec in [record, wiki, path_record]:
+        from_dict = TrashRecord.from_dict(rec.to_dict())
+        assert from_dict == rec
+        assert (from_dict.type, from_dict.parent_id, from_dict.path) == (rec.type, rec.parent_id, rec.path)
+
+
+def test_trash_of_records():
+    trash = Trash(key=trash_key)
+    folder = Folder(properties={'id': 'syn2', 'parentId': 'syn1'})
+    assert trash.add(TrashRecord.from_object(folder))
+    assert folder in trash
+    assert trash.add(folder) is False
+    assert trash.get(('entity', 'syn2')) == folder
+    assert trash.get(('entity', 'syn3')) is None
+    assert trash.discard(folder)
+    assert len(trash) == 0
+
+
+def test_trash_is_thread_safe():
+    trash = Trash(key=lambda obj: obj['id'])
+    thread_count = 8
+    per_thread = 1000
+    start = threading.Barrier(thread_count * 2)
+    removed = []
+
+    def _add(thread_index):
+        objs = [{'id': thread_index * per_thread + i} for i in range(per_thread)]
+        start.wait()
+        for obj in objs[:per_thread // 2]:
+            trash.add(obj)
+        trash.extend(objs[per_thread // 2:])
+
+    def _remove(thread_index):
+        start.wait()
+        for i in range(per_thread):
+            obj = {'id': thread_index * per_thread + i}
+            if trash.discard(obj):
+                removed.append(obj)
+
+    threads = [threading.Thread(target=_add, args=(i,)) for i in range(thread_count)] + \
+              [threading.Thread(target=_remove, args=(i,)) for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every object is either still in the trash or was removed exactly once.
+    ids = [obj['id'] for obj in removed + trash.pop_all()]
+    assert sorted(ids) == list(range(thread_count * per_thread))
+    assert len(trash) == 0
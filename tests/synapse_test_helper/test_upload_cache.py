@@ -0,0 +1,54 @@
+import threading
+from src.synapse_test_helper import UploadCache
+
+
+def test_acquire_add_and_release():
+    upload_cache = UploadCache()
+    assert upload_cache.acquire('a') is None
+    upload_cache.add('a', {'id': '1'})
+    assert len(upload_cache) == 1
+    assert upload_cache.refs('a') == 1
+
+    assert upload_cache.acquire('a') == {'id': '1'}
+    assert upload_cache.acquire('a') == {'id': '1'}
+    assert upload_cache.refs('a') == 3
+    assert upload_cache.stats == {'hits': 2, 'misses': 1}
+
+    # The file handle is returned when the last reference is released.
+    assert upload_cache.release('a') is None
+    assert upload_cache.release('a') is None
+    assert upload_cache.release('a') == {'id': '1'}
+    assert len(upload_cache) == 0
+    assert upload_cache.refs('a') == 0
+    assert upload_cache.release('a') is None
+
+
+def test_acquire_waits_for_pending_uploads():
+    upload_cache = UploadCache()
+    assert upload_cache.acquire('a') is None
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(upload_cache.acquire('a')))
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    upload_cache.add('a', {'id': '1'})
+    thread.join(5)
+    assert results == [{'id': '1'}]
+    assert upload_cache.refs('a') == 2
+
+
+def test_abandon():
+    upload_cache = UploadCache()
+    assert upload_cache.acquire('a') is None
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(upload_cache.acquire('a')))
+    thread.start()
+    upload_cache.abandon('a')
+    thread.join(5)
+
+    # The next caller uploads.
+    assert results == [None]
+    assert len(upload_cache) == 0
@@ -0,0 +1,65 @@
+import time
+import pytest
+from src.synapse_test_helper import Waiter
+
+
+def test_delays():
+    waiter = Waiter(initial_delay=1, max_delay=5, multiplier=2, jitter=0)
+    delays = waiter.delays()
+    assert [next(delays) for _ in range(5)] == [1, 2, 4, 5, 5]
+
+    waiter = Waiter(initial_delay=1, max_delay=5, multiplier=2, jitter=0.5)
+    delays = waiter.delays()
+    for expected in [1, 2, 4, 5, 5]:
+        assert expected * 0.5 <= next(delays) <= expected * 1.5
+
+
+def test_wait():
+    waiter = Waiter(initial_delay=0.01, max_delay=0.02, timeout=5)
+    calls = []
+
+    def _func():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError()
+        return len(calls)
+
+    # Retries until the function succeeds.
+    assert waiter.wait(_func, name='func', retry_on=(ValueError,)) == 3
+    assert waiter.stats['func'] == {'waits': 1, 'polls': 3, 'max_polls': 3, 'timeouts': 0,
+                                    'seconds': waiter.stats['func']['seconds']}
+
+    # Does not wait when the first poll succeeds.
+    assert waiter.wait(lambda: 'ok', name='func') == 'ok'
+    assert waiter.stats['func']['waits'] == 2
+    assert waiter.stats['func']['polls'] == 4
+    assert waiter.stats['func']['max_polls'] == 3
+
+    # Retries until the result is accepted.
+    calls.clear()
+    assert waiter.wait(lambda: calls.append(1) or len(calls), name='until', until=lambda r: r == 2) == 2
+    assert waiter.stats['until']['polls'] == 2
+
+    # Raises other exceptions.
+    with pytest.raises(KeyError):
+        waiter.wait(lambda: {}['a'], retry_on=(ValueError,))
+
+    waiter.reset_stats()
+    assert waiter.stats == {}
+
+
+def test_wait_timeout():
+    waiter = Waiter(initial_delay=0.01, max_delay=0.05, timeout=0.2)
+
+    def _func():
+        raise ValueError()
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError, match='Timed out waiting for: never'):
+        waiter.wait(_func, name='never')
+    assert time.monotonic() - start < 1
+    assert waiter.stats['never']['timeouts'] == 1
+    assert waiter.stats['never']['polls'] > 1
+
+    with pytest.raises(TimeoutError, match='custom message'):
+        waiter.wait(_func, timeout=0, message='custom message')